@@ -44,6 +44,7 @@ from climada.entity.exposures.base import INDICATOR_IF, INDICATOR_CENTR
 import climada.util.plot as u_plot
 from climada.util.config import CONFIG
 from climada.util.constants import DEF_CRS
+from climada.util.event_index import EventIndex
 
 LOGGER = logging.getLogger(__name__)
 
@@ -83,6 +84,8 @@ class Impact():
         self.aai_agg = 0
         self.unit = ''
         self.imp_mat = []
+        # lookup cache of event_id and event_name
+        self._event_index = EventIndex()
 
     def calc_freq_curve(self, return_per=None):
         """Compute impact exceedance frequency curve.
@@ -113,7 +116,7 @@ class Impact():
 
         return ifc
 
-    def calc(self, exposures, impact_funcs, hazard, save_mat=False):
+    def calc(self, exposures, impact_funcs, hazard, save_mat=False, k_neighbors=1):
         """Compute impact of an hazard to exposures.
 
         Parameters:
@@ -121,6 +124,9 @@ class Impact():
             impact_funcs (ImpactFuncSet): impact functions
             hazard (Hazard): hazard
             self_mat (bool): self impact matrix: events x exposures
+            k_neighbors (int, optional): number of closest centroids whose
+                intensity and fraction are interpolated at every exposure with
+                inverse distance weights. Default: 1, use the assigned centroid
 
         Examples:
             Use Entity class:
@@ -151,7 +157,10 @@ class Impact():
         """
         # 1. Assign centroids to each exposure if not done
         assign_haz = INDICATOR_CENTR + hazard.tag.haz_type
-        if assign_haz not in exposures:
+        weights = None
+        if k_neighbors > 1:
+            weights = exposures.get_centroids_weights(hazard, k_neighbors)
+        elif assign_haz not in exposures:
             exposures.assign_centroids(hazard)
         else:
             LOGGER.info('Exposures matching centroids found in %s', assign_haz)
@@ -171,8 +180,12 @@ class Impact():
         self.crs = exposures.crs
 
         # Select exposures with positive value and assigned centroid
-        exp_idx = np.where(np.logical_and(exposures.value > 0, \
-                           exposures[assign_haz] >= 0))[0]
+        if weights is None:
+            exp_idx = np.where(np.logical_and(exposures.value > 0, \
+                               exposures[assign_haz] >= 0))[0]
+        else:
+            exp_idx = np.where(np.logical_and(exposures.value > 0, \
+                               weights.getnnz(axis=1) > 0))[0]
         if exp_idx.size == 0:
             LOGGER.warning("No affected exposures.")
 
@@ -216,9 +229,9 @@ class Impact():
             for chk in range(int(exp_iimp.size/exp_step)):
                 self._exp_impact( \
                     exp_idx[exp_iimp[chk*exp_step:(chk+1)*exp_step]],\
-                    exposures, hazard, imp_fun, insure_flag)
+                    exposures, hazard, imp_fun, insure_flag, weights)
             self._exp_impact(exp_idx[exp_iimp[(chk+1)*exp_step:]],\
-                exposures, hazard, imp_fun, insure_flag)
+                exposures, hazard, imp_fun, insure_flag, weights)
 
         if not tot_exp:
             LOGGER.warning('No impact functions match the exposures.')
@@ -838,7 +851,8 @@ class Impact():
                 imp_sort[:, cen_idx], freq_sort[:, cen_idx],
                 0, return_periods)
 
-    def _exp_impact(self, exp_iimp, exposures, hazard, imp_fun, insure_flag):
+    def _exp_impact(self, exp_iimp, exposures, hazard, imp_fun, insure_flag,
+                    weights=None):
         """Compute impact for inpute exposure indexes and impact function.
 
         Parameters:
@@ -847,23 +861,34 @@ class Impact():
             hazard (Hazard): hazard instance
             imp_fun (ImpactFunc): impact function instance
             insure_flag (bool): consider deductible and cover of exposures
+            weights (sparse.csr_matrix, optional): interpolation weights of
+                the centroids (exposures x centroids). Default: use the
+                assigned centroids
         """
         if not exp_iimp.size:
             return
 
-        # get assigned centroids
-        icens = exposures[INDICATOR_CENTR + hazard.tag.haz_type].values[exp_iimp]
-
-        # get affected intensities
-        inten_val = hazard.intensity[:, icens]
-        # get affected fractions
-        fract = hazard.fraction[:, icens]
+        if weights is None:
+            # get assigned centroids
+            icens = exposures[INDICATOR_CENTR + hazard.tag.haz_type].values[exp_iimp]
+            # get affected intensities and fractions
+            inten_val = hazard.intensity[:, icens]
+            fract = hazard.fraction[:, icens]
+        else:
+            # interpolate intensities and fractions at the exposures
+            exp_weights = weights[exp_iimp, :].transpose().tocsr()
+            inten_val = hazard.intensity.dot(exp_weights).tocsr()
+            fract = hazard.fraction.dot(exp_weights).tocsr()
         # impact = fraction * mdr * value
-        inten_val.data = imp_fun.calc_mdr(inten_val.data)
-        impact = fract.multiply(inten_val).multiply(exposures.value.values[exp_iimp])
+        # assigned intensities are a new matrix: compute the mdr in place
+        mdr = inten_val if weights is None else inten_val.copy()
+        mdr.data = imp_fun.calc_mdr(mdr.data)
+        impact = fract.multiply(mdr).multiply(exposures.value.values[exp_iimp])
 
         if insure_flag and impact.nonzero()[0].size:
-            inten_val = hazard.intensity[:, icens].todense()
+            if weights is None:
+                inten_val = hazard.intensity[:, icens]
+            inten_val = inten_val.todense()
             paa = np.interp(inten_val, imp_fun.intensity, imp_fun.paa)
             impact = np.minimum(np.maximum(impact - \
                 exposures.deductible.values[exp_iimp] * paa, 0), \
@@ -897,8 +922,12 @@ class Impact():
         Parameters:
             event_id(int): id of the event
         """
+        ev_pos = self._event_index.get_id_pos(self.event_id, event_id)
+        if ev_pos < 0:
+            LOGGER.error('Wrong event id: %s.', event_id)
+            raise ValueError
         impact_csr_exp = Exposures()
-        impact_csr_exp['value'] = self.imp_mat.toarray()[event_id-1, :]
+        impact_csr_exp['value'] = self.imp_mat[ev_pos, :].toarray().reshape(-1)
         impact_csr_exp['latitude'] = self.coord_exp[:, 0]
         impact_csr_exp['longitude'] = self.coord_exp[:, 1]
         impact_csr_exp.crs = self.crs
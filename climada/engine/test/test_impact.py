@@ -284,6 +284,36 @@ class TestCalc(unittest.TestCase):
         self.assertAlmostEqual(6.512201157564421e+09, impact.aai_agg, 5)
         self.assertTrue(np.isclose(6.512201157564421e+09, impact.aai_agg))
 
+    def test_calc_k_neighbors_pass(self):
+        """ Test impact with inverse distance interpolation of the hazard """
+        ent = Entity()
+        ent.read_excel(ENT_DEMO_TODAY)
+        ent.check()
+
+        hazard = Hazard('TC')
+        hazard.read_mat(HAZ_TEST_MAT)
+
+        impact = Impact()
+        impact.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True)
+        impact_idw = Impact()
+        impact_idw.calc(ent.exposures, ent.impact_funcs, hazard, save_mat=True,
+                        k_neighbors=4)
+        self.assertEqual(impact_idw.imp_mat.shape, impact.imp_mat.shape)
+        self.assertAlmostEqual(impact_idw.tot_value, impact.tot_value)
+        self.assertTrue(np.allclose(np.sum(impact_idw.imp_mat, axis=1).reshape(-1),
+                                    impact_idw.at_event))
+        self.assertTrue(impact_idw.aai_agg > 0)
+        self.assertTrue(np.isclose(impact_idw.aai_agg, impact.aai_agg, rtol=0.5))
+
+        # exposures placed on the centroids are not interpolated
+        ent.exposures.latitude = hazard.centroids.lat[ent.exposures.centr_TC.values]
+        ent.exposures.longitude = hazard.centroids.lon[ent.exposures.centr_TC.values]
+        ent.exposures.assign_centroids(hazard)
+        impact.calc(ent.exposures, ent.impact_funcs, hazard)
+        impact_idw.calc(ent.exposures, ent.impact_funcs, hazard, k_neighbors=4)
+        self.assertTrue(np.allclose(impact_idw.at_event, impact.at_event))
+        self.assertTrue(np.allclose(impact_idw.eai_exp, impact.eai_exp))
+
 class TestImpactYearSet(unittest.TestCase):
     '''Test calc_impact_year_set method'''
 
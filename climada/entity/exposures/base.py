@@ -35,7 +35,8 @@ from climada.entity.tag import Tag
 import climada.util.hdf5_handler as hdf5
 from climada.util.constants import ONE_LAT_KM, DEF_CRS
 import climada.util.coordinates as co
-from climada.util.interpolation import interpol_index
+from climada.util.interpolation import interpol_index, index_nn_grid, METHOD, \
+DIST_DEF, assign_cache_key, get_assign_cache, set_assign_cache, interpol_weights
 import climada.util.plot as u_plot
 
 LOGGER = logging.getLogger(__name__)
@@ -182,10 +183,11 @@ class Exposures(GeoDataFrame):
                 raise ValueError
 
     def assign_centroids(self, hazard, method='NN', distance='haversine',
-                         threshold=100):
+                         threshold=100, cache=False, cache_disk=False):
         """ Assign for each exposure coordinate closest hazard coordinate.
         -1 used for disatances > threshold in point distances. If raster hazard,
-        -1 used for centroids outside raster.
+        -1 used for centroids outside raster. Point centroids on a regular grid
+        are assigned to the grid cell containing every exposure.
 
         Parameters:
             hazard (Hazard): hazard to match (with raster or vector centroids)
@@ -196,6 +198,11 @@ class Exposures(GeoDataFrame):
             threshold (float): distance threshold in km over which no neighbor
                 will be found in vector hazard. Those are assigned with a -1.
                 Default 100 km.
+            cache (bool, optional): reuse the assignment of the same
+                coordinates to the same vector centroids, cached in memory
+                during the session. Default: False
+            cache_disk (bool, optional): if cache, keep as well the cached
+                assignments on disk, for later sessions. Default: False
         """
         LOGGER.info('Matching %s exposures with %s centroids.',
                     str(self.shape[0]), str(hazard.centroids.size))
@@ -215,11 +222,62 @@ class Exposures(GeoDataFrame):
             if np.array_equal(coord, hazard.centroids.coord):
                 assigned = np.arange(self.shape[0])
             else:
-                assigned = interpol_index(hazard.centroids.coord, coord, \
-                    method=method, distance=distance, threshold=threshold)
+                assigned = None
+                if cache:
+                    cache_key = assign_cache_key(coord, hazard.centroids.coord, \
+                        method, distance, threshold)
+                    assigned = get_assign_cache(cache_key, cache_disk)
+                if assigned is None:
+                    grid_meta, grid_centr = hazard.centroids.get_regular_grid()
+                    if grid_meta and method == METHOD[0]:
+                        assigned = index_nn_grid(hazard.centroids.coord, coord, grid_meta, \
+                            grid_centr, distance=distance, threshold=threshold)
+                    else:
+                        tree = hazard.centroids.get_nn_tree(distance) \
+                            if distance in DIST_DEF else None
+                        assigned = interpol_index(hazard.centroids.coord, coord, \
+                            method=method, distance=distance, threshold=threshold, \
+                            tree=tree)
+                    if cache and assigned.size:
+                        set_assign_cache(cache_key, assigned, cache_disk)
 
         self[INDICATOR_CENTR + hazard.tag.haz_type] = assigned
 
+    def get_centroids_weights(self, hazard, k=4, distance='haversine',
+                              threshold=100, power=2):
+        """ Compute for each exposure coordinate the inverse distance weights
+        of its k closest hazard centroids, used to interpolate the hazard
+        at the exposures.
+
+        Parameters:
+            hazard (Hazard): hazard to match
+            k (int, optional): number of closest centroids. Default: 4
+            distance (str, optional): distance to use, 'approx' or 'haversine'.
+                Haversine default
+            threshold (float): distance threshold in km over which centroids
+                get no weight. Default 100 km.
+            power (float, optional): power of the inverse distance. Default: 2
+
+        Returns:
+            sparse.csr_matrix (exposures x centroids) with rows summing 1, or
+            empty for exposures without centroids closer than threshold
+
+        Raises:
+            ValueError
+        """
+        LOGGER.info('Interpolating %s exposures from %s centroids.',
+                    str(self.shape[0]), str(hazard.centroids.size))
+        if not co.equal_crs(self.crs, hazard.centroids.crs):
+            LOGGER.error('Set hazard and exposure to same CRS first!')
+            raise ValueError
+        if distance not in DIST_DEF:
+            LOGGER.error('Interpolation using distance %s is not supported.', distance)
+            raise ValueError
+        tree = hazard.centroids.get_nn_tree(distance)
+        coord = np.stack([self.latitude.values, self.longitude.values], axis=1)
+        return interpol_weights(hazard.centroids.coord, coord, k, distance, threshold,
+                                power, tree=tree)
+
     def set_geometry_points(self, scheduler=None):
         """ Set geometry attribute of GeoDataFrame with Points from latitude and
         longitude attributes.
@@ -39,7 +39,8 @@ from climada.entity.exposures.base import Exposures, INDICATOR_IF
 from climada.entity.exposures import gpw_import
 from climada.util.finance import gdp, income_group, wealth2gdp, world_bank_wealth_account
 from climada.util.constants import SYSTEM_DIR, DEF_CRS
-from climada.util.coordinates import pts_to_raster_meta, get_resolution
+from climada.util.coordinates import pts_to_raster_meta, get_resolution, \
+nat_earth_layer
 
 logging.root.setLevel(logging.DEBUG)
 LOGGER = logging.getLogger(__name__)
@@ -213,11 +214,6 @@ class LitPop(Exposures):
         LOGGER.info('Generating LitPop data at a resolution of %s arcsec.', str(resolution))
         litpop_data = _get_litpop_box(cut_bbox, resolution, 0, reference_year, \
                                       exponents)
-        shp_file = shapereader.natural_earth(resolution='10m',
-                                             category='cultural',
-                                             name='admin_0_countries')
-        shp_file = shapereader.Reader(shp_file)
-
         for cntry_iso, cntry_val in country_info.items():
             if fin_mode == 'pc':
                 total_asset_val = world_bank_wealth_account(cntry_iso, \
@@ -228,9 +224,9 @@ class LitPop(Exposures):
             elif fin_mode in ['norm', 'none']:
                 total_asset_val = 1
             else:
-                _, total_asset_val = gdp(cntry_iso, reference_year, shp_file)
+                _, total_asset_val = gdp(cntry_iso, reference_year)
             cntry_val.append(total_asset_val)
-        _get_gdp2asset_factor(country_info, reference_year, shp_file, fin_mode=fin_mode)
+        _get_gdp2asset_factor(country_info, reference_year, fin_mode=fin_mode)
 
         tag = Tag()
         lp_cntry = list()
@@ -540,30 +536,24 @@ def _get_country_shape(country_iso, only_geo=0):
                     of the shape (array)
     """
     country_iso = country_iso.casefold()
-    shp = shapereader.natural_earth(resolution='10m',
-                                    category='cultural',
-                                    name='admin_0_countries')
-    shp = shapefile.Reader(shp)
-    if len(country_iso) == 3:
-        for field_num, field in enumerate(shp.fields[1::]):
-            # Skip first (index zero) field, because it is DeletionFlag
-            if field[0] == 'ADM0_A3':
-                break
-    else:
-        for field_num, field in enumerate(shp.fields[1::]):
-            # Skip first (index zero) field, because it is DeletionFlag
-            if field[0] == 'ADMIN':
-                break
-    del field
-    for rec_i, rec in enumerate(shp.records()):
-        if rec[field_num].casefold() == country_iso:
-            if only_geo != 1:
-                return shp.shapes()[rec_i]
-            bbox = shp.shapes()[rec_i].bbox
-            points = shp.shapes()[rec_i].points
-            lat = np.array([x[1] for x in points])
-            lon = np.array([x[0] for x in points])
-            return bbox, lat, lon
+    admin0 = nat_earth_layer(10, 'cultural', 'admin_0_countries')
+    field = 'ADM0_A3' if len(country_iso) == 3 else 'ADMIN'
+    rec_i = np.flatnonzero(admin0.data[field].str.casefold().values == country_iso)
+    if not rec_i.size:
+        return None
+    geom = admin0.data.geometry.values[rec_i[0]]
+    polys = geom.geoms if hasattr(geom, 'geoms') else [geom]
+    # every polygon exterior followed by its holes, as the parts of the shape
+    rings = [np.array(ring.coords)[:, :2] for poly in polys
+             for ring in [poly.exterior] + list(poly.interiors)]
+    points = np.concatenate(rings)
+    if only_geo != 1:
+        shape = shapefile.Shape(shapeType=shapefile.POLYGON)
+        shape.points = points.tolist()
+        shape.parts = np.cumsum([0] + [ring.shape[0] for ring in rings[:-1]]).tolist()
+        shape.bbox = list(geom.bounds)
+        return shape
+    return list(geom.bounds), points[:, 1], points[:, 0]
 
 def _match_target_res(target_res='NA'):
     """ Checks whether the resolution is compatible with the "legacy"
@@ -1014,7 +1004,7 @@ def _get_iso3(country_name):
             return rec[field_adm]
     return ""
 
-def _get_gdp2asset_factor(cntry_info, ref_year, shp_file, fin_mode='income_group'):
+def _get_gdp2asset_factor(cntry_info, ref_year, shp_file=None, fin_mode='income_group'):
     """ Append factor to convert GDP to physcial asset values according to
         the Global Wealth Databook by the Credit Suisse Research Institute.
         Requires a pickled file containg a dictionary with the three letter
@@ -1026,6 +1016,9 @@ def _get_gdp2asset_factor(cntry_info, ref_year, shp_file, fin_mode='income_group
         cntry_info (dict): key = ISO alpha_3 country, value = [country id,
             country name, country geometry]
         ref_year (int): reference year
+        shp_file (cartopy.io.shapereader.Reader, optional): shape file with
+            INCOME_GRP attribute for every country. Use the parsed Natural
+            Earth admin0 if not provided.
         fin_mode (str): define what total country economic value
                 is to be used as an asset base and distributed to the grid:
                 - gdp: gross-domestic product
@@ -1819,15 +1812,10 @@ def admin1_validation(country, methods, exponents, **args):
         LOGGER.error('Country parameter data type not recognised. '\
                      + 'Operation aborted.')
         raise TypeError
-    shp_file = shapereader.natural_earth(resolution='10m',
-                                         category='cultural',
-                                         name='admin_0_countries')
-    shp_file = shapereader.Reader(shp_file)
-
     for cntry_iso, cntry_val in country_info.items(): # get GDP value for country
-        _, gdp_val = gdp(cntry_iso, reference_year, shp_file)
+        _, gdp_val = gdp(cntry_iso, reference_year)
         cntry_val.append(gdp_val)
-    _get_gdp2asset_factor(country_info, reference_year, shp_file, fin_mode=fin_mode)
+    _get_gdp2asset_factor(country_info, reference_year, fin_mode=fin_mode)
     curr_shp = _get_country_shape(country_list[0], 0)
     all_coords = _litpop_box2coords(cut_bbox, resolution, 1)
     mask = _mask_from_shape(curr_shp, resolution=resolution,\
@@ -23,17 +23,18 @@ __all__ = ['Hazard']
 
 import copy
 import itertools
+import functools
 import logging
 import datetime as dt
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 from scipy import sparse
 import matplotlib.pyplot as plt
 import h5py
-import rasterio
-from rasterio.features import rasterize
 from rasterio.warp import reproject, Resampling, calculate_default_transform
 
 from climada.hazard.tag import Tag as TagHazard
@@ -44,6 +45,7 @@ import climada.util.dates_times as u_dt
 from climada.util.config import CONFIG
 import climada.util.hdf5_handler as hdf5
 import climada.util.coordinates as co
+from climada.util.event_index import EventIndex
 
 LOGGER = logging.getLogger(__name__)
 
@@ -87,6 +89,9 @@ DEF_VAR_MAT = {'field_name': 'hazard',
               }
 """ MATLAB variable names """
 
+CACHE_ATTRS = ('_event_index', '_centr_index', '_event_stats')
+""" Private attributes of Hazard holding caches, dropped by clear_cache """
+
 class Hazard():
     """Contains events of some hazard type defined at centroids. Loads from
     files with format defined in FILE_EXT.
@@ -173,6 +178,24 @@ class Hazard():
             LOGGER.info('Using %s CPUs.', self.pool.ncpus)
         else:
             self.pool = None
+        # lookup caches (private attributes are neither selected nor saved)
+        self._event_index = EventIndex()
+        self._centr_index = dict()
+        self._event_stats = tuple()
+
+    def __setattr__(self, name, value):
+        """Drop the caches built from an attribute when it is replaced."""
+        super().__setattr__(name, value)
+        if name in ('event_id', 'event_name'):
+            super().__setattr__('_event_index', EventIndex())
+        if name in ('intensity', 'centroids'):
+            super().__setattr__('_event_stats', tuple())
+        if name in ('intensity', 'fraction'):
+            # keep only the centroid index of the matrix not replaced
+            super().__setattr__('_centr_index', {key: val for key, val in \
+                self.__dict__.get('_centr_index', dict()).items() \
+                if val[0] is self.__dict__.get('intensity') or \
+                val[0] is self.__dict__.get('fraction')})
 
     def clear(self):
         """Reinitialize attributes."""
@@ -184,6 +207,15 @@ class Hazard():
             else:
                 setattr(self, var_name, var_val.__class__())
 
+    def clear_cache(self):
+        """Drop the cached event statistics, centroid-major indexes of
+        intensity and fraction and index of event ids and names. The caches
+        are dropped automatically when these attributes are replaced. Call it
+        after modifying them in place, or to free the memory of the indexes."""
+        self._event_stats = tuple()
+        self._centr_index = dict()
+        self._event_index = EventIndex()
+
     def check(self):
         """Check dimension of attributes.
 
@@ -196,11 +228,12 @@ class Hazard():
     def set_raster(self, files_intensity, files_fraction=None, attrs={},
                    band=[1], src_crs=None, window=False, geometry=False,
                    dst_crs=False, transform=None, width=None, height=None,
-                   resampling=Resampling.nearest):
+                   resampling=Resampling.nearest, compact=False):
         """ Append intensity and fraction from raster file. 0s put to the masked
         values. File can be partially read using window OR geometry.
         Alternatively, CRS and/or transformation can be set using dst_crs and/or
-        (transform, width and height).
+        (transform, width and height). Without pool, the files are read in
+        parallel threads.
 
         Parameters:
             files_intensity (list(str)): file names containing intensity
@@ -217,6 +250,9 @@ class Hazard():
             height (float): number of lats for transform
             resampling (rasterio.warp,.Resampling optional): resampling
                 function used for reprojection to dst_crs
+            compact (bool, optional): drop intensities below intensity_thres,
+                and the fraction at their positions, while reading the files.
+                Default: False
         """
         if files_fraction is not None and len(files_intensity) != len(files_fraction):
             LOGGER.error('Number of intensity files differs from fraction files: %s != %s',
@@ -224,19 +260,21 @@ class Hazard():
             raise ValueError
         self.tag.file_name = str(files_intensity) + ' ; ' + str(files_fraction)
 
+        threshold = self.intensity_thres if compact else None
         self.centroids = Centroids()
         if self.pool:
             chunksize = min(len(files_intensity)//self.pool.ncpus, 1000)
             # set first centroids
             inten_list = [sparse.csr.csr_matrix(self.centroids.set_raster_file( \
                 files_intensity[0], band, src_crs, window, geometry, dst_crs, \
-                transform, width, height, resampling))]
+                transform, width, height, resampling, threshold))]
             inten_list += self.pool.map(self.centroids.set_raster_file, \
             files_intensity[1:], itertools.repeat(band), itertools.repeat(src_crs), \
             itertools.repeat(window), itertools.repeat(geometry), \
             itertools.repeat(dst_crs), itertools.repeat(transform), \
             itertools.repeat(width), itertools.repeat(height), \
-            itertools.repeat(resampling), chunksize=chunksize)
+            itertools.repeat(resampling), itertools.repeat(threshold), \
+            chunksize=chunksize)
             self.intensity = sparse.vstack(inten_list, format='csr')
             if files_fraction is not None:
                 fract_list = self.pool.map(self.centroids.set_raster_file, \
@@ -247,21 +285,36 @@ class Hazard():
                 itertools.repeat(resampling), chunksize=chunksize)
                 self.fraction = sparse.vstack(fract_list, format='csr')
         else:
-            inten_list = []
-            for file in files_intensity:
-                inten_list.append(self.centroids.set_raster_file(file, band, src_crs, window, \
-                    geometry, dst_crs, transform, width, height, resampling))
+            # set first centroids, then read remaining files in threads
+            inten_list = [self.centroids.set_raster_file(files_intensity[0], band, \
+                src_crs, window, geometry, dst_crs, transform, width, height, \
+                resampling, threshold)]
+            files_rest = list(files_intensity[1:])
+            if files_fraction is not None:
+                files_rest += list(files_fraction)
+            read_file = functools.partial(self.centroids.set_raster_file, \
+                band=band, src_crs=src_crs, window=window, geometry=geometry, \
+                dst_crs=dst_crs, transform=transform, width=width, height=height, \
+                resampling=resampling)
+            with ThreadPoolExecutor(max_workers=max(1, min(len(files_rest), \
+            cpu_count()))) as executor:
+                inten_rest = executor.map(functools.partial(read_file, \
+                    threshold=threshold), files_intensity[1:])
+                if files_fraction is not None:
+                    fract_list = executor.map(read_file, files_fraction)
+                inten_list += list(inten_rest)
+                if files_fraction is not None:
+                    fract_list = list(fract_list)
             self.intensity = sparse.vstack(inten_list, format='csr')
             if files_fraction is not None:
-                fract_list = []
-                for file in files_fraction:
-                    fract_list.append(self.centroids.set_raster_file(file, band, src_crs, \
-                        window, geometry, dst_crs, transform, width, height, resampling))
                 self.fraction = sparse.vstack(fract_list, format='csr')
 
         if files_fraction is None:
             self.fraction = self.intensity.copy()
             self.fraction.data.fill(1)
+        elif compact and self.fraction.shape == self.intensity.shape:
+            self.fraction = self.fraction.multiply(self.intensity.astype(bool)).tocsr()
+            self.fraction.eliminate_zeros()
 
         if 'event_id' in attrs:
             self.event_id = attrs['event_id']
@@ -501,9 +554,13 @@ class Hazard():
             LOGGER.error("Not existing variable: %s", str(var_err))
             raise var_err
 
-    def select(self, date=None, orig=None, reg_id=None, reset_frequency=False):
+    def select(self, date=None, orig=None, reg_id=None, reset_frequency=False,
+               view=False):
         """Select events within provided date and/or (historical or synthetical)
         and/or region. Frequency of the events may need to be recomputed!
+        If the selected events are consecutive and view is True, the selected
+        hazard shares the memory of the events' arrays and matrices with the
+        current one: it should then only be read.
 
         Parameters:
             date (tuple(str or int), optional): (initial date, final date) in
@@ -515,6 +572,8 @@ class Hazard():
             reset_frequency (boolean): change frequency of events proportional to
                 difference between first and last year (old and new)
                 default = False
+            view (bool, optional): share memory with the current hazard when
+                possible. Default: False
 
         Returns:
             Hazard or children
@@ -545,22 +604,32 @@ class Hazard():
                 LOGGER.info('No hazard with %s tracks.', str(orig))
                 return None
 
-        # filter centroids
+        # filter centroids: new position of every centroid (-1 if removed)
+        cen_map = None
         if reg_id is not None:
             sel_cen = np.argwhere(self.centroids.region_id == reg_id).reshape(-1)
             if not sel_cen.size:
                 LOGGER.info('No hazard centroids with region %s.', str(reg_id))
                 return None
+            cen_map = -np.ones(self.centroids.size, int)
+            cen_map[sel_cen] = np.arange(sel_cen.size)
 
         sel_ev = np.argwhere(sel_ev).reshape(-1)
+        if sel_ev.size and sel_ev[-1] - sel_ev[0] + 1 == sel_ev.size:
+            sel_ev = slice(sel_ev[0], sel_ev[-1] + 1)
         for (var_name, var_val) in self.__dict__.items():
+            if var_name.startswith('_'):
+                continue
             if isinstance(var_val, np.ndarray) and var_val.ndim == 1 and \
             var_val.size:
-                setattr(haz, var_name, var_val[sel_ev])
+                setattr(haz, var_name, np.array(var_val[sel_ev], copy=not view))
             elif isinstance(var_val, sparse.csr_matrix):
-                setattr(haz, var_name, var_val[sel_ev, :][:, sel_cen])
+                setattr(haz, var_name, _select_csr(var_val, sel_ev, cen_map, view))
             elif isinstance(var_val, list) and var_val:
-                setattr(haz, var_name, [var_val[idx] for idx in sel_ev])
+                if isinstance(sel_ev, slice):
+                    setattr(haz, var_name, var_val[sel_ev])
+                else:
+                    setattr(haz, var_name, list(map(var_val.__getitem__, sel_ev)))
             elif var_name == 'centroids':
                 if reg_id is not None:
                     setattr(haz, var_name, var_val.select(reg_id))
@@ -578,11 +647,115 @@ class Hazard():
 
         return haz
 
-    def local_exceedance_inten(self, return_periods=(25, 50, 100, 250)):
+    def select_thinned(self, ev_frac=0.2, severity=None, n_strata=10,
+                       return_per=(10, 25, 50, 100, 250), tolerance=0.1, seed=None):
+        """ Select a subset of the events by stratified sampling on an event
+        severity proxy and reweight their frequency. The events are split in
+        n_strata strata of events with similar severity. Each stratum gets a
+        number of sampled events proportional to its expected severity
+        (frequency x severity), at least one. The frequency of the sampled
+        events is scaled to keep the total frequency of every stratum. The
+        exceedance severity of the subset and of the whole set are compared
+        at the given return periods.
+
+        Parameters:
+            ev_frac (float, optional): fraction of events to select. Default: 0.2
+            severity (np.array, optional): severity of every event, e.g. the
+                impact at_event of a preliminary run. Default: maximum
+                intensity of each event.
+            n_strata (int, optional): number of strata. Default: 10
+            return_per (tuple, optional): return periods where the exceedance
+                severity is compared
+            tolerance (float, optional): warn if the relative error at any
+                return period exceeds this value. Default: 0.1
+            seed (int, optional): seed of the random sampling
+
+        Returns:
+            Hazard or children, np.array (relative error of the exceedance
+            severity at each return period)
+
+        Raises:
+            ValueError
+        """
+        if severity is None:
+            severity = self.get_event_stats().max_inten.values
+        severity = np.asarray(severity, float)
+        if severity.size != self.size:
+            LOGGER.error('Severity size differs from number of events: %s != %s.',
+                         severity.size, self.size)
+            raise ValueError
+        rnd_state = np.random.RandomState(seed)
+        n_sel = int(np.ceil(ev_frac*self.size))
+        strata = np.array_split(np.argsort(severity, kind='stable'),
+                                min(n_strata, self.size))
+        weights = np.array([np.sum(self.frequency[ev_pos]*severity[ev_pos]) \
+                            for ev_pos in strata])
+        if weights.sum() <= 0:
+            weights = np.ones(weights.size)
+        sel_ev, frequency = list(), self.frequency.astype(float)
+        for ev_pos, weight in zip(strata, weights):
+            n_stra = int(np.clip(np.round(n_sel*weight/weights.sum()), 1, ev_pos.size))
+            sel_pos = rnd_state.choice(ev_pos, n_stra, replace=False)
+            frequency[sel_pos] *= self.frequency[ev_pos].sum()/self.frequency[sel_pos].sum()
+            sel_ev.append(sel_pos)
+        sel_ev = np.sort(np.concatenate(sel_ev))
+
+        haz = self._select_events(sel_ev)
+        haz.frequency = frequency[sel_ev]
+        exc_all = _exceedance_severity(severity, self.frequency, return_per)
+        exc_sel = _exceedance_severity(severity[sel_ev], haz.frequency, return_per)
+        rel_err = np.abs(exc_sel - exc_all)/np.where(exc_all > 0, exc_all, 1)
+        LOGGER.info('Selected %s of %s events. Relative error of exceedance '
+                    'severity at return periods %s: %s', sel_ev.size, self.size,
+                    return_per, rel_err)
+        if np.any(rel_err > tolerance):
+            LOGGER.warning('Relative error of exceedance severity above %s.', tolerance)
+        return haz, rel_err
+
+    def coarsen(self, factor=2, method='max'):
+        """ Return the hazard aggregated on centroids with a resolution factor
+        times coarser (see Centroids.coarsen). Intensity and fraction of the
+        centroids falling in the same coarse centroid are aggregated with
+        their maximum or mean.
+
+        Parameters:
+            factor (int, optional): number of centroids aggregated along each
+                direction. Default: 2
+            method (str, optional): 'max' or 'mean'. Default: 'max'
+
+        Returns:
+            Hazard or children
+
+        Raises:
+            ValueError
+        """
+        if method not in ('max', 'mean'):
+            LOGGER.error('Wrong aggregation method: %s.', method)
+            raise ValueError
+        centr, agg = self.centroids.coarsen(factor)
+        try:
+            haz = self.__class__()
+        except TypeError:
+            haz = Hazard(self.tag.haz_type)
+        for (var_name, var_val) in self.__dict__.items():
+            if var_name.startswith('_'):
+                continue
+            if var_name == 'centroids':
+                setattr(haz, var_name, centr)
+            elif isinstance(var_val, sparse.csr_matrix):
+                setattr(haz, var_name, _aggregate_csr(var_val, agg, method))
+            else:
+                setattr(haz, var_name, copy.copy(var_val))
+        return haz
+
+    def local_exceedance_inten(self, return_periods=(25, 50, 100, 250), cache=False):
         """ Compute exceedance intensity map for given return periods.
 
         Parameters:
             return_periods (np.array): return periods to consider
+            cache (bool, optional): keep the centroid-major index of the
+                intensity for later per-centroid queries (it uses as much
+                memory as the intensity). Default: False
 
         Returns:
             np.array
@@ -600,14 +773,15 @@ class Hazard():
             LOGGER.error('Increase max_matrix_size configuration parameter to'\
                          ' > %s', str(self.intensity.shape[0]))
             raise ValueError
-        # separte in chunks
+        # separte in chunks of centroids
+        inten_csc = self._centr_csc(self.intensity, cache)
         chk = -1
         for chk in range(int(num_cen/cen_step)):
             self._loc_return_inten(np.array(return_periods), \
-                self.intensity[:, chk*cen_step:(chk+1)*cen_step].todense(), \
+                inten_csc[:, chk*cen_step:(chk+1)*cen_step].todense(), \
                 inten_stats[:, chk*cen_step:(chk+1)*cen_step])
         self._loc_return_inten(np.array(return_periods), \
-            self.intensity[:, (chk+1)*cen_step:].todense(), \
+            inten_csc[:, (chk+1)*cen_step:].todense(), \
             inten_stats[:, (chk+1)*cen_step:])
         # set values below 0 to zero if minimum of hazard.intensity >= 0:
         if self.intensity.min()>=0 and np.min(inten_stats)<0:
@@ -616,6 +790,71 @@ Reason: no negative intensity values were found in hazard.')
             inten_stats[inten_stats<0] = 0
         return inten_stats
 
+    def get_event_stats(self):
+        """ Get summary statistics of the intensity of every event: maximum
+        (max_inten) and sum (sum_inten) of the intensity, number of centroids
+        with non zero intensity (num_affected) and with intensity above
+        intensity_thres (num_above_thres), and area of the latter
+        (area_above_thres, only if the centroids' area_pixel is set). They are
+        computed at once for all the events and cached until the intensity,
+        the centroids or their area_pixel are replaced, intensity_thres
+        changes or clear_cache() is called. Once computed, they are saved
+        with write_hdf5.
+
+        Returns:
+            pd.DataFrame (index: event position)
+        """
+        area_pixel = self.centroids.area_pixel
+        if self._event_stats:
+            thres, area, ev_stats = self._event_stats
+            if thres == self.intensity_thres and area is area_pixel:
+                return ev_stats
+        LOGGER.debug('Computing statistics of %s events.', self.intensity.shape[0])
+        inten = self.intensity
+        non_empty = np.diff(inten.indptr) > 0
+        row_ini = inten.indptr[:-1][non_empty]
+        ev_stats = pd.DataFrame(index=np.arange(inten.shape[0]))
+        above_thres = inten.data > self.intensity_thres
+        stats = {'max_inten': (np.maximum, inten.data),
+                 'sum_inten': (np.add, inten.data),
+                 'num_affected': (np.add, (inten.data != 0).astype(int)),
+                 'num_above_thres': (np.add, above_thres.astype(int))}
+        if area_pixel.size:
+            stats['area_above_thres'] = (np.add, area_pixel[inten.indices]*above_thres)
+        for col_name, (ufunc, values) in stats.items():
+            col_val = np.zeros(inten.shape[0], values.dtype)
+            if row_ini.size:
+                col_val[non_empty] = ufunc.reduceat(values, row_ini)
+            ev_stats[col_name] = col_val
+        self._event_stats = (self.intensity_thres, area_pixel, ev_stats)
+        return ev_stats
+
+    def local_hazard_curve(self, centr_idx):
+        """ Compute hazard curve at one centroid: intensities of the events
+        with non zero intensity at the centroid in decreasing order and their
+        exceedance frequency. A centroid-major index of the intensity is built
+        on the first call and reused until the intensity is replaced or
+        clear_cache() is called.
+
+        Parameters:
+            centr_idx (int): centroid position
+
+        Returns:
+            np.array (intensity), np.array (exceedance frequency)
+
+        Raises:
+            ValueError
+        """
+        if not 0 <= centr_idx < self.intensity.shape[1]:
+            LOGGER.error('Wrong centroid position: %s.', centr_idx)
+            raise ValueError
+        inten_csc = self._centr_csc(self.intensity)
+        col_slice = slice(inten_csc.indptr[centr_idx], inten_csc.indptr[centr_idx+1])
+        inten = inten_csc.data[col_slice]
+        sort_pos = np.argsort(-inten, kind='stable')
+        freq = np.cumsum(self.frequency[inten_csc.indices[col_slice][sort_pos]])
+        return inten[sort_pos], freq
+
     def plot_rp_intensity(self, return_periods=(25, 50, 100, 250),
                           smooth=True, axis=None, **kwargs):
         """Compute and plot hazard exceedance intensity maps for different
@@ -734,8 +973,8 @@ Reason: no negative intensity values were found in hazard.')
         Returns:
             np.array(int)
         """
-        list_id = self.event_id[[i_name for i_name, val_name \
-            in enumerate(self.event_name) if val_name == event_name]]
+        list_id = self.event_id[self._event_index.get_name_pos(self.event_name,
+                                                                event_name)]
         if list_id.size == 0:
             LOGGER.error("No event with name: %s", event_name)
             raise ValueError
@@ -753,12 +992,11 @@ Reason: no negative intensity values were found in hazard.')
         Raises:
             ValueError
         """
-        try:
-            return self.event_name[np.argwhere(
-                self.event_id == event_id)[0][0]]
-        except IndexError:
+        ev_pos = self._event_index.get_id_pos(self.event_id, event_id)
+        if ev_pos < 0:
             LOGGER.error("No event with id: %s", event_id)
             raise ValueError
+        return self.event_name[ev_pos]
 
     def get_event_date(self, event=None):
         """ Return list of date strings for given event or for all events,
@@ -773,13 +1011,13 @@ Reason: no negative intensity values were found in hazard.')
         if event is None:
             l_dates = [u_dt.date_to_str(date) for date in self.date]
         elif isinstance(event, str):
-            ev_ids = self.get_event_id(event)
-            l_dates = [u_dt.date_to_str(self.date[ \
-                       np.argwhere(self.event_id == ev_id)[0][0]]) \
-                       for ev_id in ev_ids]
+            ev_pos = self._event_index.get_name_pos(self.event_name, event)
+            if not ev_pos.size:
+                LOGGER.error("No event with name: %s", event)
+                raise ValueError
+            l_dates = [u_dt.date_to_str(self.date[i_pos]) for i_pos in ev_pos]
         else:
-            ev_idx = np.argwhere(self.event_id == event)[0][0]
-            l_dates = [u_dt.date_to_str(self.date[ev_idx])]
+            l_dates = [u_dt.date_to_str(self.date[self._get_event_pos(event)])]
         return l_dates
 
     def calc_year_set(self):
@@ -789,18 +1027,22 @@ Reason: no negative intensity values were found in hazard.')
             dict: key are years, values array with event_ids of that year
 
         """
-        orig_year = np.array([dt.datetime.fromordinal(date).year
-                              for date in self.date[self.orig]])
-        orig_yearset = {}
-        for year in np.unique(orig_year):
-            orig_yearset[year] = self.event_id[self.orig][orig_year == year]
-        return orig_yearset
-
-    def append(self, hazard):
+        orig_year = u_dt.ordinal_to_year(self.date[self.orig])
+        orig_ids = self.event_id[self.orig]
+        years, year_pos = np.unique(orig_year, return_inverse=True)
+        # stable sort keeps the events of each year in their original order
+        sort_pos = np.argsort(year_pos, kind='stable')
+        split_ids = np.split(orig_ids[sort_pos],
+                             np.cumsum(np.bincount(year_pos, minlength=years.size))[:-1])
+        return dict(zip(years.tolist(), split_ids))
+
+    def append(self, hazard, compact=False):
         """Append events and centroids in hazard.
 
         Parameters:
             hazard (Hazard): Hazard instance to append to current
+            compact (bool, optional): remove intensities below intensity_thres
+                after appending (see compact()). Default: False
 
         Raises:
             ValueError
@@ -808,10 +1050,15 @@ Reason: no negative intensity values were found in hazard.')
         hazard._check_events()
         if self.event_id.size == 0:
             for key in hazard.__dict__:
+                if key in CACHE_ATTRS:
+                    continue
                 try:
                     self.__dict__[key] = copy.deepcopy(hazard.__dict__[key])
                 except TypeError:
                     self.__dict__[key] = copy.copy(hazard.__dict__[key])
+            self.clear_cache()
+            if compact:
+                self.compact()
             return
 
         if (self.units == '') and (hazard.units != ''):
@@ -825,7 +1072,6 @@ Reason: no negative intensity values were found in hazard.')
             raise ValueError
 
         self.tag.append(hazard.tag)
-        n_ini_ev = self.event_id.size
         # append all 1-dim variables
         for (var_name, var_val), haz_val in zip(self.__dict__.items(),
                                                 hazard.__dict__.values()):
@@ -844,32 +1090,25 @@ Reason: no negative intensity values were found in hazard.')
             self.fraction = sparse.vstack([self.fraction, hazard.fraction],
                                           format='csr')
         elif hazard.intensity.size:
-            n_ini_cen = self.centroids.size
-            self.centroids.append(hazard.centroids)
-
-            self.intensity = sparse.hstack([self.intensity, \
-                sparse.lil_matrix((self.intensity.shape[0], \
-                self.centroids.size - n_ini_cen))], format='lil')
-            self.fraction = sparse.hstack([self.fraction, \
-                sparse.lil_matrix((self.fraction.shape[0], \
-                self.centroids.size - n_ini_cen))], format='lil')
-            self.intensity = sparse.vstack([self.intensity, \
-                sparse.lil_matrix((hazard.intensity.shape[0],
-                                   self.intensity.shape[1]))], format='lil')
-            self.fraction = sparse.vstack([self.fraction, \
-                sparse.lil_matrix((hazard.intensity.shape[0],
-                                   self.intensity.shape[1]))], format='lil')
-
-            self.intensity[n_ini_ev:, -hazard.intensity.shape[1]:] = hazard.intensity
-            self.fraction[n_ini_ev:, -hazard.intensity.shape[1]:] = hazard.fraction
-            self.intensity = self.intensity.tocsr()
-            self.fraction = self.fraction.tocsr()
+            # position of hazard's centroids in the appended centroids
+            cen_map = self._append_centroids(hazard.centroids)
+            self.intensity = sparse.vstack([ \
+                _remap_csr_cols(self.intensity, None, self.centroids.size), \
+                _remap_csr_cols(hazard.intensity, cen_map, self.centroids.size)], \
+                format='csr')
+            self.fraction = sparse.vstack([ \
+                _remap_csr_cols(self.fraction, None, self.centroids.size), \
+                _remap_csr_cols(hazard.fraction, cen_map, self.centroids.size)], \
+                format='csr')
 
         # Make event id unique
         if np.unique(self.event_id).size != self.event_id.size:
             LOGGER.debug('Resetting event_id.')
             self.event_id = np.arange(self.event_id.size) + 1
 
+        if compact:
+            self.compact()
+
     def remove_duplicates(self):
         """Remove duplicate events (events with same name and date)."""
         dup_pos = list()
@@ -895,6 +1134,35 @@ Reason: no negative intensity values were found in hazard.')
         self.fraction = sparse.csr_matrix(self.fraction[mask].\
         reshape(self.event_id.size, self.intensity.shape[1]))
 
+    def compact(self, threshold=None):
+        """ Remove intensities below threshold together with the fraction at
+        the same positions. Explicit zeros are removed from both matrices.
+        Matrices sharing memory with another hazard (see select with view)
+        are copied before being compacted.
+
+        Parameters:
+            threshold (float, optional): intensities lower than this value are
+                removed. Default: intensity_thres.
+
+        Returns:
+            int (memory saved, in bytes)
+        """
+        if threshold is None:
+            threshold = self.intensity_thres
+        mem_ini = _csr_nbytes(self.intensity) + _csr_nbytes(self.fraction)
+        self.clear_cache()
+        self.intensity = _csr_owned(self.intensity)
+        self.fraction = _csr_owned(self.fraction)
+        self.intensity.data[self.intensity.data < threshold] = 0
+        self.intensity.eliminate_zeros()
+        if self.fraction.shape == self.intensity.shape:
+            self.fraction = self.fraction.multiply(self.intensity.astype(bool)).tocsr()
+        self.fraction.eliminate_zeros()
+        mem_saved = mem_ini - _csr_nbytes(self.intensity) - _csr_nbytes(self.fraction)
+        LOGGER.info('Compacting hazard with intensity threshold %s: %s bytes saved.',
+                    threshold, mem_saved)
+        return mem_saved
+
     @property
     def size(self):
         """ Returns number of events """
@@ -911,20 +1179,27 @@ Reason: no negative intensity values were found in hazard.')
         if not intensity:
             variable = self.fraction
         if self.centroids.meta:
-            co.write_raster(file_name, variable.todense(), self.centroids.meta)
+            co.write_raster(file_name, variable, self.centroids.meta)
         else:
-            pixel_geom = self.centroids.calc_pixels_polygons()
-            profile = self.centroids.meta
-            profile.update(driver='GTiff', dtype=rasterio.float32, count=self.size)
-            with rasterio.open(file_name, 'w', **profile) as dst:
-                LOGGER.info('Writting %s', file_name)
-                for i_ev in range(variable.shape[0]):
-                    raster = rasterize([(x, val) for (x, val) in \
-                        zip(pixel_geom, np.array(variable[i_ev, :].todense()).reshape(-1))], \
-                        out_shape=(profile['height'], profile['width']),\
-                        transform=profile['transform'], fill=0, \
-                        all_touched=True, dtype=profile['dtype'],)
-                    dst.write(raster.astype(profile['dtype']), i_ev+1)
+            # pixel of every centroid, computed once for all the events
+            res = min(co.get_resolution(self.centroids.lat, self.centroids.lon))
+            rows, cols, ras_trans = co.pts_to_raster_meta(self.centroids.total_bounds, res)
+            pix_idx = co.pts_to_raster_idx(self.centroids.lat, self.centroids.lon,
+                                           ras_trans, cols, rows)
+            # centroids in the same pixel: the last one is written, as in
+            # the rasterization of their polygons
+            _, last_cen = np.unique(pix_idx[::-1], return_index=True)
+            if last_cen.size < pix_idx.size:
+                last_cen = np.sort(pix_idx.size - 1 - last_cen)
+                variable = variable[:, last_cen]
+                pix_idx = pix_idx[last_cen]
+            variable = variable.tocoo()
+            variable = sparse.csr_matrix((variable.data, (variable.row,
+                                                          pix_idx[variable.col])),
+                                         shape=(variable.shape[0], rows*cols))
+            meta = {'crs': self.centroids.crs, 'height': rows, 'width': cols,
+                    'transform': ras_trans}
+            co.write_raster(file_name, variable, meta)
 
     def write_hdf5(self, file_name,todense=False):
         """ Write hazard in hdf5 format.
@@ -936,6 +1211,8 @@ Reason: no negative intensity values were found in hazard.')
         hf_data = h5py.File(file_name, 'w')
         str_dt = h5py.special_dtype(vlen=str)
         for (var_name, var_val) in self.__dict__.items():
+            if var_name.startswith('_'):
+                continue
             if var_name == 'centroids':
                 self.centroids.write_hdf5(hf_data.create_group(var_name))
             elif var_name == 'tag':
@@ -963,18 +1240,29 @@ Reason: no negative intensity values were found in hazard.')
                     hf_str[i_ev] = var_ev
             elif var_val is not None and var_name != 'pool':
                 hf_data.create_dataset(var_name, data=var_val)
+        if self._event_stats:
+            thres, _, ev_stats = self._event_stats
+            hf_stats = hf_data.create_group('event_stats')
+            hf_stats.attrs['intensity_thres'] = thres
+            hf_stats.attrs['intensity_nnz'] = self.intensity.nnz
+            for col_name, col_val in ev_stats.items():
+                hf_stats.create_dataset(col_name, data=col_val.values)
         hf_data.close()
 
-    def read_hdf5(self, file_name):
+    def read_hdf5(self, file_name, compact=False):
         """ Read hazard in hdf5 format.
 
         Parameters:
             file_name (str): file name to read, with h5 format
+            compact (bool, optional): remove intensities below intensity_thres
+                after reading (see compact()). Default: False
         """
         LOGGER.info('Reading %s', file_name)
         self.clear()
         hf_data = h5py.File(file_name, 'r')
         for (var_name, var_val) in self.__dict__.items():
+            if var_name.startswith('_'):
+                continue
             if var_name == 'centroids':
                 self.centroids.read_hdf5(hf_data.get(var_name))
             elif var_name == 'tag':
@@ -996,7 +1284,19 @@ Reason: no negative intensity values were found in hazard.')
                 setattr(self, var_name, np.array(hf_data.get(var_name)).tolist())
             else:
                 setattr(self, var_name, hf_data.get(var_name))
+        hf_stats = hf_data.get('event_stats')
+        # use the saved statistics only if they match the read intensity
+        if hf_stats is not None and \
+        hf_stats.attrs.get('intensity_nnz') == self.intensity.nnz and \
+        all(col_val.size == self.intensity.shape[0] for col_val in hf_stats.values()):
+            ev_stats = pd.DataFrame(index=np.arange(self.intensity.shape[0]))
+            for col_name, col_val in hf_stats.items():
+                ev_stats[col_name] = col_val[:]
+            self._event_stats = (hf_stats.attrs['intensity_thres'],
+                                 self.centroids.area_pixel, ev_stats)
         hf_data.close()
+        if compact:
+            self.compact()
 
     def _append_all(self, list_haz_ev):
         """Append event by event with same centroids. Takes centroids and units
@@ -1040,6 +1340,24 @@ Reason: no negative intensity values were found in hazard.')
         self.fraction = self.fraction.tocsr()
         self.event_id = np.arange(1, num_ev+1)
 
+    def _get_event_pos(self, event_id):
+        """ Get row position of an event id.
+
+        Parameters:
+            event_id (int): id of the event
+
+        Returns:
+            int
+
+        Raises:
+            ValueError
+        """
+        ev_pos = self._event_index.get_id_pos(self.event_id, event_id)
+        if ev_pos < 0:
+            LOGGER.error('Wrong event id: %s.', event_id)
+            raise ValueError
+        return ev_pos
+
     def _set_coords_centroids(self):
         """ If centroids are raster, set lat and lon coordinates """
         if self.centroids.meta and not self.centroids.coord.size:
@@ -1075,16 +1393,15 @@ Reason: no negative intensity values were found in hazard.')
         l_title = list()
         for ev_id in event_id:
             if ev_id > 0:
-                try:
-                    event_pos = np.where(self.event_id == ev_id)[0][0]
-                except IndexError:
-                    LOGGER.error('Wrong event id: %s.', ev_id)
-                    raise ValueError from IndexError
+                event_pos = self._get_event_pos(ev_id)
                 im_val = mat_var[event_pos, :].todense().transpose()
                 title = 'Event ID %s: %s' % (str(self.event_id[event_pos]), \
                                           self.event_name[event_pos])
             elif ev_id < 0:
-                max_inten = np.asarray(np.sum(mat_var, axis=1)).reshape(-1)
+                if mat_var is self.intensity:
+                    max_inten = self.get_event_stats().sum_inten.values
+                else:
+                    max_inten = np.asarray(np.sum(mat_var, axis=1)).reshape(-1)
                 event_pos = np.argpartition(max_inten, ev_id)[ev_id:]
                 event_pos = event_pos[np.argsort(max_inten[event_pos])][0]
                 im_val = mat_var[event_pos, :].todense().transpose()
@@ -1125,14 +1442,14 @@ Reason: no negative intensity values were found in hazard.')
             except IndexError:
                 LOGGER.error('Wrong centroid id: %s.', centr_idx)
                 raise ValueError from IndexError
-            array_val = mat_var[:, centr_pos].todense()
+            array_val = self._centr_csc(mat_var)[:, centr_pos].todense()
             title = 'Centroid %s: (%s, %s)' % (str(centr_idx), \
                     coord[centr_pos, 0], coord[centr_pos, 1])
         elif centr_idx < 0:
             max_inten = np.asarray(np.sum(mat_var, axis=0)).reshape(-1)
             centr_pos = np.argpartition(max_inten, centr_idx)[centr_idx:]
             centr_pos = centr_pos[np.argsort(max_inten[centr_pos])][0]
-            array_val = mat_var[:, centr_pos].todense()
+            array_val = self._centr_csc(mat_var)[:, centr_pos].todense()
 
             title = '%s-largest Centroid. %s: (%s, %s)' % \
                 (np.abs(centr_idx), str(centr_pos), coord[centr_pos, 0], \
@@ -1152,6 +1469,71 @@ Reason: no negative intensity values were found in hazard.')
         axis.set_xlim([0, len(array_val)])
         return axis
 
+    def _select_events(self, sel_ev):
+        """ Return hazard with the events at the given positions and the same
+        centroids.
+
+        Parameters:
+            sel_ev (np.array): events positions
+
+        Returns:
+            Hazard or children
+        """
+        try:
+            haz = self.__class__()
+        except TypeError:
+            haz = Hazard(self.tag.haz_type)
+        for (var_name, var_val) in self.__dict__.items():
+            if var_name.startswith('_'):
+                continue
+            if isinstance(var_val, np.ndarray) and var_val.ndim == 1 and \
+            var_val.size:
+                setattr(haz, var_name, var_val[sel_ev])
+            elif isinstance(var_val, sparse.csr_matrix):
+                setattr(haz, var_name, var_val[sel_ev, :])
+            elif isinstance(var_val, list) and var_val:
+                setattr(haz, var_name, [var_val[idx] for idx in sel_ev])
+            else:
+                setattr(haz, var_name, var_val)
+        return haz
+
+    def _append_centroids(self, centroids):
+        """ Append centroids to the hazard's centroids. Points already
+        contained (same lat and lon) are not appended again.
+
+        Parameters:
+            centroids (Centroids): centroids to append
+
+        Returns:
+            np.array (position of every appended centroid in the hazard's
+            centroids)
+        """
+        if self.centroids.meta or centroids.meta:
+            self.centroids.append(centroids)
+            return np.arange(self.centroids.size - centroids.size, self.centroids.size)
+        return self.centroids.append(centroids, unique=True)
+
+    def _centr_csc(self, mat_var, cache=True):
+        """ Centroid-major copy (sparse.csc_matrix) of intensity or fraction.
+        It is built once and cached until the matrix is replaced or
+        clear_cache() is called.
+
+        Parameters:
+            mat_var (sparse.csr_matrix): intensity or fraction
+            cache (bool, optional): keep a newly built index for later calls.
+                Default: True
+
+        Returns:
+            sparse.csc_matrix
+        """
+        mat, mat_csc = self._centr_index.get(id(mat_var), (None, None))
+        if mat is not mat_var:
+            LOGGER.debug('Building centroid index of %s values.', mat_var.nnz)
+            mat_csc = mat_var.tocsc()
+            if cache:
+                self._centr_index[id(mat_var)] = (mat_var, mat_csc)
+        return mat_csc
+
     def _loc_return_inten(self, return_periods, inten, exc_inten):
         """ Compute local exceedence intensity for given return period.
 
@@ -1314,3 +1696,68 @@ Reason: no negative intensity values were found in hazard.')
         self.intensity = sparse.csr_matrix(dfr.values[:, 1:num_events+1].transpose())
         self.fraction = sparse.csr_matrix(np.ones(self.intensity.shape,
                                                   dtype=np.float))
+
+def _csr_nbytes(mat):
+    """ Memory used by the arrays of a sparse.csr_matrix, in bytes """
+    return mat.data.nbytes + mat.indices.nbytes + mat.indptr.nbytes
+
+def _csr_owned(mat):
+    """ Return mat or, if its arrays are views of other arrays, a copy of it
+    which can be modified in place """
+    if mat.data.base is None and mat.indices.base is None and \
+    mat.indptr.base is None:
+        return mat
+    return mat.copy()
+
+def _exceedance_severity(severity, frequency, return_per):
+    """ Severity exceeded at the given return periods (interpolated on the
+    exceedance frequency curve as in Impact.calc_freq_curve) """
+    sort_idxs = np.argsort(severity)[::-1]
+    exceed_freq = np.cumsum(frequency[sort_idxs])
+    return np.interp(return_per, 1/exceed_freq[::-1], severity[sort_idxs][::-1])
+
+def _remap_csr_cols(mat, cen_map, num_cen):
+    """ Move the columns of a sparse.csr_matrix to the positions in cen_map
+    (keep them if None) in a matrix with num_cen columns """
+    indices = mat.indices if cen_map is None else cen_map[mat.indices]
+    mat = sparse.csr_matrix((mat.data, indices, mat.indptr), shape=(mat.shape[0], num_cen))
+    if cen_map is not None:
+        mat.sort_indices()
+    return mat
+
+def _select_csr(mat, sel_ev, cen_map=None, view=False):
+    """ Select rows of a sparse.csr_matrix and, if cen_map is provided, remap
+    its columns to their new position in cen_map (removing columns with -1).
+    Rows given as a slice share the memory of mat if view is True. """
+    if isinstance(sel_ev, slice):
+        indptr = mat.indptr[sel_ev.start:sel_ev.stop+1]
+        data = mat.data[indptr[0]:indptr[-1]]
+        indices = mat.indices[indptr[0]:indptr[-1]]
+        if not view:
+            data, indices = data.copy(), indices.copy()
+        mat = sparse.csr_matrix((data, indices, indptr - indptr[0]),
+                                shape=(sel_ev.stop - sel_ev.start, mat.shape[1]))
+    else:
+        mat = mat[sel_ev, :]
+    if cen_map is None:
+        return mat
+    new_col = cen_map[mat.indices]
+    keep = new_col >= 0
+    indptr = np.append(0, np.cumsum(keep))[mat.indptr]
+    return sparse.csr_matrix((mat.data[keep], new_col[keep], indptr),
+                             shape=(mat.shape[0], np.count_nonzero(cen_map >= 0)))
+
+def _aggregate_csr(mat, agg, method):
+    """ Aggregate the columns of a sparse.csr_matrix with the aggregation
+    matrix agg (columns x aggregated columns) using 'max' or 'mean' """
+    if method == 'mean':
+        num_cen = np.asarray(agg.sum(axis=0)).reshape(-1)
+        return sparse.csr_matrix(mat.dot(agg).multiply(1/num_cen))
+    mat = mat.tocoo()
+    key = mat.row.astype(np.int64)*agg.shape[1] + agg.indices[mat.col]
+    # keep last (i.e. maximum) value of every aggregated column in each row
+    sort_idx = np.lexsort((mat.data, key))
+    key, data = key[sort_idx], mat.data[sort_idx]
+    last = np.append(key[1:] != key[:-1], True)
+    row, col = np.divmod(key[last], agg.shape[1])
+    return sparse.csr_matrix((data[last], (row, col)), shape=(mat.shape[0], agg.shape[1]))
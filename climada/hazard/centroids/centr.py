@@ -20,24 +20,29 @@ Define Centroids class.
 """
 
 import ast
+import hashlib
 import shutil
 import copy
 import logging
+import warnings
 import numpy as np
 from scipy import sparse
 import h5py
 import pandas as pd
 from rasterio import Affine
 from rasterio.warp import Resampling, reproject
+from rasterio.crs import CRS
 import rasterio
-from geopandas import GeoSeries
+from geopandas import GeoSeries, points_from_xy
 from shapely.geometry.point import Point
 
 import climada.util.plot as u_plot
 from climada.util.constants import DEF_CRS, ONE_LAT_KM
 import climada.util.hdf5_handler as hdf5
-from climada.util.coordinates import dist_to_coast, get_resolution, coord_on_land, \
-pts_to_raster_meta, read_raster, read_vector, equal_crs, get_country_code
+from climada.util.interpolation import nn_tree
+from climada.util.coordinates import dist_to_coast, dist_to_coast_raster, grid_is_regular, \
+get_resolution, coord_on_land, pts_to_raster_meta, pts_to_raster_idx, pts_to_boxes, \
+read_raster_sparse, read_vector, equal_crs, get_country_code, get_pixel_area
 from climada.util.coordinates import NE_CRS, TMP_ELEVATION_FILE, DEM_NODATA, \
 MAX_DEM_TILES_DOWN
 
@@ -104,6 +109,24 @@ class Centroids():
         self.on_land = np.array([])
         self.region_id = np.array([])
         self.elevation = np.array([])
+        self.clear_cache()
+
+    def __setattr__(self, name, value):
+        """ Drop the caches built from the coordinates when they are replaced """
+        super().__setattr__(name, value)
+        if name in ('lat', 'lon', 'geometry', 'meta'):
+            self.clear_cache()
+
+    def clear_cache(self):
+        """ Drop the cached hash, regular grid and spatial indexes of the
+        points. They are dropped automatically when lat, lon, geometry or meta
+        are replaced. Call it after modifying them in place. """
+        # cache of the coordinates' hash
+        self._fingerprint = ''
+        # cache of the regular grid of the points
+        self._regular_grid = tuple()
+        # cache of the spatial indexes of the points for each distance
+        self._nn_tree = dict()
 
     def check(self):
         """ Check that either raster meta attribute is set or points lat, lon
@@ -134,6 +157,12 @@ class Centroids():
         Returns:
             bool
         """
+        if self.fingerprint == centr.fingerprint and (self.meta or \
+        equal_crs(self.geometry.crs, centr.geometry.crs) and \
+        (self.lat is centr.lat or np.array_equal(self.lat, centr.lat)) and \
+        (self.lon is centr.lon or np.array_equal(self.lon, centr.lon))):
+            # exact check of the points in case of in place modifications
+            return True
         if self.meta and centr.meta:
             return equal_crs(self.meta['crs'], centr.meta['crs']) and \
             self.meta['height'] == centr.meta['height'] and \
@@ -188,7 +217,7 @@ class Centroids():
 
     def set_raster_file(self, file_name, band=[1], src_crs=None, window=False,
                         geometry=False, dst_crs=False, transform=None, width=None,
-                        height=None, resampling=Resampling.nearest):
+                        height=None, resampling=Resampling.nearest, threshold=None):
         """ Read raster of bands and set 0 values to the masked ones. Each
         band is an event. Select region using window or geometry. Reproject
         input by proving dst_crs and/or (transform, width, height).
@@ -205,6 +234,7 @@ class Centroids():
             height (float): number of lats for transform
             resampling (rasterio.warp,.Resampling optional): resampling
                 function used for reprojection to dst_crs
+            threshold (float, optional): values below threshold are dropped too.
 
         Raises:
             ValueError
@@ -212,21 +242,23 @@ class Centroids():
         Returns:
             np.array
         """
+        # stream the raster without building the dense bands
+        tmp_meta, inten = read_raster_sparse(file_name, band, window, threshold,
+                                             src_crs=src_crs, dst_crs=dst_crs,
+                                             transform=transform, width=width,
+                                             height=height, resampling=resampling,
+                                             geometry=geometry)
         if not self.meta:
-            self.meta, inten = read_raster(file_name, band, src_crs, window,
-                                           geometry, dst_crs, transform, width,
-                                           height, resampling)
-            return sparse.csr_matrix(inten)
+            self.meta = tmp_meta
+            return inten
 
-        tmp_meta, inten = read_raster(file_name, band, src_crs, window, geometry,
-                                      dst_crs, transform, width, height, resampling)
         if (tmp_meta['crs'] != self.meta['crs']) or \
         (tmp_meta['transform'] != self.meta['transform']) or \
         (tmp_meta['height'] != self.meta['height']) or \
         (tmp_meta['width'] != self.meta['width']):
             LOGGER.error('Raster data inconsistent with contained raster.')
             raise ValueError
-        return sparse.csr_matrix(inten)
+        return inten
 
     def set_vector_file(self, file_name, inten_name=['intensity'], dst_crs=None):
         """ Read vector file format supported by fiona. Each intensity name is
@@ -330,8 +362,25 @@ class Centroids():
         """ Clear vector and raster data """
         self.__init__()
 
-    def append(self, centr):
-        """ Append raster or points. Raster needs to have the same resolution """
+    def append(self, centr, unique=False, tolerance=None):
+        """ Append raster or points. Raster needs to have the same resolution.
+        Points of centr already contained in the centroids, or repeated in
+        centr, are not appended again if unique is True.
+
+        Parameters:
+            centr (Centroids): centroids to append
+            unique (bool, optional): append only points of centr with new
+                coordinates. Default: False
+            tolerance (float, optional): coordinates are compared rounded to
+                this tolerance (units of lat and lon). Default: exact values
+
+        Returns:
+            np.array (position of every point of centr in the centroids) or
+            None if rasters are appended
+        """
+        cen_map = None
+        # points of centr to append
+        sel_cen = slice(None)
         if self.meta and centr.meta:
             LOGGER.debug('Appending raster')
             if centr.meta['crs'] != self.meta['crs']:
@@ -357,17 +406,27 @@ class Centroids():
             if not equal_crs(centr.geometry.crs, self.geometry.crs):
                 LOGGER.error('Different CRS not accepted.')
                 raise ValueError
-            self.lat = np.append(self.lat, centr.lat)
-            self.lon = np.append(self.lon, centr.lon)
+            n_ini_cen = self.lat.size
+            cen_map = np.arange(n_ini_cen, n_ini_cen + centr.lat.size)
+            if unique:
+                cen_map, new_cen = _coord_map(self.lat, self.lon, centr.lat,
+                                              centr.lon, tolerance)
+                if new_cen.size < centr.lat.size:
+                    sel_cen = new_cen
+            self.lat = np.append(self.lat, centr.lat[sel_cen])
+            self.lon = np.append(self.lon, centr.lon[sel_cen])
             self.meta = dict()
 
         # append all 1-dim variables
-        for (var_name, var_val), centr_val in zip(self.__dict__.items(),
-                                                  centr.__dict__.values()):
+        for var_name, var_val in self.__dict__.items():
             if isinstance(var_val, np.ndarray) and var_val.ndim == 1 and \
             var_name not in ('lat', 'lon'):
+                centr_val = getattr(centr, var_name)
+                if centr_val.size:
+                    centr_val = centr_val[sel_cen]
                 setattr(self, var_name, np.append(var_val, centr_val). \
                         astype(var_val.dtype, copy=False))
+        return cen_map
 
     def get_closest_point(self, x_lon, y_lat, scheduler=None):
         """ Returns closest centroid and its index to a given point.
@@ -375,12 +434,14 @@ class Centroids():
         Parameters:
             x_lon (float): x coord (lon)
             y_lat (float): y coord (lat)
-            scheduler (str): used for dask map_partitions. “threads”,
-                “synchronous” or “processes”
+            scheduler (str, optional): deprecated, not used anymore
 
         Returns:
             x_close (float), y_close (float), idx_close (int)
         """
+        if scheduler is not None:
+            warnings.warn('The scheduler argument is ignored and will be removed.',
+                          DeprecationWarning, stacklevel=2)
         if self.meta:
             if not self.lat.size or not self.lon.size:
                 self.set_meta_to_lat_lon()
@@ -388,53 +449,66 @@ class Centroids():
             i_lon = np.floor((x_lon - self.meta['transform'][2])/abs(self.meta['transform'][0]))
             close_idx = int(i_lat*self.meta['width'] + i_lon)
         else:
-            self.set_geometry_points(scheduler)
-            close_idx = self.geometry.distance(Point(x_lon, y_lat)).values.argmin()
+            close_idx = np.hypot(self.lon - x_lon, self.lat - y_lat).argmin()
         return self.lon[close_idx], self.lat[close_idx], close_idx
 
-    def set_region_id(self, scheduler=None):
+    def set_region_id(self, scheduler=None, precomputed=False):
         """ Set region_id as country ISO numeric code attribute for every pixel
         or point
 
         Parameter:
             scheduler (str): used for dask map_partitions. “threads”,
                 “synchronous” or “processes”
+            precomputed (bool, optional): look up the codes in the country
+                raster of util.coordinates.get_country_code. Default: False
         """
+        if precomputed:
+            lat, lon = self._ne_crs_lat_lon(scheduler)
+            LOGGER.debug('Setting region_id %s points.', str(lat.size))
+            self.region_id = get_country_code(lat, lon, precomputed=True)
+            return
         ne_geom = self._ne_crs_geom(scheduler)
         LOGGER.debug('Setting region_id %s points.', str(self.lat.size))
         self.region_id = get_country_code(ne_geom.geometry[:].y.values,
                                           ne_geom.geometry[:].x.values)
 
     def set_area_pixel(self, min_resol=1.0e-8, scheduler=None):
-        """ Set area_pixel attribute for every pixel or point. area in m*m
+        """ Set area_pixel attribute for every pixel or point. area in m*m.
+        Pixels in lat/lon get the exact area of their ellipsoidal zone,
+        computed once per row for rasters. Pixels in other non metric CRS are
+        reprojected to an equal area projection.
 
         Parameter:
             min_resol (float, optional): if centroids are points, use this minimum
                 resolution in lat and lon. Default: 1.0e-8
-            scheduler (str): used for dask map_partitions. “threads”,
-                “synchronous” or “processes”
+            scheduler (str, optional): deprecated, not used anymore
         """
+        if scheduler is not None:
+            warnings.warn('The scheduler argument is ignored and will be removed.',
+                          DeprecationWarning, stacklevel=2)
+        crs = CRS.from_user_input(self.meta['crs'] if self.meta else self.geometry.crs)
         if self.meta:
-            if hasattr(self.meta['crs'], 'linear_units') and \
-            str.lower(self.meta['crs'].linear_units) in ['m', 'metre', 'meter']:
-                self.area_pixel = np.zeros((self.meta['height'], self.meta['width']))
-                self.area_pixel *= abs(self.meta['transform'].a)*abs(self.meta['transform'].e)
-                return
-            if abs(abs(self.meta['transform'].a) -
-                   abs(self.meta['transform'].e)) > 1.0e-5:
-                LOGGER.error('Area can not be computed for not squared pixels.')
-                raise ValueError
-            res = self.meta['transform'].a
+            res_lat = abs(self.meta['transform'].e)
+            res_lon = abs(self.meta['transform'].a)
         else:
-            res = min(get_resolution(self.lat, self.lon, min_resol))
-        self.set_geometry_points(scheduler)
-        LOGGER.debug('Setting area_pixel %s points.', str(self.lat.size))
-        xy_pixels = self.geometry.buffer(res/2).envelope
-        if ('units' in self.geometry.crs and \
-        self.geometry.crs['units'] in ['m', 'metre', 'meter']) or \
-        equal_crs(self.geometry.crs, {'proj':'cea'}):
-            self.area_pixel = xy_pixels.area.values
+            res_lat = res_lon = min(get_resolution(self.lat, self.lon, min_resol))
+        LOGGER.debug('Setting area_pixel %s points.', str(self.size))
+        if _is_metric_crs(crs):
+            self.area_pixel = np.full(self.size, res_lat * res_lon)
+        elif crs.is_geographic and self.meta:
+            lat_rows = self.meta['transform'].f + \
+                (np.arange(self.meta['height']) + 0.5) * self.meta['transform'].e
+            self.area_pixel = np.repeat(get_pixel_area(lat_rows, res_lat, res_lon),
+                                        self.meta['width'])
+        elif crs.is_geographic:
+            self.area_pixel = get_pixel_area(self.lat, res_lat, res_lon)
         else:
+            if abs(res_lat - res_lon) > 1.0e-5:
+                LOGGER.error('Area can not be computed for not squared pixels.')
+                raise ValueError
+            if not self.lat.size or not self.lon.size:
+                self.set_meta_to_lat_lon()
+            xy_pixels = GeoSeries(pts_to_boxes(self.lat, self.lon, res_lat), crs=crs)
             self.area_pixel = xy_pixels.to_crs(crs={'proj':'cea'}).area.values
 
     def set_area_approx(self, min_resol=1.0e-8):
@@ -446,10 +520,9 @@ class Centroids():
                 resolution in lat and lon. Default: 1.0e-8
         """
         if self.meta:
-            if hasattr(self.meta['crs'], 'linear_units') and \
-            str.lower(self.meta['crs'].linear_units) in ['m', 'metre', 'meter']:
-                self.area_pixel = np.zeros((self.meta['height'], self.meta['width']))
-                self.area_pixel *= abs(self.meta['transform'].a)*abs(self.meta['transform'].e)
+            if _is_metric_crs(self.meta['crs']):
+                self.area_pixel = np.full(self.size, abs(self.meta['transform'].a) * \
+                                          abs(self.meta['transform'].e))
                 return
             res_lat, res_lon = self.meta['transform'].e, self.meta['transform'].a
             lat_unique = np.arange(self.meta['transform'].f + res_lat/2, \
@@ -460,10 +533,8 @@ class Centroids():
             res_lat, res_lon = get_resolution(self.lat, self.lon, min_resol)
             lat_unique = np.array(np.unique(self.lat))
             lon_unique_len = len(np.unique(self.lon))
-            if ('units' in self.geometry.crs and \
-            self.geometry.crs['units'] in ['m', 'metre', 'meter']) or \
-            equal_crs(self.geometry.crs, {'proj':'cea'}):
-                self.area_pixel = np.repeat(res_lat * res_lon, lon_unique_len)
+            if _is_metric_crs(self.geometry.crs):
+                self.area_pixel = np.full(self.size, res_lat * res_lon)
                 return
 
         LOGGER.debug('Setting area_pixel approx %s points.', str(self.lat.size))
@@ -476,43 +547,70 @@ class Centroids():
             LOGGER.error('Pixel area of points can not be computed.')
             raise ValueError
 
-    def set_dist_coast(self, scheduler=None):
+    def set_dist_coast(self, scheduler=None, precomputed=False):
         """ Set dist_coast attribute for every pixel or point. Distance to
         coast is computed in meters.
 
         Parameter:
             scheduler (str): used for dask map_partitions. “threads”,
                 “synchronous” or “processes”
+            precomputed (bool, optional): interpolate the distances from the
+                global raster of util.coordinates.dist_to_coast_raster instead
+                of computing them exactly. Default: False
         """
+        if precomputed:
+            lat, lon = self._ne_crs_lat_lon(scheduler)
+            LOGGER.debug('Setting dist_coast %s points.', str(lat.size))
+            self.dist_coast = dist_to_coast_raster(lat, lon)
+            return
         ne_geom = self._ne_crs_geom(scheduler)
         LOGGER.debug('Setting dist_coast %s points.', str(self.lat.size))
         self.dist_coast = dist_to_coast(ne_geom)
 
-    def set_on_land(self, scheduler=None):
+    def set_on_land(self, scheduler=None, precomputed=False):
         """ Set on_land attribute for every pixel or point
 
         Parameter:
             scheduler (str): used for dask map_partitions. “threads”,
                 “synchronous” or “processes”
+            precomputed (bool, optional): look up the country raster of
+                util.coordinates.get_country_code. Default: False
         """
+        if precomputed:
+            lat, lon = self._ne_crs_lat_lon(scheduler)
+            LOGGER.debug('Setting on_land %s points.', str(lat.size))
+            self.on_land = coord_on_land(lat, lon, precomputed=True)
+            return
         ne_geom = self._ne_crs_geom(scheduler)
         LOGGER.debug('Setting on_land %s points.', str(self.lat.size))
         self.on_land = coord_on_land(ne_geom.geometry[:].y.values, ne_geom.geometry[:].x.values)
 
-    def remove_duplicate_points(self, scheduler=None):
-        """ Return Centroids with removed duplicated points
+    def remove_duplicate_points(self, scheduler=None, tolerance=None,
+                                return_map=False):
+        """ Return Centroids with removed duplicated points. The first
+        occurrence of every coordinate is kept.
 
-        Parameter:
-            scheduler (str): used for dask map_partitions. “threads”,
-                “synchronous” or “processes”
+        Parameters:
+            scheduler (str, optional): deprecated, not used anymore
+            tolerance (float, optional): coordinates are compared rounded to
+                this tolerance (units of lat and lon). Default: exact values
+            return_map (bool, optional): return as well the position of every
+                current point in the returned centroids. Default: False
 
         Returns:
-            Centroids
+            Centroids, np.array (if return_map)
         """
-        self.set_geometry_points(scheduler)
-        geom_wkb = self.geometry.apply(lambda geom: geom.wkb)
-        sel_cen = geom_wkb.drop_duplicates().index
-        return self.select(sel_cen=sel_cen)
+        if scheduler is not None:
+            warnings.warn('The scheduler argument is ignored and will be removed.',
+                          DeprecationWarning, stacklevel=2)
+        if not self.lat.size or not self.lon.size:
+            self.set_meta_to_lat_lon()
+        cen_map, sel_cen = _coord_map(np.array([]), np.array([]), self.lat,
+                                      self.lon, tolerance)
+        centr = self.select(sel_cen=sel_cen)
+        if return_map:
+            return centr, cen_map
+        return centr
 
     def select(self, reg_id=None, sel_cen=None):
         """ Return Centroids with points in the given reg_id or within mask
@@ -542,6 +640,55 @@ class Centroids():
             centr.dist_coast = self.dist_coast[sel_cen]
         return centr
 
+    def coarsen(self, factor=2):
+        """ Return Centroids on a grid with a resolution factor times coarser
+        and the sparse matrix aggregating the current centroids to the coarse
+        ones. Raster centroids give a raster of blocks of factor x factor
+        pixels. Point centroids are gathered in the cells of the coarse grid
+        and the coarse centroids are the centers of the non empty cells.
+        The area of the pixels is aggregated, if present.
+
+        Parameters:
+            factor (int, optional): number of centroids aggregated along each
+                direction. Default: 2
+
+        Returns:
+            Centroids, sparse.csr_matrix (num_centroids x num_coarse_centroids)
+        """
+        factor = int(factor)
+        if factor < 1:
+            LOGGER.error('Wrong coarsening factor: %s.', factor)
+            raise ValueError
+
+        centr = Centroids()
+        if self.meta:
+            rows, cols = np.divmod(np.arange(self.size), self.meta['width'])
+            trans = self.meta['transform']
+            centr.meta = {'width': int(np.ceil(self.meta['width']/factor)),
+                          'height': int(np.ceil(self.meta['height']/factor)),
+                          'crs': self.meta['crs'],
+                          'transform': Affine(trans.a*factor, trans.b, trans.c,
+                                              trans.d, trans.e*factor, trans.f)}
+            coarse_idx = rows//factor*centr.meta['width'] + cols//factor
+            num_coarse = centr.size
+        else:
+            res = min(get_resolution(self.lat, self.lon))
+            xmin, ymin, xmax, ymax = self.total_bounds
+            width = int(np.floor((xmax - xmin + res/2)/(res*factor)) + 1)
+            height = int(np.floor((ymax - ymin + res/2)/(res*factor)) + 1)
+            trans = Affine(res*factor, 0, xmin - res/2, 0, -res*factor, ymax + res/2)
+            pix_idx = pts_to_raster_idx(self.lat, self.lon, trans, width, height)
+            pix_idx, coarse_idx = np.unique(pix_idx, return_inverse=True)
+            row_idx, col_idx = np.divmod(pix_idx, width)
+            centr.set_lat_lon(trans.f + (row_idx + 0.5)*trans.e,
+                              trans.c + (col_idx + 0.5)*trans.a, self.crs)
+            num_coarse = pix_idx.size
+        agg = sparse.csr_matrix((np.ones(self.size), (np.arange(self.size), coarse_idx)),
+                                shape=(self.size, num_coarse))
+        if self.area_pixel.size:
+            centr.area_pixel = agg.T.dot(self.area_pixel)
+        return centr, agg
+
     def set_lat_lon_to_meta(self, min_resol=1.0e-8):
         """ Compute meta from lat and lon values. To match the existing lat
         and lon, lat and lon need to start from the upper left corner!!
@@ -589,20 +736,24 @@ class Centroids():
         """ Return a GeoSeries with a polygon for every pixel
 
         Parameter:
-            scheduler (str): used for dask map_partitions. “threads”,
-                “synchronous” or “processes”
+            scheduler (str, optional): deprecated, not used anymore
 
         Returns:
             GeoSeries
         """
+        if scheduler is not None:
+            warnings.warn('The scheduler argument is ignored and will be removed.',
+                          DeprecationWarning, stacklevel=2)
         if not self.meta:
             self.set_lat_lon_to_meta()
         if abs(abs(self.meta['transform'].a) -
                abs(self.meta['transform'].e)) > 1.0e-5:
             LOGGER.error('Area can not be computed for not squared pixels.')
             raise ValueError
-        self.set_geometry_points(scheduler)
-        return self.geometry.buffer(self.meta['transform'].a/2).envelope
+        if not self.lat.size or not self.lon.size:
+            self.set_meta_to_lat_lon()
+        return GeoSeries(pts_to_boxes(self.lat, self.lon, self.meta['transform'].a),
+                         crs=self.geometry.crs)
 
     def empty_geometry_points(self):
         """ Removes points in geometry. Useful when centroids is used in
@@ -623,6 +774,8 @@ class Centroids():
             data = file_data
         str_dt = h5py.special_dtype(vlen=str)
         for centr_name, centr_val in self.__dict__.items():
+            if centr_name.startswith('_'):
+                continue
             if isinstance(centr_val, np.ndarray):
                 data.create_dataset(centr_name, data=centr_val)
             if centr_name == 'meta' and centr_val:
@@ -680,6 +833,80 @@ class Centroids():
         if isinstance(file_data, str):
             data.close()
 
+    @property
+    def fingerprint(self):
+        """ Get hash of the raster meta or of the points' coordinates and CRS.
+        The hash of the points is cached until lat, lon or geometry are
+        replaced or clear_cache() is called. Centroids with the same
+        fingerprint are equal. """
+        if self.meta:
+            return hashlib.sha1(repr(sorted((key, str(val)) for key, val in \
+                self.meta.items())).encode()).hexdigest()
+        if not self._fingerprint:
+            coord_hash = hashlib.sha1((str(self.geometry.crs) + str(self.lat.size)).encode())
+            coord_hash.update(np.ascontiguousarray(self.lat, float).tobytes())
+            coord_hash.update(np.ascontiguousarray(self.lon, float).tobytes())
+            self._fingerprint = coord_hash.hexdigest()
+        return self._fingerprint
+
+    def get_regular_grid(self):
+        """ Get the grid of points placed at the centers of a complete regular
+        lat/lon grid, and the position of every grid cell in the centroids.
+        It is computed once and cached until lat or lon are replaced or
+        clear_cache() is called.
+
+        Returns:
+            dict (transform, width and height of the grid, empty if the
+            points are not on a regular grid), np.array (position of the
+            centroid of every cell, row-major)
+        """
+        if self.meta:
+            return self.meta, np.arange(self.size)
+        if self._regular_grid:
+            return self._regular_grid
+
+        grid = (dict(), np.array([], int))
+        if self.lat.size > 3 and \
+        grid_is_regular(np.stack([self.lat, self.lon], axis=1))[0]:
+            lat_uni, lon_uni = np.unique(self.lat), np.unique(self.lon)
+            res_lat, res_lon = np.diff(lat_uni), np.diff(lon_uni)
+            if lat_uni.size * lon_uni.size == self.size and \
+            np.allclose(res_lat, res_lat.mean(), rtol=1.0e-3) and \
+            np.allclose(res_lon, res_lon.mean(), rtol=1.0e-3):
+                res_lat, res_lon = res_lat.mean(), res_lon.mean()
+                grid_meta = {'width': lon_uni.size, 'height': lat_uni.size,
+                             'transform': Affine(res_lon, 0, lon_uni[0] - res_lon / 2,
+                                                 0, -res_lat, lat_uni[-1] + res_lat / 2)}
+                pix_idx = pts_to_raster_idx(self.lat, self.lon, grid_meta['transform'],
+                                            grid_meta['width'], grid_meta['height'])
+                grid_centr = np.full(self.size, -1)
+                grid_centr[pix_idx[pix_idx >= 0]] = np.flatnonzero(pix_idx >= 0)
+                if np.all(grid_centr >= 0):
+                    LOGGER.debug('Points on a regular grid of %s x %s.',
+                                 grid_meta['height'], grid_meta['width'])
+                    grid = (grid_meta, grid_centr)
+        self._regular_grid = grid
+        return grid
+
+    def get_nn_tree(self, distance='haversine'):
+        """ Get the spatial index of the points used in the nearest neighbor
+        search of the given distance. It is built once per distance and cached
+        until lat or lon are replaced or clear_cache() is called.
+
+        Parameter:
+            distance (str, optional): distance of the nearest neighbor search,
+                'approx' or 'haversine'. Default: 'haversine'
+
+        Returns:
+            cKDTree or BallTree
+        """
+        if not self.lat.size or not self.lon.size:
+            self.set_meta_to_lat_lon()
+        if distance not in self._nn_tree:
+            LOGGER.debug('Building %s tree of %s points.', distance, self.size)
+            self._nn_tree[distance] = nn_tree(self.coord, distance)
+        return self._nn_tree[distance]
+
     @property
     def crs(self):
         """ Get CRS of raster or vector """
@@ -722,28 +949,33 @@ class Centroids():
 
     def set_geometry_points(self, scheduler=None):
         """ Set geometry attribute of GeoSeries with Points from latitude and
-        longitude attributes if geometry not present.
+        longitude attributes if geometry not present. The points are built at
+        once from the coordinate arrays, and only when a GeoPandas operation
+        needs them.
 
         Parameter:
             scheduler (str): used for dask map_partitions. “threads”,
                 “synchronous” or “processes”
         """
-        def apply_point(df_exp):
-            return df_exp.apply((lambda row: Point(row.longitude, row.latitude)), axis=1)
+        def build_points(df_exp):
+            return GeoSeries(points_from_xy(df_exp.longitude.values,
+                                            df_exp.latitude.values),
+                             index=df_exp.index)
         if not self.geometry.size:
             LOGGER.info('Setting geometry points.')
             if not self.lat.size or not self.lon.size:
                 self.set_meta_to_lat_lon()
             if not scheduler:
-                self.geometry = GeoSeries(list(zip(self.lon, self.lat)),
+                self.geometry = GeoSeries(points_from_xy(self.lon, self.lat),
                                           crs=self.geometry.crs)
-                self.geometry = self.geometry.apply(Point)
             else:
                 import dask.dataframe as dd
                 from multiprocessing import cpu_count
-                ddata = dd.from_pandas(self, npartitions=cpu_count())
-                self.geometry = ddata.map_partitions(apply_point, meta=Point).\
-                compute(scheduler=scheduler)
+                ddata = dd.from_pandas(pd.DataFrame({'latitude': self.lat,
+                                                     'longitude': self.lon}),
+                                       npartitions=cpu_count())
+                self.geometry = GeoSeries(ddata.map_partitions(build_points, meta=Point).\
+                compute(scheduler=scheduler), crs=self.geometry.crs)
 
     def _ne_crs_geom(self, scheduler=None):
         """ Return x (lon) and y (lat) in the CRS of Natural Earth
@@ -762,6 +994,24 @@ class Centroids():
         self.set_geometry_points(scheduler)
         return self.geometry.to_crs(NE_CRS)
 
+    def _ne_crs_lat_lon(self, scheduler=None):
+        """ Return lat and lon in the CRS of Natural Earth, without building
+        the points geometry if the centroids are already in that CRS.
+
+        Parameter:
+            scheduler (str): used for dask map_partitions. “threads”,
+                “synchronous” or “processes”
+
+        Returns:
+            np.array, np.array
+        """
+        if not self.lat.size or not self.lon.size:
+            self.set_meta_to_lat_lon()
+        if equal_crs(self.crs, NE_CRS):
+            return self.lat, self.lon
+        ne_geom = self._ne_crs_geom(scheduler)
+        return ne_geom.geometry[:].y.values, ne_geom.geometry[:].x.values
+
     def __deepcopy__(self, memo):
         """ Avoid error deep copy in GeoSeries by setting only the crs """
         cls = self.__class__
@@ -773,3 +1023,45 @@ class Centroids():
             else:
                 setattr(result, key, copy.deepcopy(value, memo))
         return result
+
+def _is_metric_crs(crs):
+    """ Check if the units of the given crs are meters
+
+    Parameter:
+        crs (dict or string or wkt or CRS): user crs
+
+    Returns:
+        bool
+    """
+    return str.lower(CRS.from_user_input(crs).linear_units) in ['m', 'metre', 'meter']
+
+def _coord_map(lat_ini, lon_ini, lat, lon, tolerance=None):
+    """ Match the coordinates (lat, lon) to the initial ones and to their own
+    first occurrence with a hash of the (rounded) coordinates.
+
+    Parameters:
+        lat_ini (np.array): initial latitudes
+        lon_ini (np.array): initial longitudes
+        lat (np.array): latitudes to match
+        lon (np.array): longitudes to match
+        tolerance (float, optional): coordinates are compared rounded to this
+            tolerance. Default: exact values
+
+    Returns:
+        np.array (position of every point in the initial coordinates followed
+        by the new ones), np.array (indexes of the new points in lat and lon)
+    """
+    n_ini = lat_ini.size
+    coord_lat = np.append(lat_ini, lat)
+    coord_lon = np.append(lon_ini, lon)
+    if tolerance:
+        coord_lat = np.round(coord_lat / tolerance)
+        coord_lon = np.round(coord_lon / tolerance)
+    codes = pd.MultiIndex.from_arrays([coord_lat, coord_lon]).factorize()[0]
+    _, first_pos = np.unique(codes, return_index=True)
+    first_pos = first_pos[codes[n_ini:]]
+    new_cen = np.flatnonzero(first_pos == np.arange(n_ini, n_ini + lat.size))
+    cen_map = first_pos
+    is_new = first_pos >= n_ini
+    cen_map[is_new] = n_ini + np.searchsorted(new_cen, first_pos[is_new] - n_ini)
+    return cen_map, new_cen
@@ -170,7 +170,8 @@ class TestVector(unittest.TestCase):
         self.assertEqual(centr.geometry.size, 0)
 
         centr.set_area_pixel()
-        self.assertEqual(centr.geometry.size, centr.lat.size)
+        self.assertEqual(centr.geometry.size, 0)
+        self.assertEqual(centr.area_pixel.size, centr.lat.size)
 
     def test_ne_crs_geom_pass(self):
         """ Test _ne_crs_geom """
@@ -218,11 +219,12 @@ class TestVector(unittest.TestCase):
         centr.lat, centr.lon, centr.geometry = self.data_vector()
         centr.geometry.crs = {'init':'epsg:4326'}
         # create duplicates manually:
-        centr.geometry.values[100] = centr.geometry.values[101]
-        centr.geometry.values[120] = centr.geometry.values[101]
-        centr.geometry.values[5] = Point([-59.7, 12.5])
-        centr.geometry.values[133] = Point([-59.7, 12.5])
-        centr.geometry.values[121] = Point([-59.7, 12.5])
+        for idx in [100, 120]:
+            centr.lat[idx], centr.lon[idx] = centr.lat[101], centr.lon[101]
+            centr.geometry.values[idx] = centr.geometry.values[101]
+        for idx in [5, 133, 121]:
+            centr.lat[idx], centr.lon[idx] = 12.5, -59.7
+            centr.geometry.values[idx] = Point([-59.7, 12.5])
         self.assertEqual(centr.size, 296)
         rem_centr = centr.remove_duplicate_points()
         self.assertEqual(centr.size, 296)
@@ -231,6 +233,26 @@ class TestVector(unittest.TestCase):
         self.assertEqual(rem_centr.size, 292)
         self.assertEqual(rem2_centr.size, 292)
 
+        rem_centr, cen_map = centr.remove_duplicate_points(return_map=True)
+        self.assertEqual(rem_centr.size, 292)
+        self.assertEqual(cen_map.size, 296)
+        self.assertTrue(np.array_equal(rem_centr.lat[cen_map], centr.lat))
+        self.assertTrue(np.array_equal(rem_centr.lon[cen_map], centr.lon))
+        self.assertEqual(cen_map[120], cen_map[100])
+        self.assertEqual(cen_map[133], 5)
+        self.assertTrue(np.array_equal(cen_map[:5], np.arange(5)))
+
+    def test_remove_duplicate_tolerance_pass(self):
+        """ Test remove_duplicate_points with coordinates tolerance """
+        centr = Centroids()
+        centr.set_lat_lon(np.array([10.0, 10.0004, 11.0, 10.0]),
+                          np.array([20.0, 20.0002, 21.0, 20.0]))
+        self.assertEqual(centr.remove_duplicate_points().size, 3)
+        rem_centr, cen_map = centr.remove_duplicate_points(tolerance=1.0e-3,
+                                                           return_map=True)
+        self.assertEqual(rem_centr.size, 2)
+        self.assertEqual(cen_map.tolist(), [0, 0, 1, 0])
+
     def test_area_pass(self):
         """ Test set_area """
         ulx, xres, lrx = 60, 1, 90
@@ -249,6 +271,16 @@ class TestVector(unittest.TestCase):
         centr.set_area_pixel()
         self.assertTrue(np.allclose(centr.area_pixel, np.ones(centr.size)))
 
+    def test_area_lat_lon_pass(self):
+        """ Test set_area_pixel of points in lat/lon against polygon areas """
+        centr = Centroids()
+        lat, lon = np.meshgrid(np.arange(-75.5, 80, 10.0), np.arange(-165.5, 170, 30.0))
+        centr.set_lat_lon(lat.flatten(), lon.flatten())
+        centr.set_area_pixel()
+        area_poly = centr.calc_pixels_polygons().to_crs(crs={'proj':'cea'}).area.values
+        self.assertEqual(centr.geometry.size, 0)
+        self.assertTrue(np.allclose(centr.area_pixel, area_poly, rtol=1.0e-8))
+
     def test_size_pass(self):
         """ Test size property"""
         centr = Centroids()
@@ -295,6 +327,12 @@ class TestVector(unittest.TestCase):
         self.assertTrue(np.allclose(poly.centroid[:].y.values, centr.lat))
         self.assertTrue(np.allclose(poly.centroid[:].x.values, centr.lon))
 
+        centr.geometry = gpd.GeoSeries(crs={'init':'epsg:4326'})
+        poly = centr.calc_pixels_polygons()
+        self.assertEqual(centr.geometry.size, 0)
+        self.assertTrue(np.allclose(poly.centroid[:].y.values, centr.lat))
+        self.assertTrue(np.allclose(poly.area.values, abs(centr.meta['transform'].a)**2))
+
     def test_area_approx(self):
         """ Test set_area_approx """
         centr = Centroids()
@@ -322,6 +360,40 @@ class TestVector(unittest.TestCase):
         self.assertTrue(np.array_equal(centr_bis.lat[3:], centr.lat))
         self.assertTrue(np.array_equal(centr_bis.lon[3:], centr.lon))
 
+    def test_append_unique_pass(self):
+        """ Append points without duplicates """
+        centr = Centroids()
+        centr.set_lat_lon(np.array([1, 2, 3]), np.array([4, 5, 6]))
+        centr.region_id = np.array([1, 2, 3])
+        centr_bis = Centroids()
+        centr_bis.set_lat_lon(np.array([3, 7, 1, 7, 8]), np.array([6, 7, 4, 7, 9]))
+        centr_bis.region_id = np.array([3, 4, 1, 4, 5])
+        cen_map = centr.append(centr_bis, unique=True)
+        self.assertEqual(centr.size, 5)
+        self.assertEqual(cen_map.tolist(), [2, 3, 0, 3, 4])
+        self.assertEqual(centr.lat.tolist(), [1, 2, 3, 7, 8])
+        self.assertEqual(centr.lon.tolist(), [4, 5, 6, 7, 9])
+        self.assertEqual(centr.region_id.tolist(), [1, 2, 3, 4, 5])
+        self.assertTrue(np.array_equal(centr.lat[cen_map], centr_bis.lat))
+
+        cen_map = centr.append(centr_bis)
+        self.assertEqual(centr.size, 10)
+        self.assertEqual(cen_map.tolist(), [5, 6, 7, 8, 9])
+
+    def test_append_unique_elevation_pass(self):
+        """ Append points without duplicates keeps all 1-dim attributes """
+        centr = Centroids()
+        centr.set_lat_lon(np.array([1, 2, 3]), np.array([4, 5, 6]))
+        centr.elevation = np.array([10, 20, 30])
+        centr_bis = Centroids()
+        centr_bis.set_lat_lon(np.array([2, 7]), np.array([5, 7]))
+        centr_bis.elevation = np.array([20, 70])
+        cen_map = centr.append(centr_bis, unique=True)
+        self.assertEqual(cen_map.tolist(), [1, 3])
+        self.assertEqual(centr.lat.tolist(), [1, 2, 3, 7])
+        self.assertEqual(centr.elevation.tolist(), [10, 20, 30, 70])
+        centr.check()
+
     def test_equal_pass(self):
         """ Test equal """
         centr = Centroids()
@@ -445,6 +517,25 @@ class TestRaster(unittest.TestCase):
         self.assertTrue(np.allclose(centr_ras.area_pixel,
                                     np.ones(60*50)*0.009000000000000341*0.009000000000000341))
 
+    def test_area_lat_lon_pass(self):
+        """ Test set_area_pixel of raster in lat/lon and in metric CRS """
+        centr_ras = Centroids()
+        centr_ras.set_raster_file(HAZ_DEMO_FL, window= Window(0, 0, 50, 60))
+        centr_ras.set_area_pixel()
+        centr_ras.check()
+        self.assertEqual(centr_ras.area_pixel.size, centr_ras.size)
+        self.assertEqual(np.unique(centr_ras.area_pixel).size, 60)
+        self.assertTrue(np.allclose(centr_ras.area_pixel.reshape(60, 50),
+                                    centr_ras.area_pixel[::50].reshape(60, 1)))
+        area_poly = centr_ras.calc_pixels_polygons().to_crs(crs={'proj':'cea'}).area.values
+        self.assertTrue(np.allclose(centr_ras.area_pixel, area_poly, rtol=1.0e-8))
+
+        centr_ras.meta['crs'] = {'init':'epsg:32632'}
+        centr_ras.set_area_pixel()
+        self.assertTrue(np.allclose(centr_ras.area_pixel, np.ones(60*50)*0.009**2))
+        centr_ras.set_area_approx()
+        self.assertTrue(np.allclose(centr_ras.area_pixel, np.ones(60*50)*0.009**2))
+
     def test_area_approx(self):
         """ Test set_area_approx """
         centr_ras = Centroids()
@@ -704,6 +795,104 @@ class TestCentroidsFuncs(unittest.TestCase):
         self.assertEqual(fil_centr.lon[1], VEC_LON[200])
         self.assertTrue(np.array_equal(fil_centr.region_id, np.ones(2)*10))
 
+    def test_get_regular_grid_pass(self):
+        """ Test get_regular_grid """
+        lat, lon = np.meshgrid(np.arange(10, 12.01, 0.5), np.arange(-5, -3.9, 0.25))
+        perm = np.random.RandomState(1).permutation(lat.size)
+        centr = Centroids()
+        centr.set_lat_lon(lat.flatten()[perm], lon.flatten()[perm])
+        grid_meta, grid_centr = centr.get_regular_grid()
+        self.assertEqual(grid_meta['height'], 5)
+        self.assertEqual(grid_meta['width'], 5)
+        self.assertAlmostEqual(grid_meta['transform'].a, 0.25)
+        self.assertAlmostEqual(grid_meta['transform'].e, -0.5)
+        self.assertAlmostEqual(grid_meta['transform'].c, -5.125)
+        self.assertAlmostEqual(grid_meta['transform'].f, 12.25)
+        self.assertAlmostEqual(centr.lat[grid_centr[0]], 12)
+        self.assertAlmostEqual(centr.lon[grid_centr[0]], -5)
+        self.assertAlmostEqual(centr.lat[grid_centr[6]], 11.5)
+        self.assertAlmostEqual(centr.lon[grid_centr[6]], -4.75)
+        self.assertEqual(np.unique(grid_centr).size, centr.size)
+        self.assertIs(centr.get_regular_grid()[1], grid_centr)
+
+        centr.set_lat_lon(np.append(centr.lat[:-1], 10.2), np.append(centr.lon[:-1], -4))
+        self.assertEqual(centr.get_regular_grid()[0], dict())
+        centr.set_lat_lon(np.array([1, 1, 2, 2, 4, 4]), np.array([1, 2, 1, 2, 1, 2]))
+        self.assertEqual(centr.get_regular_grid()[0], dict())
+
+    def test_get_nn_tree_pass(self):
+        """ Test get_nn_tree """
+        centr = Centroids()
+        centr.set_lat_lon(np.array([10, 11, 12.5]), np.array([-5, -4, 3]))
+        tree = centr.get_nn_tree()
+        self.assertIs(centr.get_nn_tree('haversine'), tree)
+        tree_approx = centr.get_nn_tree('approx')
+        self.assertIsNot(tree_approx, tree)
+        self.assertIs(centr.get_nn_tree('approx'), tree_approx)
+        self.assertEqual(tree.query(np.radians([[12.4, 3]]))[1][0, 0], 2)
+        centr.set_lat_lon(np.array([10, 11]), np.array([-5, -4]))
+        self.assertIsNot(centr.get_nn_tree(), tree)
+        self.assertEqual(centr.get_nn_tree().query(np.radians([[12.4, 3]]))[1][0, 0], 1)
+
+    def test_fingerprint_pass(self):
+        """ Test fingerprint of points and raster """
+        centr = Centroids()
+        centr.set_lat_lon(VEC_LAT, VEC_LON)
+        centr_bis = Centroids()
+        centr_bis.set_lat_lon(VEC_LAT.copy(), VEC_LON.copy())
+        self.assertEqual(centr.fingerprint, centr_bis.fingerprint)
+        self.assertIs(centr.fingerprint, centr.fingerprint)
+        self.assertTrue(centr.equal(centr_bis))
+        centr_bis.lat = centr_bis.lat + 1
+        self.assertNotEqual(centr.fingerprint, centr_bis.fingerprint)
+        self.assertFalse(centr.equal(centr_bis))
+        centr_ter = Centroids()
+        centr_ter.set_lat_lon(VEC_LAT.copy(), VEC_LON.copy())
+        centr_ter.lat += 1
+        centr_ter.clear_cache()
+        self.assertEqual(centr_ter.fingerprint, centr_bis.fingerprint)
+        self.assertTrue(centr_ter.equal(centr_bis))
+        centr_ter.lon[0] += 1
+        # in place modification not detected by the fingerprint, but by equal
+        self.assertEqual(centr_ter.fingerprint, centr_bis.fingerprint)
+        self.assertFalse(centr_ter.equal(centr_bis))
+        centr_ter.clear_cache()
+        self.assertNotEqual(centr_ter.fingerprint, centr_bis.fingerprint)
+
+        centr.set_raster_from_pix_bounds(10, 5, -0.5, 0.2, 5, 4)
+        centr_bis.set_raster_from_pix_bounds(10, 5, -0.5, 0.2, 5, 4)
+        self.assertEqual(centr.fingerprint, centr_bis.fingerprint)
+        centr_bis.set_raster_from_pix_bounds(10, 5, -0.5, 0.2, 5, 5)
+        self.assertNotEqual(centr.fingerprint, centr_bis.fingerprint)
+
+    def test_coarsen_raster_pass(self):
+        """ Test coarsen raster centroids """
+        centr = Centroids()
+        centr.set_raster_from_pix_bounds(10, 5, -0.5, 0.2, 5, 4)
+        centr_c, agg = centr.coarsen(2)
+        self.assertEqual(centr_c.meta['width'], 2)
+        self.assertEqual(centr_c.meta['height'], 3)
+        self.assertAlmostEqual(centr_c.meta['transform'][0], 0.4)
+        self.assertAlmostEqual(centr_c.meta['transform'][4], -1.0)
+        self.assertAlmostEqual(centr_c.meta['transform'][2], 5)
+        self.assertAlmostEqual(centr_c.meta['transform'][5], 10)
+        self.assertEqual(agg.shape, (20, 6))
+        self.assertTrue(np.array_equal(agg.indices, [0, 0, 1, 1, 0, 0, 1, 1,
+                                                     2, 2, 3, 3, 2, 2, 3, 3,
+                                                     4, 4, 5, 5]))
+
+    def test_coarsen_points_pass(self):
+        """ Test coarsen point centroids """
+        centr = Centroids()
+        centr.set_lat_lon(np.array([0, 0, 1, 3]), np.array([0, 1, 0, 3]))
+        centr.area_pixel = np.ones(4)
+        centr_c, agg = centr.coarsen(2)
+        self.assertEqual(agg.shape, (4, 2))
+        self.assertTrue(np.array_equal(agg.indices, [1, 1, 1, 0]))
+        self.assertTrue(np.allclose(centr_c.lat, [2.5, 0.5]))
+        self.assertTrue(np.allclose(centr_c.lon, [2.5, 0.5]))
+        self.assertTrue(np.array_equal(centr_c.area_pixel, [1, 3]))
+
 # Execute Tests
 if __name__ == "__main__":
     TESTS = unittest.TestLoader().loadTestsFromTestCase(TestRaster)
@@ -301,11 +301,7 @@ class Landslide(Hazard):
         if not self.centroids.meta:
             LOGGER.error('No raster data set')
             raise ValueError
-        try:
-            event_pos = np.where(self.event_id == ev_id)[0][0]
-        except IndexError:
-            LOGGER.error('Wrong event id: %s.', ev_id)
-            raise ValueError from IndexError
+        event_pos = self._get_event_pos(ev_id)
 
         return plt.imshow(self.intensity_prob[event_pos, :].todense(). \
                               reshape(self.centroids.shape), **kwargs)
@@ -324,11 +320,7 @@ class Landslide(Hazard):
         if not self.centroids.meta:
             LOGGER.error('No raster data set')
             raise ValueError
-        try:
-            event_pos = np.where(self.event_id == ev_id)[0][0]
-        except IndexError:
-            LOGGER.error('Wrong event id: %s.', ev_id)
-            raise ValueError from IndexError
+        event_pos = self._get_event_pos(ev_id)
 
         return plt.imshow(self.intensity[event_pos, :].todense(). \
                               reshape(self.centroids.shape), **kwargs)
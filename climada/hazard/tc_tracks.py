@@ -39,7 +39,6 @@ import pandas as pd
 import xarray as xr
 from sklearn.neighbors import DistanceMetric
 import netCDF4 as nc
-from numba import jit
 from pint import UnitRegistry
 import scipy.io.matlab as matlab
 
@@ -466,7 +465,6 @@ class TCTracks():
             self.data.append(track)
 
     @staticmethod
-    @jit(parallel=True)
     def _one_rnd_walk(track, ens_size, ens_amp0, ens_amp, max_angle, rnd_vec):
         """ Interpolate values of one track.
 
@@ -510,7 +508,6 @@ class TCTracks():
         return ens_track
 
     @staticmethod
-    @jit(parallel=True)
     def _one_interp_data(track, time_step_h, land_geom=None):
         """ Interpolate values of one track.
 
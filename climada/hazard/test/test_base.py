@@ -167,6 +167,17 @@ class TestLoader(unittest.TestCase):
         self.assertEqual(haz.get_event_id('event001')[0], 1)
         self.assertEqual(haz.get_event_id('event084')[0], 84)
 
+    def test_event_name_edit_pass(self):
+        """ Test event_name_to_id after modifying event_name."""
+        haz = Hazard('TC')
+        haz.read_excel(HAZ_TEMPLATE_XLS)
+        self.assertEqual(haz.get_event_id('event001').tolist(), [1])
+        haz.event_name[1] = 'event001'
+        haz.clear_cache()
+        self.assertEqual(haz.get_event_id('event001').tolist(), [1, 2])
+        haz.event_name = haz.event_name[:2] + ['event001'] + haz.event_name[3:]
+        self.assertEqual(haz.get_event_id('event001').tolist(), [1, 2, 3])
+
     def test_event_name_to_id_fail(self):
         """ Test event_name_to_id function."""
         haz = Hazard('TC')
@@ -428,6 +439,42 @@ class TestSelect(unittest.TestCase):
         self.assertIsInstance(sel_haz.intensity, sparse.csr_matrix)
         self.assertIsInstance(sel_haz.fraction, sparse.csr_matrix)
 
+    def test_select_view_pass(self):
+        """Test select consecutive events sharing memory."""
+        haz = dummy_hazard()
+        haz.centroids.region_id = np.array([5, 7, 5])
+        sel_haz = haz.select(date=(2, 3), view=True)
+        self.assertTrue(np.array_equal(sel_haz.event_id, np.array([2, 3])))
+        self.assertEqual(sel_haz.event_name, ['ev2', 'ev3'])
+        self.assertTrue(np.shares_memory(sel_haz.frequency, haz.frequency))
+        self.assertTrue(np.shares_memory(sel_haz.intensity.data, haz.intensity.data))
+        self.assertTrue(np.array_equal(sel_haz.intensity.todense(),
+                                       haz.intensity[1:3, :].todense()))
+
+        sel_haz = haz.select(date=(2, 3))
+        self.assertFalse(np.shares_memory(sel_haz.frequency, haz.frequency))
+        self.assertFalse(np.shares_memory(sel_haz.intensity.data, haz.intensity.data))
+
+        sel_haz = haz.select(orig=True, reg_id=5, view=True)
+        self.assertTrue(np.array_equal(sel_haz.event_id, np.array([1, 4])))
+        self.assertTrue(np.array_equal(sel_haz.intensity.todense(),
+                                       np.array([[0.2, 0.4], [5.3, 1.3]])))
+        self.assertTrue(np.array_equal(sel_haz.fraction.todense(),
+                                       np.array([[0.02, 0.04], [0.3, 0.0]])))
+        self.assertEqual(sel_haz.intensity.nnz, 4)
+
+    def test_select_event_lookup_pass(self):
+        """Test event id and name lookups of original and selected hazard."""
+        haz = dummy_hazard()
+        self.assertEqual(haz.get_event_name(3), 'ev3')
+        sel_haz = haz.select(orig=False)
+        self.assertEqual(sel_haz.get_event_name(3), 'ev3')
+        self.assertTrue(np.array_equal(sel_haz.get_event_id('ev2'), np.array([2])))
+        self.assertEqual(sel_haz.get_event_date(3), [u_dt.date_to_str(3)])
+        with self.assertRaises(ValueError):
+            sel_haz.get_event_name(1)
+        self.assertEqual(haz.get_event_name(1), 'ev1')
+
 class TestAppend(unittest.TestCase):
     """Test append method."""
 
@@ -460,8 +507,12 @@ class TestAppend(unittest.TestCase):
         haz1 = Hazard('TC')
         haz2 = Hazard('TC')
         haz2.read_excel(HAZ_TEMPLATE_XLS)
+        haz2.get_event_stats()
+        haz2.local_hazard_curve(0)
         haz1.append(haz2)
         haz1.check()
+        self.assertFalse(haz1._event_stats)
+        self.assertFalse(haz1._centr_index)
 
         # expected values
         haz1_orig = Hazard('TC')
@@ -668,6 +719,30 @@ class TestAppend(unittest.TestCase):
         self.assertEqual(haz1.tag.description, \
                          [haz1_ori.tag.description, haz2.tag.description])
 
+    def test_overlap_centroids_append_pass(self):
+        """Append hazard with partially shared centroids."""
+        haz1 = dummy_hazard()
+        haz2 = dummy_hazard()
+        haz2.centroids = Centroids()
+        haz2.centroids.set_lat_lon(np.array([7, 5, 1]), np.array([8, 6, 2]))
+        haz2.event_name = ['ev5', 'ev6', 'ev7', 'ev8']
+
+        haz1.append(haz2)
+        haz1.check()
+        haz_ori = dummy_hazard()
+        self.assertEqual(haz1.centroids.size, 4)
+        self.assertTrue(np.array_equal(haz1.centroids.lat, [1, 3, 5, 7]))
+        self.assertTrue(np.array_equal(haz1.centroids.lon, [2, 4, 6, 8]))
+        exp_inten = np.zeros((8, 4))
+        exp_inten[:4, :3] = haz_ori.intensity.todense()
+        exp_inten[4:, [3, 2, 0]] = haz_ori.intensity.todense()
+        self.assertTrue(np.array_equal(haz1.intensity.todense(), exp_inten))
+        self.assertTrue(haz1.intensity.has_sorted_indices)
+        exp_frac = np.zeros((8, 4))
+        exp_frac[:4, :3] = haz_ori.fraction.todense()
+        exp_frac[4:, [3, 2, 0]] = haz_ori.fraction.todense()
+        self.assertTrue(np.array_equal(haz1.fraction.todense(), exp_frac))
+
     def test_append_all_pass(self):
         """Test _append_all function."""
         haz_1 = Hazard('TC')
@@ -741,6 +816,101 @@ class TestAppend(unittest.TestCase):
         app_haz._append_all([haz])
         self.assertIn('new_var', app_haz.__dict__)
 
+class TestCompact(unittest.TestCase):
+    """Test compact method."""
+
+    def test_compact_pass(self):
+        """Remove low intensities and their fraction."""
+        haz = dummy_hazard()
+        haz.intensity[0, 0] = 0
+        mem_saved = haz.compact(1.0)
+        self.assertTrue(mem_saved > 0)
+        self.assertEqual(haz.intensity.nnz, 5)
+        self.assertTrue(np.array_equal(haz.intensity.toarray(), np.array( \
+            [[0, 0, 0], [0, 0, 0], [4.3, 2.1, 1.0], [5.3, 0, 1.3]])))
+        self.assertEqual(haz.fraction.nnz, 3)
+        self.assertTrue(np.array_equal(haz.fraction.toarray(), np.array( \
+            [[0, 0, 0], [0, 0, 0], [0.3, 0.1, 0], [0.3, 0, 0]])))
+        self.assertEqual(haz.compact(1.0), 0)
+
+    def test_compact_view_pass(self):
+        """Compact a selection sharing memory without changing the original."""
+        haz = dummy_hazard()
+        inten_ini = haz.intensity.toarray()
+        frac_ini = haz.fraction.toarray()
+        sel_haz = haz.select(date=(2, 3), view=True)
+        self.assertTrue(sel_haz.compact(1.0) > 0)
+        self.assertTrue(np.array_equal(sel_haz.intensity.toarray(), np.array( \
+            [[0, 0, 0], [4.3, 2.1, 1.0]])))
+        self.assertTrue(np.array_equal(haz.intensity.toarray(), inten_ini))
+        self.assertTrue(np.array_equal(haz.fraction.toarray(), frac_ini))
+        self.assertFalse(np.shares_memory(sel_haz.intensity.data, haz.intensity.data))
+
+    def test_append_compact_pass(self):
+        """Compact when appending."""
+        haz1 = dummy_hazard()
+        haz2 = dummy_hazard()
+        haz2.intensity_thres = 1.0
+        haz2.append(haz1, compact=True)
+        self.assertEqual(haz2.size, 8)
+        self.assertEqual(haz2.intensity.nnz, 10)
+        self.assertTrue(np.all(haz2.intensity.data >= 1.0))
+
+class TestCoarsen(unittest.TestCase):
+    """Test coarsen method."""
+
+    def test_coarsen_max_mean_pass(self):
+        """Aggregate intensity and fraction with max and mean."""
+        haz = dummy_hazard()
+        haz.centroids.set_lat_lon(np.array([0, 0, 1]), np.array([0, 1, 3]))
+        haz_c = haz.coarsen(2, 'max')
+        self.assertEqual(haz_c.centroids.size, 2)
+        self.assertTrue(np.allclose(haz_c.centroids.lon, [0.5, 2.5]))
+        self.assertTrue(np.allclose(haz_c.intensity.toarray(), \
+            [[0.3, 0.4], [0.1, 0.01], [4.3, 1.0], [5.3, 1.3]]))
+        self.assertTrue(np.allclose(haz_c.fraction.toarray(), \
+            [[0.03, 0.04], [0.01, 0.01], [0.3, 0.0], [0.3, 0.0]]))
+        self.assertTrue(np.array_equal(haz_c.event_id, haz.event_id))
+        self.assertEqual(haz_c.event_name, haz.event_name)
+
+        haz_c = haz.coarsen(2, 'mean')
+        self.assertTrue(np.allclose(haz_c.intensity.toarray(), \
+            [[0.25, 0.4], [0.1, 0.01], [3.2, 1.0], [2.75, 1.3]]))
+        with self.assertRaises(ValueError):
+            haz.coarsen(2, 'min')
+
+class TestThinning(unittest.TestCase):
+    """Test select_thinned method."""
+
+    def test_select_thinned_pass(self):
+        """Thinned event set keeps the frequency and exceedance curve."""
+        haz = Hazard('TC')
+        haz.centroids.set_lat_lon(np.array([1, 3]), np.array([2, 4]))
+        np.random.seed(8)
+        num_ev = 1000
+        haz.intensity = sparse.csr_matrix(np.random.pareto(3, (num_ev, 2)))
+        haz.fraction = haz.intensity.copy()
+        haz.fraction.data.fill(1)
+        haz.event_id = np.arange(num_ev) + 1
+        haz.event_name = list(map(str, haz.event_id))
+        haz.date = np.ones(num_ev, int)
+        haz.orig = np.ones(num_ev, bool)
+        haz.frequency = np.ones(num_ev)/num_ev
+
+        haz_thin, rel_err = haz.select_thinned(0.2, return_per=(2, 10, 50), seed=1)
+        haz_thin.check()
+        self.assertTrue(haz_thin.size <= 0.25*num_ev)
+        self.assertTrue(haz_thin.size >= 0.15*num_ev)
+        self.assertAlmostEqual(haz_thin.frequency.sum(), haz.frequency.sum())
+        self.assertTrue(np.all(np.diff(haz_thin.event_id) > 0))
+        self.assertEqual(rel_err.size, 3)
+        self.assertTrue(np.all(rel_err < 0.1))
+
+        haz_thin2, _ = haz.select_thinned(0.2, return_per=(2, 10, 50), seed=1)
+        self.assertTrue(np.array_equal(haz_thin.event_id, haz_thin2.event_id))
+        with self.assertRaises(ValueError):
+            haz.select_thinned(0.2, severity=np.ones(3))
+
 class TestStats(unittest.TestCase):
     """Test return period statistics"""
 
@@ -769,6 +939,70 @@ class TestStats(unittest.TestCase):
         self.assertAlmostEqual(inten_stats[3][33], 88.510983305123631)
         self.assertAlmostEqual(inten_stats[2][99], 79.717518054203623)
 
+class TestHazardCurve(unittest.TestCase):
+    """Test local_hazard_curve method."""
+
+    def test_local_hazard_curve_pass(self):
+        """Hazard curve at centroid from cached centroid index."""
+        haz = dummy_hazard()
+        haz.intensity[1, 2] = 0
+        haz.intensity.eliminate_zeros()
+        inten, freq = haz.local_hazard_curve(2)
+        self.assertTrue(np.allclose(inten, [1.3, 1.0, 0.4]))
+        self.assertTrue(np.allclose(freq, [0.2, 0.7, 0.8]))
+        self.assertEqual(len(haz._centr_index), 1)
+
+        haz.intensity = sparse.csr_matrix(np.ones((4, 3)))
+        inten, freq = haz.local_hazard_curve(0)
+        self.assertTrue(np.allclose(inten, np.ones(4)))
+        self.assertTrue(np.allclose(freq, [0.1, 0.6, 1.1, 1.3]))
+        self.assertEqual(len(haz._centr_index), 1)
+        haz.intensity.data *= 2
+        haz.clear_cache()
+        inten, _ = haz.local_hazard_curve(0)
+        self.assertTrue(np.allclose(inten, 2 * np.ones(4)))
+
+        haz.clear_cache()
+        haz.local_exceedance_inten((1, 2))
+        self.assertFalse(haz._centr_index)
+        haz.local_exceedance_inten((1, 2), cache=True)
+        self.assertEqual(len(haz._centr_index), 1)
+
+        with self.assertRaises(ValueError):
+            haz.local_hazard_curve(3)
+
+class TestEventStats(unittest.TestCase):
+    """Test get_event_stats method."""
+
+    def test_event_stats_pass(self):
+        """Statistics per event and cache invalidation."""
+        haz = dummy_hazard()
+        haz.intensity_thres = 1
+        haz.intensity[1, :] = 0
+        haz.intensity.eliminate_zeros()
+        ev_stats = haz.get_event_stats()
+        self.assertTrue(np.allclose(ev_stats.max_inten, [0.4, 0, 4.3, 5.3]))
+        self.assertTrue(np.allclose(ev_stats.sum_inten, [0.9, 0, 7.4, 6.8]))
+        self.assertTrue(np.array_equal(ev_stats.num_affected, [3, 0, 3, 3]))
+        self.assertTrue(np.array_equal(ev_stats.num_above_thres, [0, 0, 2, 2]))
+        self.assertNotIn('area_above_thres', ev_stats.columns)
+        self.assertIs(haz.get_event_stats(), ev_stats)
+
+        haz.centroids.area_pixel = np.array([1, 10, 100])
+        ev_stats = haz.get_event_stats()
+        self.assertTrue(np.array_equal(ev_stats.area_above_thres, [0, 0, 11, 101]))
+        haz.intensity_thres = 5
+        self.assertTrue(np.array_equal(haz.get_event_stats().num_above_thres,
+                                       [0, 0, 0, 1]))
+        haz.compact(5)
+        self.assertTrue(np.array_equal(haz.get_event_stats().num_affected,
+                                       [0, 0, 0, 1]))
+        haz.intensity.data *= 2
+        haz.clear_cache()
+        self.assertTrue(np.allclose(haz.get_event_stats().max_inten, [0, 0, 0, 10.6]))
+        haz.intensity = haz.intensity / 2
+        self.assertTrue(np.allclose(haz.get_event_stats().max_inten, [0, 0, 0, 5.3]))
+
 class TestYearset(unittest.TestCase):
     """Test return period statistics"""
 
@@ -925,6 +1159,8 @@ class TestHDF5(unittest.TestCase):
         hazard = Hazard('TC')
         hazard.read_mat(HAZ_TEST_MAT)
         hazard.event_name = list(map(str, hazard.event_name))
+        # computed statistics are saved as well
+        hazard.get_event_stats()
         for todense_flag in [False,True]:
             if todense_flag:
                 hazard.write_hdf5(file_name,todense=todense_flag)
@@ -955,6 +1191,10 @@ class TestHDF5(unittest.TestCase):
             self.assertIsInstance(haz_read.intensity, sparse.csr_matrix)
             self.assertTrue(np.array_equal(hazard.fraction.todense(), haz_read.fraction.todense()))
             self.assertIsInstance(haz_read.fraction, sparse.csr_matrix)
+            self.assertTrue(haz_read._event_stats)
+            self.assertIs(haz_read.get_event_stats(), haz_read._event_stats[-1])
+            self.assertTrue(np.allclose(hazard.get_event_stats().max_inten,
+                                        haz_read.get_event_stats().max_inten))
 
 class TestCentroids(unittest.TestCase):
     """Test return period statistics"""
@@ -979,6 +1219,22 @@ class TestCentroids(unittest.TestCase):
         self.assertEqual(haz_fl.intensity.min(), -9999)
         self.assertTrue(haz_fl.intensity.max() < 4.7)
 
+    def test_set_raster_compact_pass(self):
+        """ Test set_raster drops intensities below intensity_thres """
+        haz_fl = Hazard('FL')
+        haz_fl.set_raster([HAZ_DEMO_FL])
+        haz_comp = Hazard('FL')
+        haz_comp.intensity_thres = 1.0
+        haz_comp.set_raster([HAZ_DEMO_FL], compact=True)
+        haz_comp.check()
+
+        self.assertEqual(haz_comp.intensity.shape, haz_fl.intensity.shape)
+        self.assertTrue(0 < haz_comp.intensity.nnz < haz_fl.intensity.nnz)
+        self.assertTrue(np.all(haz_comp.intensity.data >= 1.0))
+        self.assertEqual(haz_comp.fraction.nnz, haz_comp.intensity.nnz)
+        self.assertEqual(haz_comp.intensity.nnz, \
+                         np.count_nonzero(haz_fl.intensity.data >= 1.0))
+
     def test_raster_to_vector_pass(self):
         """ Test raster_to_vector method """
         haz_fl = Hazard('FL')
@@ -1058,7 +1314,12 @@ if __name__ == "__main__":
     TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestRemoveDupl))
     TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestSelect))
     TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestStats))
+    TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestCompact))
+    TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestCoarsen))
+    TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestThinning))
     TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestYearset))
+    TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestHazardCurve))
+    TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestEventStats))
     TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestAppend))
     TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestCentroids))
     unittest.TextTestRunner(verbosity=2).run(TESTS)
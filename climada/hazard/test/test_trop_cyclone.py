@@ -79,6 +79,40 @@ class TestReader(unittest.TestCase):
         self.assertEqual(tc_haz.fraction.nonzero()[0].size, 280)
         self.assertEqual(tc_haz.intensity.nonzero()[0].size, 280)
 
+    def test_set_events_pass(self):
+        """Test _set_events assembles the sparse events of each track."""
+        coastal_centr = tc.coastal_centr_idx(CENTR_TEST_BRB)
+        tc_ev = [(np.array([0, 5]), np.array([20.0, 30.0]),
+                  ('IBTrACS: one', 'one', 700000, True, 2, 'NA')),
+                 (np.array([], int), np.array([]),
+                  ('IBTrACS: two', 'two', 700001, False, 0, 'NA')),
+                 (np.array([1]), np.array([40.0]),
+                  ('IBTrACS: three', 'three', 700002, False, 1, 'EP'))]
+        tc_haz = TropCyclone()
+        tc_haz._set_events(tc_ev, CENTR_TEST_BRB, coastal_centr)
+
+        self.assertEqual(tc_haz.tag.haz_type, 'TC')
+        self.assertEqual(tc_haz.tag.file_name,
+                         ['IBTrACS: one', 'IBTrACS: two', 'IBTrACS: three'])
+        self.assertEqual(tc_haz.units, 'm/s')
+        self.assertEqual(tc_haz.centroids.size, 296)
+        self.assertTrue(np.array_equal(tc_haz.event_id, np.array([1, 2, 3])))
+        self.assertEqual(tc_haz.event_name, ['one', 'two', 'three'])
+        self.assertTrue(np.array_equal(tc_haz.date, np.array([700000, 700001, 700002])))
+        self.assertTrue(np.array_equal(tc_haz.orig, np.array([True, False, False])))
+        self.assertTrue(np.array_equal(tc_haz.category, np.array([2, 0, 1])))
+        self.assertEqual(tc_haz.basin, ['NA', 'NA', 'EP'])
+        self.assertTrue(isinstance(tc_haz.intensity, sparse.csr.csr_matrix))
+        self.assertEqual(tc_haz.intensity.shape, (3, 296))
+        self.assertEqual(tc_haz.intensity.nnz, 3)
+        self.assertEqual(tc_haz.intensity[0, coastal_centr[0]], 20)
+        self.assertEqual(tc_haz.intensity[0, coastal_centr[5]], 30)
+        self.assertEqual(tc_haz.intensity[1, :].nnz, 0)
+        self.assertEqual(tc_haz.intensity[2, coastal_centr[1]], 40)
+        self.assertTrue(np.array_equal(tc_haz.fraction.indices,
+                                       tc_haz.intensity.indices))
+        self.assertTrue(np.array_equal(tc_haz.fraction.data, np.ones(3)))
+
     def test_set_one_file_pass(self):
         """ Test set function set_from_tracks with one input."""
         tc_track = TCTracks()
@@ -217,6 +251,15 @@ class TestModel(unittest.TestCase):
 
         self.assertEqual(coastal.size, CENTR_TEST_BRB.size)
 
+    def test_coastal_centroids_precomputed_pass(self):
+        """ Test selection of centroids close to coast from raster distances. """
+        centr = Centroids()
+        centr.set_lat_lon(CENTR_TEST_BRB.lat.copy(), CENTR_TEST_BRB.lon.copy())
+        coastal = tc.coastal_centr_idx(centr, precomputed=True)
+
+        self.assertEqual(centr.dist_coast.size, CENTR_TEST_BRB.size)
+        self.assertEqual(coastal.size, CENTR_TEST_BRB.size)
+
     def test_vtrans_correct(self):
         """ Test _vtrans_correct function. Compare to MATLAB reference."""
         ureg = UnitRegistry()
@@ -319,6 +362,38 @@ class TestModel(unittest.TestCase):
         self.assertAlmostEqual(wind[200] * to_kn, 57.28814245245439)
         self.assertAlmostEqual(wind[220] * to_kn, 69.62477194818004)
 
+    def test_close_centroids_pass(self):
+        """ Test _close_centroids keeps all centroids close to the nodes. """
+        tc_track = TCTracks()
+        tc_track.read_processed_ibtracs_csv(TEST_TRACK)
+        tc_track.equal_timestep()
+        t_lat = tc_track.data[0].lat.values
+        t_lon = tc_track.data[0].lon.values
+        centroids = np.concatenate([CENTR_TEST_BRB.coord,
+                                    np.array([[t_lat[0], t_lon[0] + 20],
+                                              [t_lat[0] + 20, t_lon[0]]])])
+
+        close_idx, grid = tc._close_centroids(
+            centroids, np.arange(centroids.shape[0]), t_lat, t_lon)
+        self.assertEqual(close_idx.size, CENTR_TEST_BRB.size)
+        self.assertTrue(np.array_equal(close_idx, np.arange(CENTR_TEST_BRB.size)))
+        g_orig, g_shape, cell_ptr, cell_centr = grid
+        self.assertEqual(cell_ptr.size, g_shape.prod() + 1)
+        self.assertEqual(cell_ptr[-1], close_idx.size)
+        self.assertTrue(np.array_equal(np.sort(cell_centr), np.arange(close_idx.size)))
+
+        # centroids beyond CENTR_NODE_MAX_DIST_KM get no wind
+        wind = tc._windfield(tc_track.data[0], centroids,
+                             np.arange(centroids.shape[0]), model=0)
+        self.assertEqual(wind[-1], 0)
+        self.assertEqual(wind[-2], 0)
+        self.assertEqual(np.nonzero(wind)[0].size, 280)
+
+        close_idx, grid = tc._close_centroids(
+            centroids, np.arange(0), t_lat, t_lon)
+        self.assertEqual(close_idx.size, 0)
+        self.assertIsNone(grid)
+
     def test_gust_from_track(self):
         """ Test gust_from_track function. Compare to MATLAB reference. """
         tc_track = TCTracks()
@@ -27,7 +27,6 @@ import copy
 import time
 import datetime as dt
 import numpy as np
-from numpy import linalg as LA
 from scipy import sparse
 import matplotlib.animation as animation
 from pint import UnitRegistry
@@ -39,7 +38,7 @@ from climada.hazard.tag import Tag as TagHazard
 from climada.hazard.tc_tracks import TCTracks
 from climada.hazard.tc_clim_change import get_knutson_criterion, calc_scale_knutson
 from climada.hazard.centroids.centr import Centroids
-from climada.util.constants import GLB_CENTROIDS_MAT
+from climada.util.constants import GLB_CENTROIDS_MAT, ONE_LAT_KM
 from climada.util.interpolation import dist_approx
 import climada.util.plot as u_plot
 
@@ -97,7 +96,8 @@ class TropCyclone(Hazard):
             self.pool = None
 
     def set_from_tracks(self, tracks, centroids=None, description='',
-                        model='H08', ignore_distance_to_coast=False):
+                        model='H08', ignore_distance_to_coast=False,
+                        precomputed=False):
         """Clear and model tropical cyclone from input IBTrACS tracks.
         Parallel process.
         Parameters:
@@ -108,6 +108,9 @@ class TropCyclone(Hazard):
             model (str, optional): model to compute gust. Default Holland2008.
             ignore_distance_to_coast (boolean, optional): if True, centroids
                 far from coast are not ignored. Default False
+            precomputed (bool, optional): if the centroids have no distance
+                to coast, interpolate it from the precomputed global raster
+                instead of computing it exactly. Default: False
         Raises:
             ValueError
         """
@@ -118,26 +121,27 @@ class TropCyclone(Hazard):
         if ignore_distance_to_coast: # Select centroids with lat < 61
             coastal_idx = np.logical_and(centroids.lat < 61, True).nonzero()[0]
         else:  # Select centroids which are inside INLAND_MAX_DIST_KM and lat < 61
-            coastal_idx = coastal_centr_idx(centroids)
+            coastal_idx = coastal_centr_idx(centroids, precomputed=precomputed)
         if not centroids.coord.size:
             centroids.set_meta_to_lat_lon()
+        mod_id = _get_model_id(model)
+        coastal_coord = centroids.coord[coastal_idx, :]
 
         LOGGER.info('Mapping %s tracks to %s centroids.', str(tracks.size),
                     str(centroids.size))
         if self.pool:
             chunksize = min(num_tracks//self.pool.ncpus, 1000)
-            tc_haz = self.pool.map(self._tc_from_track, tracks.data,
-                                   itertools.repeat(centroids, num_tracks),
-                                   itertools.repeat(coastal_idx, num_tracks),
-                                   itertools.repeat(model, num_tracks),
-                                   chunksize=chunksize)
+            tc_ev = self.pool.map(self._sparse_from_track, tracks.data,
+                                  itertools.repeat(coastal_coord, num_tracks),
+                                  itertools.repeat(mod_id, num_tracks),
+                                  chunksize=chunksize)
         else:
-            tc_haz = list()
+            tc_ev = list()
             for track in tracks.data:
-                tc_haz.append(self._tc_from_track(track, centroids, coastal_idx,
-                                                  model))
+                tc_ev.append(self._sparse_from_track(track, coastal_coord,
+                                                     mod_id))
         LOGGER.debug('Append events.')
-        self._append_all(tc_haz)
+        self._set_events(tc_ev, centroids, coastal_idx)
         LOGGER.debug('Compute frequency.')
         self._set_frequency(tracks.data)
         self.tag.description = description
@@ -251,7 +255,6 @@ class TropCyclone(Hazard):
         self.frequency = np.ones(self.event_id.size) / delta_time / ens_size
 
     @staticmethod
-    @jit
     def _tc_from_track(track, centroids, coastal_centr, model='H08'):
         """ Set hazard from input file. If centroids are not provided, they are
         read from the same file.
@@ -267,26 +270,71 @@ class TropCyclone(Hazard):
             TropCyclone
         """
         new_haz = TropCyclone()
-        new_haz.tag = TagHazard(HAZ_TYPE, 'IBTrACS: ' + track.name)
-        new_haz.intensity = gust_from_track(track, centroids, coastal_centr,
-                                            model)
-        new_haz.units = 'm/s'
-        new_haz.centroids = centroids
-        new_haz.event_id = np.array([1])
-        # frequency set when all tracks available
-        new_haz.frequency = np.array([1])
-        new_haz.event_name = [track.sid]
-        new_haz.fraction = new_haz.intensity.copy()
-        new_haz.fraction.data.fill(1)
-        # store date of start
-        new_haz.date = np.array([dt.datetime(
-            track.time.dt.year[0], track.time.dt.month[0],
-            track.time.dt.day[0]).toordinal()])
-        new_haz.orig = np.array([track.orig_event_flag])
-        new_haz.category = np.array([track.category])
-        new_haz.basin = [track.basin]
+        tc_ev = TropCyclone._sparse_from_track(
+            track, centroids.coord[coastal_centr, :], _get_model_id(model))
+        new_haz._set_events([tc_ev], centroids, coastal_centr)
         return new_haz
 
+    @staticmethod
+    def _sparse_from_track(track, coastal_coord, mod_id):
+        """ Compute the wind gusts of one track and its event attributes.
+        Only the non-zero gusts are returned, to keep the data sent back from
+        the worker processes small.
+        Parameters:
+            track (xr.Dataset): tropical cyclone track.
+            coastal_coord (2d np.array): coordinates of the centroids close
+                to coast. Each row is a centroid [lat, lon].
+            mod_id (int): model to compute gust according to MODEL_VANG.
+        Returns:
+            np.array (rows of coastal_coord with non-zero gusts),
+            np.array (gusts in m/s), tuple (file name, event name, date,
+            orig, category, basin)
+        """
+        intensity = _windfield(track, coastal_coord,
+                               np.arange(coastal_coord.shape[0]), mod_id)
+        indices = intensity.nonzero()[0]
+        date = dt.datetime(track.time.dt.year.values[0],
+                           track.time.dt.month.values[0],
+                           track.time.dt.day.values[0]).toordinal()
+        return indices, intensity[indices], ('IBTrACS: ' + track.name, \
+            track.sid, date, track.orig_event_flag, track.category, track.basin)
+
+    def _set_events(self, tc_ev, centroids, coastal_idx):
+        """ Set the events from the sparse wind gusts of each track, as
+        returned by _sparse_from_track. The intensity is assembled directly
+        in CSR format.
+        Parameters:
+            tc_ev (list(tuple)): non-zero gusts and attributes of each event
+            centroids (Centroids): centroids where the gusts were computed
+            coastal_idx (np.array): indices of the centroids close to coast
+                used to compute the gusts
+        """
+        num_ev = len(tc_ev)
+        indptr = np.zeros(num_ev + 1, int)
+        indptr[1:] = np.cumsum([ev[0].size for ev in tc_ev])
+        indices = coastal_idx[np.concatenate([np.zeros(0, int)] + \
+            [ev[0] for ev in tc_ev])]
+        data = np.concatenate([np.zeros(0)] + [ev[1] for ev in tc_ev])
+        self.intensity = sparse.csr_matrix((data, indices, indptr),
+                                           shape=(num_ev, centroids.size))
+        self.fraction = self.intensity.copy()
+        self.fraction.data.fill(1)
+
+        ev_attrs = [ev[2] for ev in tc_ev]
+        file_name = [attrs[0] for attrs in ev_attrs]
+        if len(file_name) == 1:
+            file_name = file_name[0]
+        self.tag = TagHazard(HAZ_TYPE, file_name)
+        self.units = 'm/s'
+        self.centroids = copy.deepcopy(centroids)
+        self.event_id = np.arange(1, num_ev + 1)
+        self.event_name = [attrs[1] for attrs in ev_attrs]
+        self.date = np.array([attrs[2] for attrs in ev_attrs], int)
+        self.orig = np.array([attrs[3] for attrs in ev_attrs], bool)
+        self.category = np.array([attrs[4] for attrs in ev_attrs], int)
+        self.basin = [attrs[5] for attrs in ev_attrs]
+        self.frequency = np.ones(num_ev)
+
     def _apply_criterion(self, criterion, scale):
         """ Apply changes defined in criterion with a given scale
         Parameters:
@@ -313,18 +361,22 @@ class TropCyclone(Hazard):
                 new_val = getattr(haz_cc, chg['variable'])
                 new_val[select] *= change
                 setattr(haz_cc, chg['variable'], new_val)
+        haz_cc.clear_cache()
         return haz_cc
 
-def coastal_centr_idx(centroids, lat_max=61):
+def coastal_centr_idx(centroids, lat_max=61, precomputed=False):
     """ Compute centroids indices which are inside INLAND_MAX_DIST_KM and
     with lat < lat_max.
     Parameters:
         lat_max (float, optional): Maximum latitude to consider. Default: 61.
+        precomputed (bool, optional): if the centroids have no distance to
+            coast, interpolate it from the precomputed global raster instead
+            of computing it exactly. Default: False
     Returns:
         np.array
     """
     if not centroids.dist_coast.size:
-        centroids.set_dist_coast()
+        centroids.set_dist_coast(precomputed=precomputed)
     return np.logical_and(centroids.dist_coast < INLAND_MAX_DIST_KM*1000,
                           centroids.lat < lat_max).nonzero()[0]
 
@@ -341,16 +393,26 @@ def gust_from_track(track, centroids, coastal_idx=None, model='H08'):
     """
     if coastal_idx is None:
         coastal_idx = coastal_centr_idx(centroids)
+    mod_id = _get_model_id(model)
+    # Compute wind gusts
+    intensity = _windfield(track, centroids.coord, coastal_idx, mod_id)
+    return sparse.csr_matrix(intensity)
+
+def _get_model_id(model):
+    """ Get the model identifier used in the windfield computation.
+    Parameters:
+        model (str): model to compute gust, key of MODEL_VANG
+    Returns:
+        int
+    Raises:
+        ValueError
+    """
     try:
-        mod_id = MODEL_VANG[model]
+        return MODEL_VANG[model]
     except KeyError:
         LOGGER.error('Not implemented model %s.', model)
         raise ValueError
-    # Compute wind gusts
-    intensity = _windfield(track, centroids.coord, coastal_idx, mod_id)
-    return sparse.csr_matrix(intensity)
 
-@jit
 def _windfield(track, centroids, coastal_idx, model):
     """ Compute windfields (in m/s) in centroids using Holland model 08.
 
@@ -379,14 +441,30 @@ def _windfield(track, centroids, coastal_idx, model):
     v_trans = _vtrans(track.lat.values, track.lon.values,
                       track.time_step.values, ureg)
 
-    # Compute windfield
+    n_nodes = track.lat.size
+    if 'n_nodes' in track.attrs:
+        n_nodes = track.attrs['n_nodes']
+
+    # Only centroids around the track are considered
     intensity = np.zeros((centroids.shape[0], ))
-    intensity[coastal_idx] = _wind_per_node(centroids[coastal_idx, :], track,
-                                            v_trans, model)
+    t_lat = track.lat.values.astype(float)
+    t_lon = track.lon.values.astype(float)
+    close_idx, grid = _close_centroids(centroids, coastal_idx,
+                                       t_lat[1:n_nodes], t_lon[1:n_nodes])
+    if not close_idx.size:
+        return intensity
+
+    # Compute windfield
+    intensity[close_idx] = _wind_per_node(
+        np.ascontiguousarray(centroids[close_idx, :], dtype=float), grid,
+        t_lat, t_lon, track.radius_max_wind.values.astype(float),
+        track.environmental_pressure.values.astype(float),
+        track.central_pressure.values.astype(float),
+        track.time_step.values.astype(float), v_trans.astype(float),
+        n_nodes, model, TropCyclone.intensity_thres)
 
     return intensity
 
-@jit
 def _vtrans(t_lat, t_lon, t_tstep, ureg):
     """ Translational spped at every track node.
 
@@ -409,7 +487,6 @@ def _vtrans(t_lat, t_lon, t_tstep, ureg):
     v_trans[v_trans > v_max] = v_max
     return v_trans
 
-@jit
 def _extra_rad_max_wind(t_cen, t_rad, ureg):
     """ Extrapolate RadiusMaxWind from pressure and change to km.
 
@@ -438,45 +515,116 @@ def _extra_rad_max_wind(t_cen, t_rad, ureg):
 
     return (t_rad * ureg.nautical_mile).to(ureg.kilometer).magnitude
 
-@jit(parallel=True)
-def _wind_per_node(coastal_centr, track, v_trans, model):
-    """ Compute sustained winds at each centroid.
+def _close_centroids(centroids, coastal_idx, t_lat, t_lon):
+    """ Select the coastal centroids inside the bounding box of the track
+    nodes buffered by CENTR_NODE_MAX_DIST_KM and index them in a regular
+    grid whose cells are as large as the buffer. All centroids within
+    CENTR_NODE_MAX_DIST_KM of a node lie in the 3x3 cells around it.
 
     Parameters:
-        coastal_centr (2d np.array): centroids
-        track (xr.Dataset): track latitudes
-        v_trans (np.array): track translational velocity
-        model (int): Holland model selection according to MODEL_VANG
+        centroids (2d np.array): each row is a centroid [lat, lon]
+        coastal_idx (1d np.array): centroids indices that are close to coast
+        t_lat (np.array): latitudes of the track nodes
+        t_lon (np.array): longitudes of the track nodes
 
     Returns:
-        2d np.array
+        np.array (indices of the selected centroids),
+        tuple (grid origin and cell sizes, number of rows and columns,
+        pointer to the first centroid of each cell, centroids sorted by cell)
     """
+    coastal_idx = np.asarray(coastal_idx).reshape(-1)
+    if not t_lat.size or not coastal_idx.size:
+        return np.zeros(0, int), None
+
+    d_lat = CENTR_NODE_MAX_DIST_KM / ONE_LAT_KM
+    lat_min, lat_max = t_lat.min() - d_lat, t_lat.max() + d_lat
+    # longitude buffer where the parallels are the shortest
+    cos_min = np.cos(np.radians(min(max(abs(lat_min), abs(lat_max)), 90)))
+    d_lon = d_lat / max(cos_min, d_lat / 360)
+    lon_min, lon_max = t_lon.min() - d_lon, t_lon.max() + d_lon
+
+    lat, lon = centroids[coastal_idx, 0], centroids[coastal_idx, 1]
+    in_box = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+    close_idx = coastal_idx[in_box]
+    lat, lon = lat[in_box], lon[in_box]
+
+    n_rows = int((lat_max - lat_min) // d_lat) + 1
+    n_cols = int((lon_max - lon_min) // d_lon) + 1
+    cell = ((lat - lat_min) // d_lat).astype(np.int64) * n_cols + \
+        ((lon - lon_min) // d_lon).astype(np.int64)
+    cell_ptr = np.zeros(n_rows * n_cols + 1, np.int64)
+    cell_ptr[1:] = np.cumsum(np.bincount(cell, minlength=n_rows * n_cols))
+    cell_centr = np.argsort(cell, kind='stable').astype(np.int64)
+    grid = (np.array([lat_min, lon_min, d_lat, d_lon]),
+            np.array([n_rows, n_cols], np.int64), cell_ptr, cell_centr)
+    return close_idx, grid
 
-    t_lat, t_lon = track.lat.values, track.lon.values
-    t_rad, t_env = track.radius_max_wind.values, track.environmental_pressure.values
-    t_cen, t_tstep = track.central_pressure.values, track.time_step.values
+@jit(nopython=True)
+def _wind_per_node(centroids, grid, t_lat, t_lon, t_rad, t_env, t_cen,
+                   t_tstep, v_trans, n_nodes, model, thres):
+    """ Compute sustained winds at each centroid. Per node only the centroids
+    of the grid cells around it are considered.
+
+    Parameters:
+        centroids (2d np.array): each row is a centroid [lat, lon]
+        grid (tuple): grid index of the centroids, see _close_centroids
+        t_lat (np.array): track latitudes
+        t_lon (np.array): track longitudes
+        t_rad (np.array): track radius of maximum wind
+        t_env (np.array): track environmental pressures
+        t_cen (np.array): track central pressures
+        t_tstep (np.array): track time steps
+        v_trans (np.array): track translational velocity
+        n_nodes (int): number of track nodes to use
+        model (int): Holland model selection according to MODEL_VANG
+        thres (float): intensity threshold below which winds are set to 0
 
-    centr_cos_lat = np.cos(np.radians(coastal_centr[:, 0]))
-    intensity = np.zeros((coastal_centr.shape[0],))
+    Returns:
+        np.array
+    """
+    g_orig, g_shape, cell_ptr, cell_centr = grid
+    lat_min, lon_min, d_lat, d_lon = g_orig
+    n_rows, n_cols = g_shape
 
-    n_nodes = t_lat.size
-    if 'n_nodes' in track.attrs:
-        n_nodes = track.attrs['n_nodes']
+    intensity = np.zeros((centroids.shape[0],))
+    centr_cos_lat = np.cos(np.radians(centroids[:, 0]))
+    cand = np.empty(centroids.shape[0], np.int64)
 
     for i_node in range(1, n_nodes):
-        # compute distance to all centroids
-        r_arr = dist_approx(coastal_centr[:, 0], coastal_centr[:, 1], \
-            centr_cos_lat, t_lat[i_node], t_lon[i_node])
+        # gather the centroids of the 3x3 cells around the node
+        row = int((t_lat[i_node] - lat_min) // d_lat)
+        col = int((t_lon[i_node] - lon_min) // d_lon)
+        col_0, col_1 = max(col - 1, 0), min(col + 2, n_cols)
+        n_cand = 0
+        for i_row in range(max(row - 1, 0), min(row + 2, n_rows)):
+            if col_0 >= col_1:
+                break
+            for i_pos in range(cell_ptr[i_row * n_cols + col_0],
+                               cell_ptr[i_row * n_cols + col_1]):
+                cand[n_cand] = cell_centr[i_pos]
+                n_cand += 1
+        if not n_cand:
+            continue
+
+        # compute distance to those centroids, as dist_approx
+        close_centr = cand[:n_cand]
+        c_lon = centroids[close_centr, 1] - t_lon[i_node]
+        c_lat = centroids[close_centr, 0] - t_lat[i_node]
+        c_cos = centr_cos_lat[close_centr]
+        r_arr = np.sqrt(c_lon * c_lon * c_cos * c_cos + c_lat * c_lat) * ONE_LAT_KM
 
         # Choose centroids that are close enough
-        close_centr = np.argwhere(r_arr < CENTR_NODE_MAX_DIST_KM).reshape(-1,)
-        r_arr = r_arr[close_centr]
+        close = r_arr < CENTR_NODE_MAX_DIST_KM
+        close_centr = close_centr[close]
+        r_arr = r_arr[close]
+        if not close_centr.size:
+            continue
 
         # translational component
         if i_node < t_lat.size-1:
             v_trans_corr = _vtrans_correct(t_lat[i_node:i_node+2], \
                 t_lon[i_node:i_node+2], t_rad[i_node], \
-                coastal_centr[close_centr, :], r_arr)
+                centroids[close_centr, :], r_arr)
         else:
             v_trans_corr = np.zeros((r_arr.size,))
 
@@ -487,14 +635,14 @@ def _wind_per_node(coastal_centr, track, v_trans, model):
 
         v_full = v_trans[i_node-1] * v_trans_corr + v_ang
         v_full[np.isnan(v_full)] = 0
-        v_full[v_full < TropCyclone.intensity_thres] = 0
+        v_full[v_full < thres] = 0
 
         # keep maximum instantaneous wind
         intensity[close_centr] = np.maximum(intensity[close_centr], v_full)
 
     return intensity
 
-@jit
+@jit(nopython=True)
 def _vtrans_correct(t_lats, t_lons, t_rad, close_centr, r_arr):
     """ Compute Hollands translational wind corrections. Returns factor.
 
@@ -526,7 +674,7 @@ def _vtrans_correct(t_lats, t_lons, t_rad, close_centr, r_arr):
 
     # scalar product, a*b=|a|*|b|*cos(phi), phi angle between vectors
     cos_phi = (centroids_dlon * node_dx + centroids_dlat * node_dy) / \
-        LA.norm([centroids_dlon, centroids_dlat], axis=0) / LA.norm([node_dx, node_dy])
+        np.sqrt(centroids_dlon**2 + centroids_dlat**2) / np.sqrt(node_dx**2 + node_dy**2)
 
     # southern hemisphere
     if lat < 0:
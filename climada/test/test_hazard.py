@@ -83,6 +83,27 @@ class TestCentroids(unittest.TestCase):
         self.assertEqual(haz_read.intensity.shape, (1, 9))
         self.assertTrue(np.allclose(np.unique(np.array(haz_read.intensity.todense())), np.array([0.0, 0.1, 0.2, 0.5])))
 
+    def test_write_vector_same_pixel_pass(self):
+        """ Test write_raster: last of the centroids in the same pixel """
+        haz_fl = Hazard('FL')
+        haz_fl.event_id = np.array([1])
+        haz_fl.date = np.array([1])
+        haz_fl.frequency = np.array([1])
+        haz_fl.orig = np.array([1])
+        haz_fl.event_name = ['1']
+        haz_fl.intensity = sparse.csr_matrix(np.array([0.5, 0.2, 0.1, 0.3]))
+        haz_fl.fraction = sparse.csr_matrix(np.array([0.5, 0.2, 0.1, 0.3])/2)
+        haz_fl.centroids.set_lat_lon(np.array([1, 2, 3, 3]), np.array([1, 2, 3, 3]))
+        haz_fl.check()
+
+        haz_fl.write_raster(os.path.join(DATA_DIR, 'test_write_hazard.tif'))
+
+        haz_read = Hazard('FL')
+        haz_read.set_raster([os.path.join(DATA_DIR, 'test_write_hazard.tif')])
+        self.assertEqual(haz_read.intensity.shape, (1, 9))
+        self.assertTrue(np.allclose(np.unique(np.array(haz_read.intensity.todense())),
+                                    np.array([0.0, 0.2, 0.3, 0.5])))
+
     def test_write_fraction_pass(self):
         """ Test write_raster with fraction """
         haz_fl = Hazard('FL')
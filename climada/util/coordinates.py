@@ -21,6 +21,11 @@ Define functions to handle with coordinates
 import os
 import copy
 import logging
+import warnings
+import functools
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import cpu_count
 import math
 import numpy as np
@@ -28,20 +33,28 @@ from cartopy.io import shapereader
 import shapely.vectorized
 import shapely.ops
 from shapely.geometry import Polygon, MultiPolygon, Point, box
+from shapely.prepared import prep
+from shapely.strtree import STRtree
 from fiona.crs import from_epsg
 from iso3166 import countries as iso_cntry
 import geopandas as gpd
 import rasterio
+from rasterio import Affine
 from rasterio.transform import from_origin
 from rasterio.crs import CRS
-from rasterio.mask import mask
-from rasterio.warp import reproject, Resampling, calculate_default_transform
+from rasterio.mask import mask, raster_geometry_mask
+from rasterio.warp import reproject, Resampling, calculate_default_transform, \
+transform_bounds
 from rasterio.features import rasterize
+from rasterio.windows import Window
 import dask.dataframe as dd
 import pandas as pd
+from scipy import sparse
+from sklearn.neighbors import BallTree
 
 
-from climada.util.constants import DEF_CRS, SYSTEM_DIR
+from climada.util.constants import DEF_CRS, SYSTEM_DIR, EARTH_RADIUS_KM
+from climada.util.config import CONFIG
 
 pd.options.mode.chained_assignment = None
 
@@ -62,6 +75,28 @@ DEM_NODATA = -9999
 MAX_DEM_TILES_DOWN = 300
 """ Maximum DEM tiles to dowload """
 
+DIST_COAST_RES = 0.1
+""" Resolution in degrees of the precomputed distance to coast raster """
+
+COUNTRY_RASTER_RES = 0.05
+""" Resolution in degrees of the precomputed country code raster """
+
+COUNTRY_RASTER_BORDER = -1
+""" Value of the pixels of the country code raster crossed by a border """
+
+RASTER_BLOCKSIZE = 256
+""" Side in pixels of the tiles of the written GeoTIFF files """
+
+STRIP_MARGIN = 3
+""" Source pixels added around the window of every strip reprojected in
+read_raster_blocks, needed by the resampling kernels """
+
+NE_CACHE_DIR = os.path.join(SYSTEM_DIR, 'natural_earth')
+""" Folder where the parsed Natural Earth layers are stored """
+
+_NE_LAYERS = dict()
+""" Natural Earth layers parsed in this session, see nat_earth_layer """
+
 def grid_is_regular(coord):
     """Return True if grid is regular. If True, returns height and width.
 
@@ -92,25 +127,14 @@ def get_coastlines(bounds=None, resolution=110):
     Returns:
         GeoDataFrame
     """
-    resolution = nat_earth_resolution(resolution)
-    shp_file = shapereader.natural_earth(resolution=resolution,
-                                         category='physical',
-                                         name='coastline')
-    coast_df = gpd.read_file(shp_file)
-    coast_df.crs = NE_CRS
+    coast = nat_earth_layer(resolution, 'physical', 'coastline')
     if bounds is None:
-        return coast_df[['geometry']]
-    ex_box = box(bounds[0], bounds[1], bounds[2], bounds[3])
-    tot_coast = list()
-    for row, line in coast_df.iterrows():
-        if line.geometry.envelope.intersects(ex_box):
-            tot_coast.append(row)
-    if not tot_coast:
-        ex_box = box(bounds[0]-20, bounds[1]-20, bounds[2]+20, bounds[3]+20)
-        for row, line in coast_df.iterrows():
-            if line.geometry.envelope.intersects(ex_box):
-                tot_coast.append(row)
-    return coast_df.iloc[tot_coast][['geometry']]
+        return coast.data[['geometry']].copy()
+    coast_idx = coast.query_bounds(bounds)
+    if not coast_idx.size:
+        coast_idx = coast.query_bounds((bounds[0]-20, bounds[1]-20,
+                                        bounds[2]+20, bounds[3]+20))
+    return coast.data.iloc[coast_idx][['geometry']]
 
 def convert_wgs_to_utm(lon, lat):
     """ Get EPSG code of UTM projection for input point in EPSG 4326
@@ -158,7 +182,8 @@ def dist_to_coast(coord_lat, lon=None):
             if coord_lat.shape[1] != 2:
                 LOGGER.error('Missing longitude values.')
                 raise ValueError
-            geom = gpd.GeoDataFrame(geometry=list(map(Point, coord_lat[:, 1], coord_lat[:, 0])),
+            geom = gpd.GeoDataFrame(geometry=gpd.points_from_xy(coord_lat[:, 1],
+                                                                coord_lat[:, 0]),
                                     crs=NE_CRS)
         else:
             LOGGER.error('Missing longitude values.')
@@ -168,7 +193,7 @@ def dist_to_coast(coord_lat, lon=None):
             LOGGER.error('Wrong input coordinates size: %s != %s',
                          coord_lat.size, lon.size)
             raise ValueError
-        geom = gpd.GeoDataFrame(geometry=list(map(Point, lon, coord_lat)),
+        geom = gpd.GeoDataFrame(geometry=gpd.points_from_xy(lon, coord_lat),
                                 crs=NE_CRS)
     elif isinstance(lon, float):
         if not isinstance(coord_lat, float):
@@ -182,6 +207,111 @@ def dist_to_coast(coord_lat, lon=None):
     coast = gpd.GeoDataFrame(geometry=[coast], crs=NE_CRS).to_crs(to_crs)
     return geom.to_crs(to_crs).distance(coast.geometry[0]).values
 
+def dist_to_coast_raster(lat, lon, res=DIST_COAST_RES, file_name=None):
+    """ Compute distance to coast in meters from input points by bilinear
+    interpolation of a global raster of distances to the Natural Earth
+    coastlines at 1:10.000.000. The raster is computed once and stored in
+    SYSTEM_DIR.
+
+    Parameters:
+        lat (np.array): latitudes in epsg:4326
+        lon (np.array): longitudes in epsg:4326
+        res (float, optional): resolution of the raster in degrees.
+            Default: DIST_COAST_RES
+        file_name (str, optional): raster file to use. Default: file of
+            resolution res in SYSTEM_DIR
+
+    Returns:
+        np.array
+    """
+    if file_name is None:
+        file_name = os.path.join(SYSTEM_DIR, 'dist_coast_%sdeg.tif' % res)
+    if not os.path.isfile(file_name):
+        write_dist_coast_raster(file_name, res)
+    dist, transform = _read_cached_raster(file_name)
+    return _interp_bilinear(dist, transform, np.asarray(lat), np.asarray(lon))
+
+def write_dist_coast_raster(file_name, res=DIST_COAST_RES):
+    """ Compute global raster of distances to coast in meters and write it as
+    compressed GeoTIFF. The coastlines are sampled at a quarter of the
+    resolution and the great circle distance of every pixel center to the
+    closest sample is computed with a BallTree.
+
+    Parameters:
+        file_name (str): GeoTIFF file to write
+        res (float, optional): resolution of the raster in degrees.
+            Default: DIST_COAST_RES
+    """
+    LOGGER.info('Computing distance to coast raster with resolution %s.', res)
+    coast_pts = list()
+    for geom in get_coastlines(resolution=10).geometry:
+        for line in getattr(geom, 'geoms', [geom]):
+            coast_pts.append(_densify_line(np.asarray(line.coords)[:, :2], res/4))
+    coast_pts = np.concatenate(coast_pts)
+    tree = BallTree(np.radians(coast_pts[:, ::-1]), metric='haversine')
+
+    width, height = int(round(360/res)), int(round(180/res))
+    transform = from_origin(-180, 90, res, res)
+    lon = -180 + res/2 + np.arange(width)*res
+    dist = np.zeros((height, width), np.float32)
+    for row in range(height):
+        lat = np.full(width, 90 - res/2 - row*res)
+        dist[row, :] = tree.query(np.radians(np.stack([lat, lon], axis=1)), k=1, \
+            return_distance=True)[0].reshape(-1) * EARTH_RADIUS_KM * 1000
+    profile = {'driver': 'GTiff', 'dtype': rasterio.float32, 'count': 1,
+               'width': width, 'height': height, 'crs': NE_CRS,
+               'transform': transform, 'compress': 'deflate', 'tiled': True}
+    _write_cached_raster(file_name, dist, profile)
+
+def _write_cached_raster(file_name, data, profile):
+    """ Write precomputed raster band to a temporary file and move it to
+    file_name once complete, so that an interrupted run leaves no partial
+    file behind. """
+    LOGGER.info('Writting %s', file_name)
+    tmp_file = file_name + '.%s.tmp' % os.getpid()
+    try:
+        with rasterio.open(tmp_file, 'w', **profile) as dst:
+            dst.write(data, 1)
+        os.replace(tmp_file, file_name)
+    finally:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+
+@functools.lru_cache(maxsize=2)
+def _read_cached_raster(file_name):
+    """ Read first band of precomputed raster once. Returns np.array, Affine """
+    LOGGER.info('Reading %s', file_name)
+    with rasterio.open(file_name, 'r') as src:
+        return src.read(1), src.transform
+
+def _densify_line(coords, step):
+    """ Add points to a line so that consecutive points are not further than
+    step (same units as coords). Returns np.array """
+    num_sub = np.maximum(np.ceil(np.linalg.norm(np.diff(coords, axis=0), axis=1)/step),
+                         1).astype(int)
+    seg_idx = np.repeat(np.arange(num_sub.size), num_sub)
+    frac = (np.arange(seg_idx.size) - np.repeat(np.cumsum(num_sub) - num_sub, num_sub)) \
+        / np.repeat(num_sub, num_sub)
+    dense = coords[seg_idx] + (coords[seg_idx + 1] - coords[seg_idx]) * frac[:, np.newaxis]
+    return np.concatenate([dense, coords[-1:]])
+
+def _interp_bilinear(values, transform, lat, lon):
+    """ Bilinear interpolation of a global lat/lon raster (2d np.array) at
+    the given points. Longitudes wrap around and latitudes are clipped to the
+    raster. Returns np.array """
+    col = (lon - transform[2]) / transform[0] - 0.5
+    row = (lat - transform[5]) / transform[4] - 0.5
+    col_0, row_0 = np.floor(col).astype(int), np.floor(row).astype(int)
+    d_col, d_row = col - col_0, row - row_0
+    height, width = values.shape
+    col_1 = (col_0 + 1) % width
+    col_0 = col_0 % width
+    row_1 = np.clip(row_0 + 1, 0, height - 1)
+    row_0 = np.clip(row_0, 0, height - 1)
+    return values[row_0, col_0] * (1 - d_col) * (1 - d_row) + \
+        values[row_0, col_1] * d_col * (1 - d_row) + \
+        values[row_1, col_0] * (1 - d_col) * d_row + \
+        values[row_1, col_1] * d_col * d_row
 
 def get_land_geometry(country_names=None, extent=None, resolution=10):
     """Get union of all the countries or the provided ones or the points inside
@@ -197,29 +327,22 @@ def get_land_geometry(country_names=None, extent=None, resolution=10):
     Returns:
         shapely.geometry.multipolygon.MultiPolygon
     """
-    resolution = nat_earth_resolution(resolution)
-    shp_file = shapereader.natural_earth(resolution=resolution,
-                                         category='cultural',
-                                         name='admin_0_countries')
-    reader = shapereader.Reader(shp_file)
+    admin0 = nat_earth_layer(resolution)
     if (country_names is None) and (extent is None):
         LOGGER.info("Computing earth's land geometry ...")
-        geom = [cntry_geom for cntry_geom in reader.geometries()]
+        geom = list(admin0.data.geometry.dropna())
         geom = shapely.ops.cascaded_union(geom)
 
     elif country_names:
-        countries = list(reader.records())
-        geom = [country.geometry for country in countries
-                if (country.attributes['ISO_A3'] in country_names) or
-                (country.attributes['WB_A3'] in country_names) or
-                (country.attributes['ADM0_A3'] in country_names)]
+        geom = list(admin0.data.geometry.values[admin0.query_iso(country_names)])
         geom = shapely.ops.cascaded_union(geom)
 
     else:
         extent_poly = Polygon([(extent[0], extent[2]), (extent[0], extent[3]),
                                (extent[1], extent[3]), (extent[1], extent[2])])
         geom = []
-        for cntry_geom in reader.geometries():
+        for cntry_geom in admin0.data.geometry.values[admin0.query_bounds( \
+                (extent[0], extent[2], extent[1], extent[3]))]:
             inter_poly = cntry_geom.intersection(extent_poly)
             if not inter_poly.is_empty:
                 geom.append(inter_poly)
@@ -228,7 +351,7 @@ def get_land_geometry(country_names=None, extent=None, resolution=10):
         geom = MultiPolygon([geom])
     return geom
 
-def coord_on_land(lat, lon, land_geom=None):
+def coord_on_land(lat, lon, land_geom=None, precomputed=False):
     """Check if point is on land (True) or water (False) of provided coordinates.
     All globe considered if no input countries.
 
@@ -237,6 +360,8 @@ def coord_on_land(lat, lon, land_geom=None):
         lon (np.array): longitude of points in epsg:4326
         land_geom (shapely.geometry.multipolygon.MultiPolygon, optional):
             profiles of land.
+        precomputed (bool, optional): if no land_geom is provided, look up the
+            country code raster (see get_country_code). Default: False
 
     Returns:
         np.array(bool)
@@ -245,6 +370,8 @@ def coord_on_land(lat, lon, land_geom=None):
         LOGGER.error('Wrong size input coordinates: %s != %s.', lat.size,
                      lon.size)
         raise ValueError
+    if land_geom is None and precomputed:
+        return get_country_code(lat, lon, precomputed=True) != 0
     delta_deg = 1
     if land_geom is None:
         land_geom = get_land_geometry(extent=(np.min(lon)-delta_deg, \
@@ -271,6 +398,146 @@ def nat_earth_resolution(resolution):
         raise ValueError
     return str(resolution) + 'm'
 
+def nat_earth_layer(resolution=10, category='cultural', name='admin_0_countries'):
+    """ Get a Natural Earth layer. Every layer is parsed only once per
+    session, and the parsed layer is stored in NE_CACHE_DIR to be loaded
+    directly in the following sessions.
+
+    Parameters:
+        resolution (float, optional): 10, 50 or 110. Resolution in m. Default:
+            10m, i.e. 1:10.000.000
+        category (str, optional): 'cultural' or 'physical'. Default: 'cultural'
+        name (str, optional): name of the layer. Default: 'admin_0_countries'
+
+    Returns:
+        NatEarthLayer
+    """
+    resolution = nat_earth_resolution(resolution)
+    key = (resolution, category, name)
+    if key not in _NE_LAYERS:
+        shp_file = shapereader.natural_earth(resolution=resolution,
+                                             category=category, name=name)
+        cache_file = os.path.join(NE_CACHE_DIR, 'ne_%s_%s_%s.pkl' % key)
+        _NE_LAYERS[key] = NatEarthLayer(shp_file, cache_file)
+    return _NE_LAYERS[key]
+
+class NatEarthLayer():
+    """ Records of a Natural Earth shapefile with a spatial index of their
+    geometries.
+
+    Attributes:
+        data (GeoDataFrame): attributes and geometry of every record, in the
+            order of the shapefile. Missing ISO_A3 and ISO_N3 codes of admin 0
+            countries are filled.
+        tree (STRtree): spatial index of the geometries
+    """
+    def __init__(self, shp_file, cache_file=None):
+        """ Parse the shapefile, or load it from cache_file if it has been
+        stored from the same shapefile.
+
+        Parameters:
+            shp_file (str): Natural Earth shapefile
+            cache_file (str, optional): file where the parsed layer is stored
+        """
+        shp_stat = os.stat(shp_file)
+        source = (os.path.basename(shp_file), shp_stat.st_size, shp_stat.st_mtime)
+        self.data = None
+        if cache_file and os.path.isfile(cache_file):
+            with open(cache_file, 'rb') as file:
+                cache = pickle.load(file)
+            if cache['source'] == source:
+                self.data = cache['data']
+        if self.data is None:
+            LOGGER.info('Reading %s', shp_file)
+            self.data = gpd.read_file(shp_file, encoding='UTF-8')
+            if not self.data.crs:
+                self.data.crs = NE_CRS
+            if 'ADM0_A3' in self.data.columns and 'ISO_N3' in self.data.columns:
+                _fill_admin0_codes(self.data)
+            if cache_file:
+                self._write_cache(cache_file, source)
+        # position in data of every geometry indexed in the tree
+        self._geom_idx = np.flatnonzero([geom is not None and not geom.is_empty
+                                         for geom in self.data.geometry.values])
+        geoms = [self.data.geometry.values[idx] for idx in self._geom_idx]
+        self._tree_pos = {id(geom): pos for pos, geom in enumerate(geoms)}
+        self.tree = STRtree(geoms)
+        self._prepared = dict()
+
+    def query_bounds(self, bounds):
+        """ Records whose geometry envelope intersects the bounds.
+
+        Parameters:
+            bounds (tuple): min_lon, min_lat, max_lon, max_lat
+
+        Returns:
+            np.array(int): sorted positions of the records in data
+        """
+        tree_pos = self.tree.query(box(*bounds))
+        if len(tree_pos) and not isinstance(tree_pos[0], (int, np.integer)):
+            # shapely < 2.0 returns the geometries instead of their positions
+            tree_pos = [self._tree_pos[id(geom)] for geom in tree_pos]
+        return np.sort(self._geom_idx[np.asarray(tree_pos, dtype=int)])
+
+    def query_iso(self, iso, fields=('ISO_A3', 'WB_A3', 'ADM0_A3')):
+        """ Records with any of the given codes in any of the fields.
+
+        Parameters:
+            iso (str or list(str)): codes, e.g. ISO3 names of countries
+            fields (tuple, optional): attributes to compare with.
+                Default: ('ISO_A3', 'WB_A3', 'ADM0_A3')
+
+        Returns:
+            np.array(int): sorted positions of the records in data
+        """
+        if isinstance(iso, str):
+            iso = [iso]
+        fields = [field for field in fields if field in self.data.columns]
+        return np.flatnonzero(self.data[fields].isin(iso).any(axis=1).values)
+
+    def prepared(self, idx):
+        """ Prepared geometry of a record, for fast containment tests.
+
+        Parameters:
+            idx (int): position of the record in data
+
+        Returns:
+            shapely.prepared.PreparedGeometry
+        """
+        if idx not in self._prepared:
+            self._prepared[idx] = prep(self.data.geometry.values[idx])
+        return self._prepared[idx]
+
+    def _write_cache(self, cache_file, source):
+        """ Store the parsed records in cache_file, if possible. """
+        tmp_file = cache_file + '.%s.tmp' % os.getpid()
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(tmp_file, 'wb') as file:
+                pickle.dump({'source': source, 'data': self.data}, file,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError as err:
+            LOGGER.warning('Natural Earth layer not cached in %s: %s', cache_file, err)
+
+def _fill_admin0_codes(nat_earth):
+    """ Fill the missing (-99) ISO_A3 codes with ADM0_A3 and the missing ISO_N3
+    codes from the ISO 3166 numeric code of the country.
+
+    Parameters:
+        nat_earth (GeoDataFrame): Natural Earth admin 0 countries
+    """
+    no_a3 = nat_earth.ISO_A3 == '-99'
+    nat_earth.loc[no_a3, 'ISO_A3'] = nat_earth.ADM0_A3[no_a3]
+    for idx in nat_earth.index[nat_earth.ISO_N3 == '-99']:
+        for col in ['ISO_A3', 'ADM0_A3', 'NAME']:
+            try:
+                nat_earth.loc[idx, 'ISO_N3'] = iso_cntry.get(nat_earth.loc[idx, col]).numeric
+            except KeyError:
+                nat_earth.loc[idx, 'ISO_N3'] = '-99'
+            else:
+                break
+
 def get_country_geometries(country_names=None, extent=None, resolution=10):
     """Returns a gpd GeoSeries of natural earth multipolygons of the
     specified countries, resp. the countries that lie within the specified
@@ -291,26 +558,8 @@ def get_country_geometries(country_names=None, extent=None, resolution=10):
     Returns:
         GeoDataFrame
     """
-    resolution = nat_earth_resolution(resolution)
-    shp_file = shapereader.natural_earth(resolution=resolution,
-                                         category='cultural',
-                                         name='admin_0_countries')
-    nat_earth = gpd.read_file(shp_file, encoding='UTF-8')
-
-    if not nat_earth.crs:
-        nat_earth.crs = NE_CRS
-
-    for idx in nat_earth.index: # fill gaps in nat_earth
-        if nat_earth.loc[idx].ISO_A3=='-99':
-            nat_earth.loc[idx, 'ISO_A3'] = nat_earth.loc[idx].ADM0_A3
-        if nat_earth.loc[idx].ISO_N3=='-99':
-            for col in ['ISO_A3', 'ADM0_A3', 'NAME']:
-                try:
-                    nat_earth.loc[idx, 'ISO_N3']  = iso_cntry.get(nat_earth.loc[idx, col]).numeric
-                except KeyError:
-                    nat_earth.loc[idx, 'ISO_N3'] = '-99'
-                else:
-                    break
+    admin0 = nat_earth_layer(resolution)
+    nat_earth = admin0.data
     if country_names:
         if isinstance(country_names, str):
             country_names = [country_names]
@@ -324,33 +573,81 @@ def get_country_geometries(country_names=None, extent=None, resolution=10):
         ])
         bbox = gpd.GeoSeries(bbox, crs=nat_earth.crs)
         bbox = gpd.GeoDataFrame({'geometry': bbox}, crs=nat_earth.crs)
+        nat_earth = nat_earth.iloc[admin0.query_bounds((extent[0], extent[2],
+                                                        extent[1], extent[3]))]
         out = gpd.overlay(nat_earth, bbox, how="intersection")
 
     else:
-        out = nat_earth
+        out = nat_earth.copy()
     return out
 
-def get_country_code(lat, lon):
+def get_country_code(lat, lon, precomputed=False, res=COUNTRY_RASTER_RES):
     """ Provide numeric country iso code for every point.
 
     Parameters:
         lat (np.array): latitude of points in epsg:4326
         lon (np.array): longitude of points in epsg:4326
+        precomputed (bool, optional): look up the code in a global raster of
+            Natural Earth countries stored in SYSTEM_DIR (computed once). Only
+            the points in pixels crossed by a border are tested against the
+            polygons. Default: False
+        res (float, optional): resolution of the raster in degrees.
+            Default: COUNTRY_RASTER_RES
 
     Returns:
         np.array(int)
     """
     lat = np.array(lat)
     lon = np.array(lon)
+    if precomputed:
+        file_name = os.path.join(SYSTEM_DIR, 'country_code_%sdeg.tif' % res)
+        if not os.path.isfile(file_name):
+            write_country_code_raster(file_name, res)
+        country, transform = _read_cached_raster(file_name)
+        col = np.floor((lon - transform[2]) / transform[0]).astype(int) % country.shape[1]
+        row = np.clip(np.floor((lat - transform[5]) / transform[4]).astype(int),
+                      0, country.shape[0] - 1)
+        region_id = country[row, col].astype(int)
+        border = region_id == COUNTRY_RASTER_BORDER
+        LOGGER.debug('Testing %s points in border pixels.', np.count_nonzero(border))
+        if np.any(border):
+            region_id[border] = get_country_code(lat[border], lon[border])
+        return region_id
     LOGGER.debug('Setting region_id %s points.', str(lat.size))
-    countries = get_country_geometries(extent=(lon.min()-0.001, lon.max()+0.001,
-                                               lat.min()-0.001, lat.max()+0.001))
+    admin0 = nat_earth_layer()
     region_id = np.zeros(lon.size, dtype=int)
-    for geom in zip(countries.geometry, countries.ISO_N3):
-        select = shapely.vectorized.contains(geom[0], lon, lat)
-        region_id[select] = int(geom[1])
+    for idx in admin0.query_bounds((lon.min()-0.001, lat.min()-0.001,
+                                    lon.max()+0.001, lat.max()+0.001)):
+        select = shapely.vectorized.contains(admin0.prepared(idx), lon, lat)
+        region_id[select] = int(admin0.data.ISO_N3.values[idx])
     return region_id
 
+def write_country_code_raster(file_name, res=COUNTRY_RASTER_RES):
+    """ Rasterize the Natural Earth countries (1:10.000.000) to a global
+    raster of numeric ISO codes (0 in water) and write it as compressed
+    GeoTIFF. Pixels crossed by a border or a coastline get the value
+    COUNTRY_RASTER_BORDER.
+
+    Parameters:
+        file_name (str): GeoTIFF file to write
+        res (float, optional): resolution of the raster in degrees.
+            Default: COUNTRY_RASTER_RES
+    """
+    LOGGER.info('Computing country code raster with resolution %s.', res)
+    countries = get_country_geometries()
+    width, height = int(round(360/res)), int(round(180/res))
+    transform = from_origin(-180, 90, res, res)
+    country = rasterize(zip(countries.geometry, countries.ISO_N3.astype(int)),
+                        out_shape=(height, width), transform=transform, fill=0,
+                        dtype=np.int16)
+    country = rasterize(((geom.boundary, COUNTRY_RASTER_BORDER) \
+                         for geom in countries.geometry), out=country,
+                        transform=transform, all_touched=True)
+    profile = {'driver': 'GTiff', 'dtype': rasterio.int16, 'count': 1,
+               'width': width, 'height': height, 'crs': NE_CRS,
+               'transform': transform, 'compress': 'deflate', 'tiled': True}
+    _write_cached_raster(file_name, country, profile)
+
 def get_resolution(lat, lon, min_resol=1.0e-8):
     """ Compute resolution of points in lat and lon
 
@@ -374,6 +671,31 @@ def get_resolution(lat, lon, min_resol=1.0e-8):
         res_lon = 0
     return res_lat, res_lon
 
+def get_pixel_area(lat, res_lat, res_lon):
+    """ Compute the area in m*m of lat/lon pixels centered at the given
+    latitudes. The area of the zone between the latitudes of the pixel edges
+    is computed analytically on the GRS80 ellipsoid, equal to the area in the
+    cylindrical equal area projection.
+
+    Parameters:
+        lat (np.array): latitude of the pixel centers in epsg:4326
+        res_lat (float or np.array): pixel size in latitude (degrees)
+        res_lon (float or np.array): pixel size in longitude (degrees)
+
+    Returns:
+        np.array
+    """
+    semi_axis, flat = 6378137.0, 1 / 298.257222101
+    ecc = np.sqrt(flat * (2 - flat))
+    def authalic_q(lat_edge):
+        sin_lat = np.sin(np.radians(np.clip(lat_edge, -90, 90)))
+        return (1 - ecc**2) * (sin_lat / (1 - (ecc * sin_lat)**2) - \
+            np.log((1 - ecc * sin_lat) / (1 + ecc * sin_lat)) / (2 * ecc))
+    lat = np.asarray(lat, float)
+    half_lat = np.abs(res_lat) / 2
+    return semi_axis**2 * np.radians(np.abs(res_lon)) / 2 * \
+        np.abs(authalic_q(lat + half_lat) - authalic_q(lat - half_lat))
+
 def pts_to_raster_meta(points_bounds, res):
     """" Transform vector data coordinates to raster. Returns number of rows,
     columns and affine transformation
@@ -395,6 +717,46 @@ def pts_to_raster_meta(points_bounds, res):
         rows += 1
     return rows, cols, ras_trans
 
+def pts_to_raster_idx(lat, lon, transform, width, height):
+    """ Compute the flat index (row-major) of the raster pixel containing
+    every point.
+
+    Parameters:
+        lat (np.array): latitude (y) of points in the raster CRS
+        lon (np.array): longitude (x) of points in the raster CRS
+        transform (affine.Affine): raster transformation (upper left corner)
+        width (int): number of raster columns
+        height (int): number of raster rows
+
+    Returns:
+        np.array(int) (-1 for points outside the raster)
+    """
+    col = np.floor((np.asarray(lon) - transform[2]) / transform[0]).astype(int)
+    row = np.floor((np.asarray(lat) - transform[5]) / transform[4]).astype(int)
+    pix_idx = row * width + col
+    pix_idx[(col < 0) | (col >= width) | (row < 0) | (row >= height)] = -1
+    return pix_idx
+
+def pts_to_boxes(lat, lon, res):
+    """ Build the square pixel polygon of side res centered at every point.
+    The corners are computed on the whole arrays at once, avoiding the
+    construction of intermediate Points.
+
+    Parameters:
+        lat (np.array): latitude (y) of the pixel centers
+        lon (np.array): longitude (x) of the pixel centers
+        res (float or np.array): pixel side length, in the units of lat and lon
+
+    Returns:
+        np.array(Polygon)
+    """
+    lat, lon = np.asarray(lat, float), np.asarray(lon, float)
+    half = np.broadcast_to(np.abs(res) / 2, lat.shape)
+    boxes = np.empty(lat.size, dtype=object)
+    boxes[:] = list(map(box, (lon - half).tolist(), (lat - half).tolist(),
+                        (lon + half).tolist(), (lat + half).tolist()))
+    return boxes
+
 def equal_crs(crs_one, crs_two):
     """ Compare two crs
 
@@ -412,7 +774,8 @@ def read_raster(file_name, band=[1], src_crs=None, window=False, geometry=False,
                 resampling=Resampling.nearest):
     """ Read raster of bands and set 0 values to the masked ones. Each
     band is an event. Select region using window or geometry. Reproject
-    input by proving dst_crs and/or (transform, width, height). Returns matrix
+    input by proving dst_crs and/or (transform, width, height): the source
+    bands are then read strip by strip (see read_raster_blocks). Returns matrix
     in 2d: band x coordinates in 1d (evtl. reshape to band x height x width)
 
     Parameters:
@@ -441,36 +804,14 @@ def read_raster(file_name, band=[1], src_crs=None, window=False, geometry=False,
                 src_meta = src_crs
             if dst_crs or transform:
                 LOGGER.debug('Reprojecting ...')
-                if not dst_crs:
-                    dst_crs = src_meta
-                if not transform:
-                    transform, width, height = calculate_default_transform(\
-                        src_meta, dst_crs, src.width, src.height, *src.bounds)
-                dst_meta = src.meta.copy()
-                dst_meta.update({'crs': dst_crs,
-                                 'transform': transform,
-                                 'width': width,
-                                 'height': height
-                                })
-                kwargs = {}
-                if src.meta['nodata']:
-                    kwargs['src_nodata'] = src.meta['nodata']
-                    kwargs['dst_nodata'] = src.meta['nodata']
-                intensity = np.zeros((len(band), height, width))
-                for idx_band, i_band in enumerate(band):
-                    reproject(source=src.read(i_band),
-                              destination=intensity[idx_band, :],
-                              src_transform=src.transform,
-                              src_crs=src_meta,
-                              dst_transform=transform,
-                              dst_crs=dst_crs,
-                              resampling=resampling,
-                              **kwargs)
-                    if dst_meta['nodata'] and np.isnan(dst_meta['nodata']):
-                        intensity[idx_band, :][np.isnan(intensity[idx_band, :])] = 0
-                    else:
-                        intensity[idx_band, :][intensity[idx_band, :] == dst_meta['nodata']] = 0
-                meta = dst_meta
+                meta = _raster_meta(src, src_meta, False, dst_crs, transform,
+                                    width, height)
+                intensity = np.zeros((len(band), meta['height'], meta['width']))
+                for row_off, blk_inten in _raster_strips(file_name, band, src_meta,
+                                                         False, meta, True,
+                                                         resampling):
+                    intensity[:, row_off:row_off+blk_inten.shape[1], :] = \
+                        blk_inten.filled(0)
                 return meta, intensity.reshape((len(band), meta['height']*meta['width']))
 
             meta = src.meta.copy()
@@ -496,6 +837,264 @@ def read_raster(file_name, band=[1], src_crs=None, window=False, geometry=False,
             intensity = inten[range(len(band)), :]
             return meta, intensity.reshape((len(band), meta['height']*meta['width']))
 
+def read_raster_sparse(file_name, band=[1], window=False, threshold=None,
+                       src_crs=None, dst_crs=False, transform=None, width=None,
+                       height=None, resampling=Resampling.nearest, threads=None,
+                       geometry=False):
+    """ Read raster of bands block by block and keep only the non zero values
+    which are not masked. Each band is an event. The full bands are never
+    loaded in memory: the raster is read in strips of rows containing at most
+    CONFIG['global']['max_matrix_size'] values, which are directly converted
+    to sparse rows. Reproject input by proving dst_crs and/or (transform,
+    width, height): every strip is reprojected from the source pixels it covers.
+
+    Parameters:
+        file_name (str): name of the file
+        band (list(int), optional): band number to read. Default: 1
+        window (rasterio.windows.Window, optional): window to read
+        threshold (float, optional): values below threshold are dropped too.
+        src_crs (crs, optional): source CRS. Provide it if error without it.
+        dst_crs (crs, optional): reproject to given crs
+        transform (rasterio.Affine): affine transformation to apply
+        wdith (float): number of lons for transform
+        height (float): number of lats for transform
+        resampling (rasterio.warp,.Resampling optional): resampling
+            function used for reprojection to dst_crs
+        threads (int, optional): number of threads decoding and reprojecting
+            strips concurrently. Default: read sequentially.
+        geometry (shapely.geometry, optional): consider pixels only in shape,
+            read in the window of its bounds. Not considered when reprojecting.
+
+    Returns:
+        dict (meta), sparse.csr_matrix (band x coordinates_in_1d)
+    """
+    geom_mask = None
+    if geometry and not (dst_crs or transform):
+        src_name = file_name
+        if os.path.splitext(src_name)[1] == '.gz':
+            src_name = '/vsigzip/' + src_name
+        with rasterio.Env():
+            with rasterio.open(src_name, 'r') as src:
+                geom_mask, _, window = raster_geometry_mask(src, geometry, crop=True)
+    meta, strips = read_raster_blocks(file_name, band, src_crs, window, dst_crs,
+                                      transform, width, height, resampling,
+                                      threads)
+    width, height = meta['width'], meta['height']
+    ev_list, pix_list, val_list = [], [], []
+    for row_off, masked_array in strips:
+        valid = np.logical_not(np.ma.getmaskarray(masked_array))
+        if geom_mask is not None:
+            valid &= np.logical_not(geom_mask[row_off:row_off+valid.shape[1], :])
+        valid &= masked_array.data != 0
+        if threshold is not None:
+            valid &= masked_array.data >= threshold
+        ev_idx, row_idx, col_idx = valid.nonzero()
+        ev_list.append(ev_idx)
+        pix_list.append((row_idx + row_off) * width + col_idx)
+        val_list.append(masked_array.data[ev_idx, row_idx, col_idx])
+    inten = sparse.coo_matrix((np.concatenate(val_list), (np.concatenate(ev_list), \
+        np.concatenate(pix_list))), shape=(len(band), height*width))
+    return meta, inten.tocsr()
+
+def read_raster_blocks(file_name, band=[1], src_crs=None, window=False,
+                       dst_crs=False, transform=None, width=None, height=None,
+                       resampling=Resampling.nearest, threads=None):
+    """ Iterate over a raster of bands in strips of rows containing at most
+    CONFIG['global']['max_matrix_size'] values. Reproject input by proving
+    dst_crs and/or (transform, width, height): every strip is reprojected from
+    the source pixels it covers, so that the full bands are never loaded in
+    memory.
+
+    Parameters:
+        file_name (str): name of the file
+        band (list(int), optional): band number to read. Default: 1
+        src_crs (crs, optional): source CRS. Provide it if error without it.
+        window (rasterio.windows.Window, optional): window to read. Not
+            considered when reprojecting.
+        dst_crs (crs, optional): reproject to given crs
+        transform (rasterio.Affine): affine transformation to apply
+        wdith (float): number of lons for transform
+        height (float): number of lats for transform
+        resampling (rasterio.warp,.Resampling optional): resampling
+            function used for reprojection to dst_crs
+        threads (int, optional): number of threads decoding and reprojecting
+            strips concurrently. Default: read sequentially.
+
+    Returns:
+        dict (meta), iterator of (int, np.ma.MaskedArray): row offset of every
+        strip and its values (band x rows x width), masked where no data
+    """
+    LOGGER.info('Reading %s', file_name)
+    if os.path.splitext(file_name)[1] == '.gz':
+        file_name = '/vsigzip/' + file_name
+    with rasterio.Env():
+        with rasterio.open(file_name, 'r') as src:
+            if src_crs is None:
+                src_crs = CRS.from_dict(DEF_CRS) if not src.crs else src.crs
+            meta = _raster_meta(src, src_crs, window, dst_crs, transform,
+                                width, height)
+    return meta, _raster_strips(file_name, band, src_crs, window, meta,
+                                bool(dst_crs or transform), resampling, threads)
+
+def _raster_meta(src, src_crs, window, dst_crs, transform, width, height):
+    """ Meta of the raster read from src with the window or reprojected.
+
+    Parameters:
+        src (rasterio.io.DatasetReader): open raster
+        src_crs (crs): source CRS
+        window (rasterio.windows.Window): window to read
+        dst_crs (crs): CRS to reproject to
+        transform (rasterio.Affine): affine transformation to reproject to
+        width (int): number of columns for transform
+        height (int): number of rows for transform
+
+    Returns:
+        dict
+    """
+    meta = src.meta.copy()
+    if dst_crs or transform:
+        if not dst_crs:
+            dst_crs = src_crs
+        if not transform:
+            transform, width, height = calculate_default_transform(\
+                src_crs, dst_crs, src.width, src.height, *src.bounds)
+        meta.update({'crs': dst_crs, 'transform': transform, 'width': width,
+                     'height': height})
+        return meta
+    if window:
+        meta.update({"height": window.height, "width": window.width,
+                     "transform": rasterio.windows.transform(window, src.transform)})
+    if not meta['crs']:
+        meta['crs'] = CRS.from_dict(DEF_CRS)
+    return meta
+
+def _raster_strips(file_name, band, src_crs, window, meta, reproj, resampling,
+                   threads=None):
+    """ Generate the strips of rows of the raster with given meta. See
+    read_raster_blocks. """
+    row_step = max(1, int(CONFIG['global']['max_matrix_size']/(len(band)*meta['width'])))
+    row_offs = range(0, meta['height'], row_step)
+    warp_opt = dict()
+    if reproj:
+        # resampling scale of the whole raster, not of every strip. Computed
+        # before reading so that all the threads use the same options.
+        with rasterio.Env():
+            with rasterio.open(file_name, 'r') as src:
+                src_win = _source_window(src, src_crs, meta['crs'], meta['transform'],
+                                         meta['width'], meta['height'])
+        warp_opt['XSCALE'] = meta['width'] / max(1, src_win.width)
+        warp_opt['YSCALE'] = meta['height'] / max(1, src_win.height)
+
+    def read_strip(src, row_off):
+        n_rows = min(row_step, meta['height'] - row_off)
+        if reproj:
+            return _reproject_strip(src, band, src_crs, meta, row_off, n_rows,
+                                    resampling, warp_opt)
+        if not window:
+            blk_win = Window(0, row_off, meta['width'], n_rows)
+        else:
+            blk_win = Window(window.col_off, window.row_off + row_off,
+                             meta['width'], n_rows)
+        return src.read(band, window=blk_win, masked=True)
+
+    if threads:
+        # every thread opens its own dataset once and keeps it for all its strips
+        thread_data = threading.local()
+        thread_src = list()
+
+        def read_strip_thread(row_off):
+            if not hasattr(thread_data, 'src'):
+                thread_data.src = rasterio.open(file_name, 'r')
+                thread_src.append(thread_data.src)
+            return read_strip(thread_data.src, row_off)
+
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                # read as many strips as threads at a time to bound the memory
+                for idx in range(0, len(row_offs), threads):
+                    blk_offs = row_offs[idx:idx+threads]
+                    yield from zip(blk_offs, executor.map(read_strip_thread, blk_offs))
+        finally:
+            for src in thread_src:
+                src.close()
+    else:
+        with rasterio.Env():
+            with rasterio.open(file_name, 'r') as src:
+                for row_off in row_offs:
+                    yield row_off, read_strip(src, row_off)
+
+def _reproject_strip(src, band, src_crs, meta, row_off, n_rows, resampling,
+                     warp_opt):
+    """ Reproject the rows [row_off, row_off+n_rows) of the raster with given
+    meta from the window of src covering them.
+
+    Parameters:
+        src (rasterio.io.DatasetReader): open raster
+        band (list(int)): band numbers to read
+        src_crs (crs): source CRS
+        meta (dict): meta of the reprojected raster
+        row_off (int): first row of the strip
+        n_rows (int): number of rows of the strip
+        resampling (rasterio.warp,.Resampling): resampling function
+        warp_opt (dict): GDAL warp options
+
+    Returns:
+        np.ma.MaskedArray (band x n_rows x width)
+    """
+    nodata = src.meta['nodata']
+    dst_trans = meta['transform'] * Affine.translation(0, row_off)
+    dst = np.zeros((len(band), n_rows, meta['width']))
+    if nodata:
+        dst[:] = nodata
+    src_win = _source_window(src, src_crs, meta['crs'], dst_trans, meta['width'],
+                             n_rows, STRIP_MARGIN)
+    if src_win.width > 0 and src_win.height > 0:
+        src_data = src.read(band, window=src_win)
+        kwargs = dict(warp_opt)
+        if nodata:
+            kwargs['src_nodata'] = nodata
+            kwargs['dst_nodata'] = nodata
+        for idx_band in range(len(band)):
+            reproject(source=src_data[idx_band], destination=dst[idx_band],
+                      src_transform=src.window_transform(src_win),
+                      src_crs=src_crs, dst_transform=dst_trans,
+                      dst_crs=meta['crs'], resampling=resampling, **kwargs)
+    if nodata and np.isnan(nodata):
+        return np.ma.masked_invalid(dst)
+    return np.ma.masked_equal(dst, nodata) if nodata else np.ma.masked_array(dst)
+
+def _source_window(src, src_crs, dst_crs, dst_trans, width, height, margin=0):
+    """ Window of src covering the raster with given transformation and
+    size, enlarged by margin pixels and clipped to src. The whole src if the
+    raster bounds can not be transformed to src_crs.
+
+    Parameters:
+        src (rasterio.io.DatasetReader): open raster
+        src_crs (crs): source CRS
+        dst_crs (crs): CRS of the raster
+        dst_trans (rasterio.Affine): transformation of the raster
+        width (int): number of columns of the raster
+        height (int): number of rows of the raster
+        margin (int, optional): pixels added on every side. Default: 0
+
+    Returns:
+        rasterio.windows.Window
+    """
+    x_1, y_1 = dst_trans * (0, 0)
+    x_2, y_2 = dst_trans * (width, height)
+    with np.errstate(invalid='ignore'):
+        src_bounds = np.array(transform_bounds(dst_crs, src_crs, min(x_1, x_2),
+                                               min(y_1, y_2), max(x_1, x_2),
+                                               max(y_1, y_2), densify_pts=21))
+    if not np.all(np.isfinite(src_bounds)):
+        return Window(0, 0, src.width, src.height)
+    src_win = rasterio.windows.from_bounds(*src_bounds, transform=src.transform)
+    col_ini = max(0, int(np.floor(src_win.col_off)) - margin)
+    row_ini = max(0, int(np.floor(src_win.row_off)) - margin)
+    col_end = min(src.width, int(np.ceil(src_win.col_off + src_win.width)) + margin)
+    row_end = min(src.height, int(np.ceil(src_win.row_off + src_win.height)) + margin)
+    return Window(col_ini, row_ini, max(0, col_end - col_ini), max(0, row_end - row_ini))
+
 def read_vector(file_name, field_name, dst_crs=None):
     """ Read vector file format supported by fiona. Each field_name name is
     considered an event.
@@ -523,36 +1122,82 @@ def read_vector(file_name, field_name, dst_crs=None):
         value[i_inten, :] = data_frame[inten].values
     return lat, lon, geometry, value
 
-def write_raster(file_name, data_matrix, meta):
-    """ Write raster in GeoTiff format
+def write_raster(file_name, data_matrix, meta, dtype=rasterio.float32,
+                 compress='deflate', predictor=None, tiled=True,
+                 blocksize=RASTER_BLOCKSIZE, nodata=None, overviews=True,
+                 ovr_resampling=Resampling.nearest):
+    """ Write raster in GeoTiff format. The bands are written in groups of at
+    most CONFIG['global']['max_matrix_size'] values, so that sparse data is
+    never converted to dense all at once.
 
     Parameters:
         fle_name (str): file name to write
-        data_matrix (np.array): 2d raster data. Either containing one band,
-            or every row is a band and the column represents the grid in 1d.
+        data_matrix (np.array or sparse.csr_matrix): 2d raster data. Either
+            containing one band, or every row is a band and the column
+            represents the grid in 1d.
         meta (dict): rasterio meta dictionary containing raster
             properties: width, height, crs and transform must be present
             at least (transform needs to contain upper left corner!)
+        dtype (optional): data type written. Default: rasterio.float32
+        compress (str, optional): compression, e.g. 'deflate', 'lzw' or None.
+            Default: 'deflate'
+        predictor (int, optional): compression predictor: 1 (none),
+            2 (horizontal differencing) or 3 (floating point). Default: 3 for
+            float data types, 2 otherwise
+        tiled (bool, optional): write square tiles instead of strips.
+            Default: True
+        blocksize (int, optional): side of the tiles, multiple of 16.
+            Default: RASTER_BLOCKSIZE
+        nodata (float, optional): value of no data pixels. Default: the one
+            in meta, if any
+        overviews (bool or list(int), optional): build overviews with the
+            given decimation factors. If True, factors 2, 4, 8... are used
+            until the overview is smaller than blocksize. Default: True
+        ovr_resampling (rasterio.warp.Resampling, optional): resampling used
+            to build the overviews. Default: Resampling.nearest
     """
     LOGGER.info('Writting %s', file_name)
-    if data_matrix.shape != (meta['height'], meta['width']):
-        # every row is an event (from hazard intensity or fraction) == band
-        profile = copy.deepcopy(meta)
-        profile.update(driver='GTiff', dtype=rasterio.float32, count=data_matrix.shape[0])
-        with rasterio.open(file_name, 'w', **profile) as dst:
-            dst.write(np.asarray(data_matrix, dtype=rasterio.float32).\
-                reshape((data_matrix.shape[0], profile['height'], profile['width'])), \
-                indexes=np.arange(1, data_matrix.shape[0]+1))
-    else:
+    height, width = meta['height'], meta['width']
+    if data_matrix.shape == (height, width):
         # only one band
-        profile = copy.deepcopy(meta)
-        profile.update(driver='GTiff', dtype=rasterio.float32, count=1)
-        with rasterio.open(file_name, 'w', **profile) as dst:
-            dst.write(np.asarray(data_matrix, dtype=rasterio.float32))
+        data_matrix = data_matrix.reshape((1, height*width))
+    # every row is an event (from hazard intensity or fraction) == band
+    profile = copy.deepcopy(meta)
+    profile.update(driver='GTiff', dtype=dtype, count=data_matrix.shape[0],
+                   interleave='band')
+    if tiled:
+        profile.update(tiled=True, blockxsize=blocksize, blockysize=blocksize)
+    if compress:
+        if predictor is None:
+            predictor = 3 if np.issubdtype(dtype, np.floating) else 2
+        profile.update(compress=compress, predictor=predictor)
+    if nodata is not None:
+        profile['nodata'] = nodata
+
+    band_step = max(1, int(CONFIG['global']['max_matrix_size']/(height*width)))
+    with rasterio.open(file_name, 'w', **profile) as dst:
+        for band_ini in range(0, data_matrix.shape[0], band_step):
+            bands = data_matrix[band_ini:band_ini+band_step, :]
+            if sparse.issparse(bands):
+                bands = bands.toarray()
+            bands = np.asarray(bands, dtype=dtype).reshape((-1, height, width))
+            dst.write(bands, indexes=np.arange(band_ini+1, band_ini+bands.shape[0]+1))
+        if overviews is True:
+            overviews = [2**exp for exp in range(1, int(np.log2(max(height, width) \
+                                                 / blocksize)) + 1)]
+        if overviews:
+            dst.build_overviews(overviews, ovr_resampling)
+            dst.update_tags(ns='rio_overview', resampling=ovr_resampling.name)
 
 def points_to_raster(points_df, val_names=['value'], res=None, raster_res=None,
                      scheduler=None):
-    """ Compute raster matrix and transformation from value column
+    """ Compute raster matrix and transformation from value column. Every
+    point represents a pixel of side res centered on it, whose value is set
+    to the raster pixels with center inside it (or to the raster pixel
+    containing the point, if coarser). The raster pixels are computed from
+    the coordinates and the raster transformation, and the values of all the
+    columns are accumulated at once: values of points falling in the same
+    raster pixel are summed.
 
     Parameters:
         points_df (GeoDataFrame): contains columns latitude, longitude and in
@@ -560,46 +1205,72 @@ def points_to_raster(points_df, val_names=['value'], res=None, raster_res=None,
         res (float, optional): resolution of current data in units of latitude
             and longitude, approximated if not provided.
         raster_res (float, optional): desired resolution of the raster
-        scheduler (str): used for dask map_partitions. “threads”,
-                “synchronous” or “processes”
+        scheduler (str, optional): deprecated, not used anymore
 
     Returns:
         np.array, affine.Affine
 
     """
+    if scheduler is not None:
+        warnings.warn('The scheduler argument is ignored and will be removed.',
+                      DeprecationWarning, stacklevel=2)
 
     if not res:
         res = min(get_resolution(points_df.latitude.values, points_df.longitude.values))
     if not raster_res:
         raster_res = res
 
-    def apply_box(df_exp):
-        return df_exp.apply((lambda row: Point(row.longitude, row.latitude). \
-                             buffer(res/2).envelope), axis=1)
     LOGGER.info('Raster from resolution %s to %s.', res, raster_res)
-    df_poly = points_df[val_names]
-    if not scheduler:
-        df_poly['geometry'] = apply_box(points_df)
-    else:
-        ddata = dd.from_pandas(points_df[['latitude', 'longitude']],
-                               npartitions=cpu_count())
-        df_poly['geometry'] = ddata.map_partitions(apply_box, meta=Polygon).\
-        compute(scheduler=scheduler)
+    lat, lon = points_df.latitude.values, points_df.longitude.values
     # construct raster
-    xmin, ymin, xmax, ymax = points_df.longitude.min(), points_df.latitude.min(), \
-    points_df.longitude.max(), points_df.latitude.max()
+    xmin, ymin, xmax, ymax = lon.min(), lat.min(), lon.max(), lat.max()
     rows, cols, ras_trans = pts_to_raster_meta((xmin, ymin, xmax, ymax), raster_res)
-    raster_out = np.zeros((len(val_names), rows, cols))
-    # TODO: parallel rasterize
-    for i_val, val_name in enumerate(val_names):
-        raster_out[i_val, :, :] = rasterize([(x, val) for (x, val) in zip(df_poly.geometry, \
-            df_poly[val_name])], out_shape=(rows, cols), transform=ras_trans, \
-            fill=0, all_touched=True, dtype=rasterio.float32, )
+
+    # range of raster rows and columns covered by the pixel of every point
+    row_ini, row_end = _pixel_range(ras_trans[5] - lat, res, raster_res, rows)
+    col_ini, col_end = _pixel_range(lon - ras_trans[2], res, raster_res, cols)
+    n_cols = col_end - col_ini
+    n_pix = (row_end - row_ini) * n_cols
+    pts_idx = np.repeat(np.arange(lat.size), n_pix)
+    pix_off = np.arange(pts_idx.size) - np.repeat(np.cumsum(n_pix) - n_pix, n_pix)
+    pix_idx = (row_ini[pts_idx] + pix_off // n_cols[pts_idx]) * cols \
+        + col_ini[pts_idx] + pix_off % n_cols[pts_idx]
+
+    # scatter all the value columns in one pass
+    pix_idx = (pix_idx + np.arange(len(val_names))[:, np.newaxis] * rows * cols)
+    values = points_df[val_names].values.astype(float)[pts_idx, :].T
+    raster_out = np.bincount(pix_idx.ravel(), weights=values.ravel(),
+                             minlength=len(val_names) * rows * cols)
+    raster_out = raster_out.reshape(len(val_names), rows, cols)
     meta = {'crs': points_df.crs, 'height':rows, 'width':cols, 'transform': ras_trans}
     return raster_out, meta
 
+def _pixel_range(dist, res, raster_res, size):
+    """ First and last (exclusive) index of the raster pixels along one axis
+    whose center is covered by pixels of side res centered at distance dist
+    of the raster origin. Pixels not covering any raster pixel center get the
+    raster pixel containing their center.
+
+    Parameters:
+        dist (np.array): distance of the pixel centers to the raster origin
+        res (float): pixel side length
+        raster_res (float): raster pixel side length
+        size (int): number of raster pixels along the axis
+
+    Returns:
+        np.array(int), np.array(int)
+    """
+    tol = 1.0e-6
+    idx_ini = np.ceil((dist - abs(res) / 2) / raster_res - 0.5 - tol).astype(int)
+    idx_end = np.ceil((dist + abs(res) / 2) / raster_res - 0.5 - tol).astype(int)
+    no_cen = idx_end <= idx_ini
+    idx_ini[no_cen] = np.floor(dist[no_cen] / raster_res).astype(int)
+    idx_end[no_cen] = idx_ini[no_cen] + 1
+    return np.clip(idx_ini, 0, size - 1), np.clip(idx_end, 1, size)
+
 def set_df_geometry_points(df_val, scheduler=None):
-    """ Set given geometry to given dataframe using dask if scheduler
+    """ Set Points geometry to given dataframe from its latitude and longitude
+    columns. The points are built at once from the coordinate arrays.
 
     Parameters:
         df_val (DataFrame or GeoDataFrame): contains latitude and longitude columns
@@ -607,11 +1278,14 @@ def set_df_geometry_points(df_val, scheduler=None):
                 “synchronous” or “processes”
     """
     LOGGER.info('Setting geometry points.')
-    def apply_point(df_exp):
-        return df_exp.apply((lambda row: Point(row.longitude, row.latitude)), axis=1)
+    def build_points(df_exp):
+        return gpd.GeoSeries(gpd.points_from_xy(df_exp.longitude.values,
+                                                df_exp.latitude.values),
+                             index=df_exp.index)
     if not scheduler:
-        df_val['geometry'] = apply_point(df_val)
+        df_val['geometry'] = build_points(df_val)
     else:
-        ddata = dd.from_pandas(df_val, npartitions=cpu_count())
-        df_val['geometry'] = ddata.map_partitions(apply_point, meta=Point).\
+        ddata = dd.from_pandas(df_val[['latitude', 'longitude']],
+                               npartitions=cpu_count())
+        df_val['geometry'] = ddata.map_partitions(build_points, meta=Point).\
         compute(scheduler=scheduler)
@@ -0,0 +1,105 @@
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU Lesser General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Define EventIndex: hash index of event ids and names used by Hazard and Impact.
+"""
+
+__all__ = ['EventIndex']
+
+import logging
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+class EventIndex():
+    """ Lazily built hash index from event id to row position and from event
+    name to row positions. The index is built on the first lookup and rebuilt
+    whenever the indexed event_id or event_name containers are replaced or
+    change their length. Lookups by id are verified against the current
+    event_id, so in place modifications of ids are detected as well. In
+    place modifications of event names are not detected: call reset() after
+    them (Hazard.clear_cache()).
+    """
+
+    def __init__(self):
+        """ Empty initialization. """
+        self._event_id = None
+        self._id_size = -1
+        self._id_pos = dict()
+        self._event_name = None
+        self._name_size = -1
+        self._name_pos = dict()
+
+    def reset(self):
+        """ Drop the index. It is rebuilt on next lookup. """
+        self.__init__()
+
+    def get_id_pos(self, event_id, ev_id):
+        """ Get row position of an event id.
+
+        Parameters:
+            event_id (np.array): event ids of the Hazard or Impact
+            ev_id (int): id to look for
+
+        Returns:
+            int (-1 if ev_id is not in event_id)
+        """
+        pos = self._get_id_pos(event_id).get(ev_id, -1)
+        if pos < 0 or event_id[pos] != ev_id:
+            # the ids might have been modified in place
+            self._event_id = None
+            pos = self._get_id_pos(event_id).get(ev_id, -1)
+        return pos
+
+    def get_name_pos(self, event_name, ev_name):
+        """ Get row positions of all the events with the given name.
+
+        Parameters:
+            event_name (list(str)): event names of the Hazard or Impact
+            ev_name (str): name to look for
+
+        Returns:
+            np.array(int) (empty if no event has that name)
+        """
+        pos = self._get_name_pos(event_name).get(ev_name, [])
+        if not pos or any(event_name[i_pos] != ev_name for i_pos in pos):
+            self._event_name = None
+            pos = self._get_name_pos(event_name).get(ev_name, [])
+        return np.array(pos, int)
+
+    def _get_id_pos(self, event_id):
+        """ Return dictionary event id -> position, rebuilt if out of date """
+        if self._event_id is not event_id or self._id_size != len(event_id):
+            LOGGER.debug('Building event id index of %s events.', len(event_id))
+            ids = np.asarray(event_id).tolist()
+            # keep first occurrence of repeated ids
+            self._id_pos = dict(zip(reversed(ids), range(len(ids)-1, -1, -1)))
+            self._event_id = event_id
+            self._id_size = len(event_id)
+        return self._id_pos
+
+    def _get_name_pos(self, event_name):
+        """ Return dictionary event name -> positions, rebuilt if out of date """
+        if self._event_name is not event_name or self._name_size != len(event_name):
+            LOGGER.debug('Building event name index of %s events.', len(event_name))
+            self._name_pos = dict()
+            for i_pos, ev_name in enumerate(event_name):
+                self._name_pos.setdefault(ev_name, []).append(i_pos)
+            self._event_name = event_name
+            self._name_size = len(event_name)
+        return self._name_pos
@@ -29,10 +29,10 @@ import warnings
 import zipfile
 import numpy as np
 import pandas as pd
-from cartopy.io import shapereader
 
 from climada.util.files_handler import download_file
 from climada.util.constants import SYSTEM_DIR
+from climada.util.coordinates import nat_earth_layer
 
 # solve version problem in pandas-datareader-0.6.0. see:
 # https://stackoverflow.com/questions/50394873/import-pandas-datareader-gives-
@@ -74,12 +74,6 @@ FILE_GWP_WEALTH2GDP_FACTORS = 'WEALTH2GDP_factors_CRI_2016.csv'
 """ File with wealth-to-GDP factors from the
 Credit Suisse's Global Wealth Report 2017 (household wealth)"""
 
-def _nat_earth_shp(resolution='10m', category='cultural',
-                   name='admin_0_countries'):
-    shp_file = shapereader.natural_earth(resolution=resolution,
-                                         category=category, name=name)
-    return shapereader.Reader(shp_file)
-
 def net_present_value(years, disc_rates, val_years):
     """Compute net present value.
 
@@ -220,8 +214,8 @@ def nat_earth_adm0(cntry_iso, info_name, year_name=None, shp_file=None):
         year_name (str, optional): year name of the info_name in shape file,
             e.g. 'GDP_YEAR'
         shp_file (cartopy.io.shapereader.Reader, optional): shape file with
-            INCOME_GRP attribute for every country. Load Natural Earth admin0
-            if not provided.
+            INCOME_GRP attribute for every country. Use the parsed Natural
+            Earth admin0 (see coordinates.nat_earth_layer) if not provided.
 
     Returns:
         int, float
@@ -229,17 +223,22 @@ def nat_earth_adm0(cntry_iso, info_name, year_name=None, shp_file=None):
     Raises:
         ValueError
     """
-    if not shp_file:
-        shp_file = _nat_earth_shp('10m', 'cultural', 'admin_0_countries')
-
     close_val = 0
     close_year = 0
-    for info in shp_file.records():
-        if info.attributes['ADM0_A3'] == cntry_iso:
-            close_val = info.attributes[info_name]
+    if not shp_file:
+        admin0 = nat_earth_layer(10, 'cultural', 'admin_0_countries')
+        cntry_idx = admin0.query_iso(cntry_iso, fields=('ADM0_A3',))
+        if cntry_idx.size:
+            close_val = admin0.data[info_name].values[cntry_idx[0]]
             if year_name:
-                close_year = int(info.attributes[year_name])
-            break
+                close_year = int(admin0.data[year_name].values[cntry_idx[0]])
+    else:
+        for info in shp_file.records():
+            if info.attributes['ADM0_A3'] == cntry_iso:
+                close_val = info.attributes[info_name]
+                if year_name:
+                    close_year = int(info.attributes[year_name])
+                break
 
     if not close_val:
         LOGGER.error("No GDP for country %s found.", cntry_iso)
@@ -20,16 +20,29 @@ Define interpolation functions using different metrics.
 """
 
 __all__ = ['interpol_index',
+           'index_nn_grid',
+           'interpol_weights',
+           'nn_tree',
+           'assign_cache_key',
+           'get_assign_cache',
+           'set_assign_cache',
+           'clear_assign_cache',
            'dist_sqr_approx',
            'DIST_DEF',
            'METHOD']
 
+import os
 import logging
+import hashlib
+from collections import OrderedDict
 import numpy as np
 from numba import jit
+from scipy import sparse
 
+from scipy.spatial import cKDTree
 from sklearn.neighbors import BallTree
-from climada.util.constants import ONE_LAT_KM, EARTH_RADIUS_KM
+from climada.util.constants import ONE_LAT_KM, EARTH_RADIUS_KM, SYSTEM_DIR
+from climada.util.coordinates import pts_to_raster_idx
 
 LOGGER = logging.getLogger(__name__)
 
@@ -43,6 +56,18 @@ THRESHOLD = 100
 """ Distance threshold in km. Nearest neighbors with greater distances are
 not considered. """
 
+ASSIGN_CACHE_DIR = os.path.join(SYSTEM_DIR, 'assign_cache')
+""" Folder of the assignments cached on disk """
+
+ASSIGN_CACHE_MEM = 1.0e8
+""" Maximum size in bytes of the assignments cached in memory """
+
+ASSIGN_CACHE_DISK = 5.0e8
+""" Maximum size in bytes of the assignments cached on disk """
+
+_ASSIGN_CACHE = OrderedDict()
+""" Assignments cached in memory, least recently used first """
+
 @jit(nopython=True, parallel=True)
 def dist_approx(lats1, lons1, cos_lats1, lats2, lons2):
     """Compute equirectangular approximation distance in km."""
@@ -59,7 +84,7 @@ def dist_sqr_approx(lats1, lons1, cos_lats1, lats2, lons2):
     return d_lon * d_lon * cos_lats1 * cos_lats1 + d_lat * d_lat
 
 def interpol_index(centroids, coordinates, method=METHOD[0], \
-                   distance=DIST_DEF[1], threshold=THRESHOLD):
+                   distance=DIST_DEF[1], threshold=THRESHOLD, tree=None):
     """ Returns for each coordinate the centroids indexes used for
     interpolation.
 
@@ -72,6 +97,8 @@ def interpol_index(centroids, coordinates, method=METHOD[0], \
         distance (str, optional): distance to use. Haversine default
         threshold (float): distance threshold in km over which no neighbor will
             be found. Those are assigned with a -1 index
+        tree (optional): spatial index of the centroids for the distance, as
+            returned by nn_tree. Built if not provided
 
     Returns:
         numpy array with so many rows as coordinates containing the
@@ -79,27 +106,100 @@ def interpol_index(centroids, coordinates, method=METHOD[0], \
     """
     if (method == METHOD[0]) & (distance == DIST_DEF[0]):
         # Compute for each coordinate the closest centroid
-        interp = index_nn_aprox(centroids, coordinates, threshold)
+        interp = index_nn_aprox(centroids, coordinates, threshold, tree)
     elif (method == METHOD[0]) & (distance == DIST_DEF[1]):
         # Compute the nearest centroid for each coordinate using the
         # haversine formula. This is done with a Ball tree.
-        interp = index_nn_haversine(centroids, coordinates, threshold)
+        interp = index_nn_haversine(centroids, coordinates, threshold, tree)
     else:
         LOGGER.error('Interpolation using %s with distance %s is not '\
                      'supported.', method, distance)
         interp = np.array([])
     return interp
 
-def index_nn_aprox(centroids, coordinates, threshold=THRESHOLD):
-    """ Compute the nearest centroid for each coordinate using the
-    euclidian distance d = ((dlon)cos(lat))^2+(dlat)^2. For distant points
-    (e.g. more than 100km apart) use the haversine distance.
+def interpol_weights(centroids, coordinates, k=4, distance=DIST_DEF[1],
+                     threshold=THRESHOLD, power=2, tree=None):
+    """ Compute for each coordinate the inverse distance weights of its k
+    nearest centroids, with one query of the centroids' tree. Centroids
+    farther than threshold get no weight. A coordinate placed on a centroid
+    gets all the weight from it.
 
     Parameters:
         centroids (2d array): First column contains latitude, second
             column contains longitude. Each row is a geographic point
         coordinates (2d array): First column contains latitude, second
             column contains longitude. Each row is a geographic point
+        k (int, optional): number of nearest centroids. Default: 4
+        distance (str, optional): distance to use. Haversine default
+        threshold (float): distance threshold in km over which centroids get
+            no weight
+        power (float, optional): power of the inverse distance. Default: 2
+        tree (optional): spatial index of the centroids for the distance, as
+            returned by nn_tree. Built if not provided
+
+    Returns:
+        sparse.csr_matrix (coordinates x centroids) with rows summing 1, or
+        empty for coordinates without centroids closer than threshold
+
+    Raises:
+        ValueError
+    """
+    if distance not in DIST_DEF:
+        LOGGER.error('Interpolation using distance %s is not supported.', distance)
+        raise ValueError
+    if tree is None:
+        tree = nn_tree(centroids, distance)
+    k = min(k, centroids.shape[0])
+    # Select unique coordinates
+    _, idx, inv = np.unique(coordinates, axis=0, return_index=True,
+                            return_inverse=True)
+    if distance == DIST_DEF[0]:
+        dist, neigh = tree.query(_unit_vectors(coordinates[idx]), k=k)
+        dist = 2 * np.arcsin(np.clip(dist / 2, 0, 1))
+    else:
+        dist, neigh = tree.query(np.radians(coordinates[idx]), k=k)
+    dist = dist.reshape(-1, k) * EARTH_RADIUS_KM
+    neigh = neigh.reshape(-1, k)
+
+    weights = np.zeros(dist.shape)
+    np.power(dist, -float(power), out=weights, where=dist > 0)
+    weights[dist > threshold] = 0
+    on_centr = np.any(dist == 0, axis=1)
+    weights[on_centr] = dist[on_centr] == 0
+    sum_weights = weights.sum(axis=1, keepdims=True)
+    np.divide(weights, sum_weights, out=weights, where=sum_weights > 0)
+
+    num_warn = np.sum(sum_weights[inv] == 0)
+    if num_warn:
+        LOGGER.warning('Distance to closest centroid is greater than %s' \
+            'km for %s coordinates.', threshold, num_warn)
+
+    # Copy result to all coordinates
+    weights = sparse.csr_matrix((weights[inv].ravel(), neigh[inv].ravel(),
+                                 np.arange(0, inv.size * k + 1, k)),
+                                shape=(coordinates.shape[0], centroids.shape[0]))
+    weights.eliminate_zeros()
+    weights.sort_indices()
+    return weights
+
+def index_nn_grid(centroids, coordinates, grid_meta, grid_centr,
+                  distance=DIST_DEF[1], threshold=THRESHOLD):
+    """ Compute the nearest centroid for each coordinate when the centroids
+    are the centers of a regular grid: the nearest centroid is the one of the
+    grid cell containing the coordinate. Coordinates outside the grid, or in
+    cells without centroid, use the nearest neighbor of the given distance
+    among the centroids of the grid border.
+
+    Parameters:
+        centroids (2d array): First column contains latitude, second
+            column contains longitude. Each row is a geographic point
+        coordinates (2d array): First column contains latitude, second
+            column contains longitude. Each row is a geographic point
+        grid_meta (dict): transform, width and height of the grid
+        grid_centr (np.array): position in centroids of every grid cell
+            (row-major), -1 for cells without centroid
+        distance (str, optional): distance used outside the grid. Haversine
+            default
         threshold (float): distance threshold in km over which no neighbor will
             be found. Those are assigned with a -1 index
 
@@ -107,36 +207,79 @@ def index_nn_aprox(centroids, coordinates, threshold=THRESHOLD):
         array with so many rows as coordinates containing the centroids
             indexes
     """
+    assigned = pts_to_raster_idx(coordinates[:, 0], coordinates[:, 1],
+                                 grid_meta['transform'], grid_meta['width'],
+                                 grid_meta['height'])
+    out_grid = assigned < 0
+    assigned[~out_grid] = grid_centr[assigned[~out_grid]]
+    in_grid = assigned >= 0
+    # great circle distance from the chord between unit vectors
+    chord = np.linalg.norm(_unit_vectors(coordinates[in_grid]) - \
+                           _unit_vectors(centroids[assigned[in_grid]]), axis=1)
+    far_cen = 2 * np.arcsin(np.clip(chord / 2, 0, 1)) * EARTH_RADIUS_KM > threshold
+    if np.any(far_cen):
+        LOGGER.warning('Distance to closest centroid is greater than %s' \
+            'km for %s coordinates.', threshold, np.sum(far_cen))
+        assigned[np.flatnonzero(in_grid)[far_cen]] = -1
+    if np.any(out_grid):
+        # the closest centroid of a point out of the grid is on its border
+        border = np.ones((grid_meta['height'], grid_meta['width']), bool)
+        border[1:-1, 1:-1] = False
+        border = grid_centr[border.ravel()]
+        border = border[border >= 0]
+        out_assigned = interpol_index(centroids[border], coordinates[out_grid],
+                                      METHOD[0], distance, threshold)
+        out_assigned[out_assigned >= 0] = border[out_assigned[out_assigned >= 0]]
+        assigned[out_grid] = out_assigned
+    empty_cell = np.logical_not(out_grid | in_grid)
+    if np.any(empty_cell):
+        assigned[empty_cell] = interpol_index(centroids, coordinates[empty_cell],
+                                              METHOD[0], distance, threshold)
+    return assigned
+
+def index_nn_aprox(centroids, coordinates, threshold=THRESHOLD, tree=None):
+    """ Compute the nearest centroid for each coordinate using a KD-tree of
+    the points as 3D unit vectors. The euclidian (chord) distance between
+    unit vectors increases with the great circle distance, so that the nearest
+    neighbor is exact and longitudes across the anti-meridian are close.
+
+    Parameters:
+        centroids (2d array): First column contains latitude, second
+            column contains longitude. Each row is a geographic point
+        coordinates (2d array): First column contains latitude, second
+            column contains longitude. Each row is a geographic point
+        threshold (float): distance threshold in km over which no neighbor will
+            be found. Those are assigned with a -1 index
+        tree (cKDTree, optional): tree of the centroids as returned by nn_tree
 
-    # Compute only for the unique coordinates. Copy the results for the
-    # not unique coordinates
+    Returns:
+        array with so many rows as coordinates containing the centroids
+            indexes
+    """
+    # Construct tree from centroids
+    if tree is None:
+        tree = nn_tree(centroids, DIST_DEF[0])
+    # Select unique exposures coordinates
     _, idx, inv = np.unique(coordinates, axis=0, return_index=True,
                             return_inverse=True)
-    # Compute cos(lat) for all centroids
-    centr_cos_lat = np.cos(np.radians(centroids[:, 0]))
-    assigned = np.zeros(coordinates.shape[0], int)
-    num_warn = 0
-    for icoord, iidx in enumerate(idx):
-        dist = dist_sqr_approx(centroids[:, 0], centroids[:, 1],
-                               centr_cos_lat, coordinates[iidx, 0],
-                               coordinates[iidx, 1])
-        min_idx = dist.argmin()
-        # Raise a warning if the minimum distance is greater than the
-        # threshold and set an unvalid index -1
-        if np.sqrt(dist.min()) * ONE_LAT_KM > threshold:
-            num_warn += 1
-            min_idx = -1
-
-        # Assign found centroid index to all the same coordinates
-        assigned[inv == icoord] = min_idx
 
+    # chord length of the threshold distance on the unit sphere
+    thres_chord = 2 * np.sin(min(threshold / EARTH_RADIUS_KM, np.pi) / 2)
+    _, assigned = tree.query(_unit_vectors(coordinates[idx]), k=1,
+                             distance_upper_bound=np.nextafter(thres_chord, np.inf))
+
+    # Raise a warning if the minimum distance is greater than the
+    # threshold and set an unvalid index -1
+    num_warn = np.sum(assigned == tree.n)
     if num_warn:
         LOGGER.warning('Distance to closest centroid is greater than %s' \
             'km for %s coordinates.', threshold, num_warn)
+        assigned[assigned == tree.n] = -1
 
-    return assigned
+    # Copy result to all exposures and return value
+    return assigned[inv]
 
-def index_nn_haversine(centroids, coordinates, threshold=THRESHOLD):
+def index_nn_haversine(centroids, coordinates, threshold=THRESHOLD, tree=None):
     """ Compute the neareast centroid for each coordinate using a Ball
     tree with haversine distance.
 
@@ -147,13 +290,15 @@ def index_nn_haversine(centroids, coordinates, threshold=THRESHOLD):
             column contains longitude. Each row is a geographic point
         threshold (float): distance threshold in km over which no neighbor will
             be found. Those are assigned with a -1 index
+        tree (BallTree, optional): tree of the centroids as returned by nn_tree
 
     Returns:
         array with so many rows as coordinates containing the centroids
             indexes
     """
     # Construct tree from centroids
-    tree = BallTree(np.radians(centroids), metric='haversine')
+    if tree is None:
+        tree = nn_tree(centroids, DIST_DEF[1])
     # Select unique exposures coordinates
     _, idx, inv = np.unique(coordinates, axis=0, return_index=True,
                             return_inverse=True)
@@ -173,3 +318,124 @@ def index_nn_haversine(centroids, coordinates, threshold=THRESHOLD):
 
     # Copy result to all exposures and return value
     return np.squeeze(assigned[inv])
+
+def _unit_vectors(coord):
+    """ Cartesian coordinates on the unit sphere of lat/lon points (2d array
+    with latitude in the first column and longitude in the second). """
+    lat, lon = np.radians(coord[:, 0]), np.radians(coord[:, 1])
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=1)
+
+def nn_tree(centroids, distance=DIST_DEF[1]):
+    """ Build the spatial index of the centroids used in the nearest neighbor
+    search of the given distance: a KD-tree of unit vectors for approx and a
+    Ball tree for haversine.
+
+    Parameters:
+        centroids (2d array): First column contains latitude, second
+            column contains longitude. Each row is a geographic point
+        distance (str, optional): distance to use. Haversine default
+
+    Returns:
+        cKDTree or BallTree
+    """
+    if distance == DIST_DEF[0]:
+        return cKDTree(_unit_vectors(centroids))
+    return BallTree(np.radians(centroids), metric='haversine')
+
+def assign_cache_key(coordinates, centroids, *params):
+    """ Hash of the coordinates, of the centroids and of the assignment
+    parameters, used as key of the assignment cache.
+
+    Parameters:
+        coordinates (2d array): First column contains latitude, second
+            column contains longitude. Each row is a geographic point
+        centroids (2d array): First column contains latitude, second
+            column contains longitude. Each row is a geographic point
+        params: parameters of the assignment (method, distance, ...)
+
+    Returns:
+        str
+    """
+    coord_hash = hashlib.sha1((repr(params) + str(coordinates.shape) + \
+                               str(centroids.shape)).encode())
+    coord_hash.update(np.ascontiguousarray(coordinates, float).tobytes())
+    coord_hash.update(np.ascontiguousarray(centroids, float).tobytes())
+    return coord_hash.hexdigest()
+
+def get_assign_cache(key, disk=False):
+    """ Get an assignment from the memory cache or, if not there and disk is
+    True, from the disk cache.
+
+    Parameters:
+        key (str): key returned by assign_cache_key
+        disk (bool, optional): look as well in the disk cache. Default: False
+
+    Returns:
+        np.array (None if not cached)
+    """
+    if key in _ASSIGN_CACHE:
+        _ASSIGN_CACHE.move_to_end(key)
+        return _ASSIGN_CACHE[key].copy()
+    if not disk:
+        return None
+    file_name = os.path.join(ASSIGN_CACHE_DIR, key + '.npy')
+    try:
+        assigned = np.load(file_name)
+        os.utime(file_name)
+    except (OSError, ValueError):
+        return None
+    LOGGER.debug('Assignment read from %s.', file_name)
+    _set_mem_cache(key, assigned)
+    return assigned.copy()
+
+def set_assign_cache(key, assigned, disk=False):
+    """ Store an assignment in the memory cache and, if disk is True, in the
+    disk cache. The least recently used assignments are evicted when the
+    caches exceed ASSIGN_CACHE_MEM and ASSIGN_CACHE_DISK bytes.
+
+    Parameters:
+        key (str): key returned by assign_cache_key
+        assigned (np.array): centroids indexes of the coordinates
+        disk (bool, optional): store as well in the disk cache. Default: False
+    """
+    _set_mem_cache(key, np.array(assigned))
+    if not disk:
+        return
+    try:
+        os.makedirs(ASSIGN_CACHE_DIR, exist_ok=True)
+        file_name = os.path.join(ASSIGN_CACHE_DIR, key + '.npy')
+        tmp_name = os.path.join(ASSIGN_CACHE_DIR, key + '.tmp.npy')
+        np.save(tmp_name, _ASSIGN_CACHE[key])
+        os.replace(tmp_name, file_name)
+        cache_files = [os.path.join(ASSIGN_CACHE_DIR, name) for name in \
+                       os.listdir(ASSIGN_CACHE_DIR) if not name.endswith('.tmp.npy')]
+        cache_files.sort(key=os.path.getmtime)
+        cache_size = sum(map(os.path.getsize, cache_files))
+        while cache_size > ASSIGN_CACHE_DISK and len(cache_files) > 1:
+            cache_size -= os.path.getsize(cache_files[0])
+            os.remove(cache_files.pop(0))
+    except OSError as err:
+        LOGGER.warning('Assignment not cached on disk: %s', str(err))
+
+def clear_assign_cache(disk=False):
+    """ Empty the memory cache of assignments and, optionally, the disk cache.
+
+    Parameters:
+        disk (bool, optional): remove as well the files cached on disk.
+            Default: False
+    """
+    _ASSIGN_CACHE.clear()
+    if disk and os.path.isdir(ASSIGN_CACHE_DIR):
+        for name in os.listdir(ASSIGN_CACHE_DIR):
+            if name.endswith('.npy'):
+                os.remove(os.path.join(ASSIGN_CACHE_DIR, name))
+
+def _set_mem_cache(key, assigned):
+    """ Store an assignment in the memory cache, evicting the least recently
+    used ones. """
+    _ASSIGN_CACHE[key] = assigned
+    _ASSIGN_CACHE.move_to_end(key)
+    cache_size = sum(val.nbytes for val in _ASSIGN_CACHE.values())
+    while cache_size > ASSIGN_CACHE_MEM and len(_ASSIGN_CACHE) > 1:
+        cache_size -= _ASSIGN_CACHE.popitem(last=False)[1].nbytes
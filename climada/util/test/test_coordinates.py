@@ -19,6 +19,9 @@ with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
 Test coordinates module.
 """
 
+import os
+import shutil
+import tempfile
 from cartopy.io import shapereader
 from fiona.crs import from_epsg
 import geopandas as gpd
@@ -26,17 +29,22 @@ import unittest
 import numpy as np
 import shapely
 import geopandas
-from shapely.geometry import box
+from shapely.geometry import box, Point
 from rasterio.windows import Window
 from rasterio.warp import Resampling
 from rasterio import Affine
+import rasterio
+from scipy import sparse
 
 from climada.util.constants import HAZ_DEMO_FL, DEF_CRS
+from climada.util.config import CONFIG
 from climada.util.coordinates import grid_is_regular, get_coastlines, \
 get_land_geometry, nat_earth_resolution, coord_on_land, dist_to_coast, \
 get_country_geometries, get_resolution, pts_to_raster_meta, read_vector, \
 read_raster, NE_EPSG, equal_crs, set_df_geometry_points, points_to_raster, \
-get_country_code, convert_wgs_to_utm, DEM_NODATA
+get_country_code, convert_wgs_to_utm, DEM_NODATA, pts_to_raster_idx, read_raster_sparse, \
+pts_to_boxes, NatEarthLayer, read_raster_blocks, write_raster, \
+dist_to_coast_raster
 
 class TestFunc(unittest.TestCase):
     '''Test the auxiliary used with plot functions'''
@@ -179,6 +187,7 @@ class TestFunc(unittest.TestCase):
         self.assertTrue(res[0])
         self.assertFalse(res[1])
         self.assertTrue(res[2])
+        self.assertTrue(np.array_equal(coord_on_land(lat, lon, precomputed=True), res))
 
     def test_dist_to_coast(self):
         """ Test point in coast and point not in coast """
@@ -188,6 +197,21 @@ class TestFunc(unittest.TestCase):
         res = dist_to_coast(-12.497529, -58.849505)
         self.assertAlmostEqual(1382985.2459744606, res[0])
 
+    def test_dist_to_coast_raster_pass(self):
+        """ Test bilinear interpolation in distance to coast raster """
+        tmp_dir = tempfile.mkdtemp()
+        file_name = os.path.join(tmp_dir, 'test_dist_coast.tif')
+        dist = np.add.outer(np.arange(18)*100, np.arange(36)).astype(np.float32)
+        with rasterio.open(file_name, 'w', driver='GTiff', dtype=rasterio.float32,
+                           count=1, width=36, height=18, crs=DEF_CRS,
+                           transform=Affine(10, 0, -180, 0, -10, 90)) as dst:
+            dst.write(dist, 1)
+        res = dist_to_coast_raster(np.array([85., 80., 0., 80.]),
+                                   np.array([-175., -170., 5., 180.]),
+                                   file_name=file_name)
+        shutil.rmtree(tmp_dir)
+        self.assertTrue(np.allclose(res, [0, 50.5, 868, 67.5]))
+
     def test_get_country_geometries_country_pass(self):
         """ get_country_geometries with selected countries. issues with the
         natural earth data should be caught by test_get_land_geometry_* since
@@ -287,6 +311,14 @@ class TestFunc(unittest.TestCase):
         self.assertTrue(ymin >= ymax + res/2 - rows*res)
         self.assertTrue(xmax <= xmin - res/2 + cols*res)
 
+    def test_pts_to_raster_idx_pass(self):
+        """ Test pts_to_raster_idx """
+        lon = np.array([-60, -59.5, -50, -55, -70])
+        lat = np.array([10, 10, -5, 0, 0])
+        rows, cols, ras_trans = pts_to_raster_meta((-60, -5, -50, 10), 0.5)
+        pix_idx = pts_to_raster_idx(lat, lon, ras_trans, cols, rows)
+        self.assertEqual(pix_idx.tolist(), [0, 1, rows*cols - 1, 20*cols + 10, -1])
+
     def test_read_vector_pass(self):
         """ Test one columns data """
         shp_file = shapereader.natural_earth(resolution='110m', \
@@ -324,6 +356,75 @@ class TestFunc(unittest.TestCase):
         self.assertEqual(inten_ras.shape, (1, 60*50))
         self.assertAlmostEqual(inten_ras.reshape((60, 50))[25, 12], 0.056825936)
 
+    def test_read_raster_sparse_pass(self):
+        """ Test read_raster_sparse against read_raster """
+        win = Window(10, 20, 50, 60)
+        meta, inten_ras = read_raster(HAZ_DEMO_FL, window=win)
+        max_size = CONFIG['global']['max_matrix_size']
+        CONFIG['global']['max_matrix_size'] = 7*50
+        meta_sp, inten_sp = read_raster_sparse(HAZ_DEMO_FL, window=win)
+        CONFIG['global']['max_matrix_size'] = max_size
+        self.assertEqual(meta_sp['transform'], meta['transform'])
+        self.assertEqual(meta_sp['height'], 60)
+        self.assertEqual(meta_sp['width'], 50)
+        self.assertEqual(inten_sp.shape, (1, 60*50))
+        self.assertEqual(inten_sp.nnz, np.count_nonzero(inten_ras))
+        self.assertTrue(np.allclose(inten_sp.toarray(), inten_ras))
+
+        _, inten_sp = read_raster_sparse(HAZ_DEMO_FL, threshold=0.1)
+        self.assertTrue(np.all(inten_sp.data >= 0.1))
+
+    def test_read_raster_sparse_reproj_pass(self):
+        """ Test read_raster_sparse reprojecting strips against read_raster """
+        meta, inten_ras = read_raster(HAZ_DEMO_FL, dst_crs={'init':'epsg:2202'},
+                                      resampling=Resampling.bilinear)
+        max_size = CONFIG['global']['max_matrix_size']
+        CONFIG['global']['max_matrix_size'] = 50*968
+        meta_sp, inten_sp = read_raster_sparse(HAZ_DEMO_FL, dst_crs={'init':'epsg:2202'},
+                                               resampling=Resampling.bilinear)
+        _, inten_th = read_raster_sparse(HAZ_DEMO_FL, dst_crs={'init':'epsg:2202'},
+                                         resampling=Resampling.bilinear, threads=3)
+        CONFIG['global']['max_matrix_size'] = max_size
+        self.assertEqual(meta_sp['transform'], meta['transform'])
+        self.assertEqual(meta_sp['height'], 1081)
+        self.assertEqual(meta_sp['width'], 968)
+        self.assertEqual(inten_sp.shape, (1, 1081*968))
+        self.assertEqual(inten_sp.nnz, np.count_nonzero(inten_ras))
+        self.assertTrue(np.allclose(inten_sp.toarray(), inten_ras))
+        self.assertTrue(np.array_equal(inten_th.toarray(), inten_sp.toarray()))
+
+    def test_read_raster_sparse_poly_pass(self):
+        """ Test read_raster_sparse with geometry against read_raster """
+        poly = shapely.geometry.Polygon([(-69.2471495969998, 9.708220966978912),
+                                         (-68.79714959699979, 9.708220966978912),
+                                         (-69.2471495969998, 10.248220966978932)])
+        meta, inten_ras = read_raster(HAZ_DEMO_FL, geometry=[poly])
+        max_size = CONFIG['global']['max_matrix_size']
+        CONFIG['global']['max_matrix_size'] = 7*50
+        meta_sp, inten_sp = read_raster_sparse(HAZ_DEMO_FL, geometry=[poly])
+        CONFIG['global']['max_matrix_size'] = max_size
+        self.assertEqual(meta_sp['transform'], meta['transform'])
+        self.assertEqual(meta_sp['height'], meta['height'])
+        self.assertEqual(meta_sp['width'], meta['width'])
+        self.assertEqual(inten_sp.nnz, np.count_nonzero(inten_ras))
+        self.assertTrue(np.allclose(inten_sp.toarray(), inten_ras))
+
+    def test_read_raster_blocks_pass(self):
+        """ Test read_raster_blocks strips """
+        win = Window(10, 20, 50, 60)
+        meta, inten_ras = read_raster(HAZ_DEMO_FL, window=win)
+        max_size = CONFIG['global']['max_matrix_size']
+        CONFIG['global']['max_matrix_size'] = 7*50
+        meta_bl, strips = read_raster_blocks(HAZ_DEMO_FL, window=win)
+        strips = list(strips)
+        CONFIG['global']['max_matrix_size'] = max_size
+        self.assertEqual(meta_bl['transform'], meta['transform'])
+        self.assertEqual([row_off for row_off, _ in strips], list(range(0, 60, 7)))
+        self.assertEqual(strips[0][1].shape, (1, 7, 50))
+        self.assertEqual(strips[-1][1].shape, (1, 4, 50))
+        inten_bl = np.concatenate([strip.filled(0) for _, strip in strips], axis=1)
+        self.assertTrue(np.allclose(inten_bl.reshape(1, -1), inten_ras))
+
     def test_poly_raster_pass(self):
         """ Test geometry """
         poly = box(-69.2471495969998, 9.708220966978912, -68.79714959699979, 10.248220966978932)
@@ -378,6 +479,38 @@ class TestFunc(unittest.TestCase):
         meta, inten_all = read_raster(HAZ_DEMO_FL, window=Window(0, 0, 501, 500))
         self.assertTrue(np.array_equal(inten_all, inten_ras))
 
+    def test_write_raster_pass(self):
+        """ Test write_raster from sparse bands and with one band """
+        meta, inten = read_raster_sparse(HAZ_DEMO_FL)
+        inten = sparse.vstack([inten, inten * 2, inten * 3], format='csr')
+        tmp_dir = tempfile.mkdtemp()
+        file_name = os.path.join(tmp_dir, 'test_write_raster.tif')
+        max_size = CONFIG['global']['max_matrix_size']
+        CONFIG['global']['max_matrix_size'] = 2 * meta['height'] * meta['width']
+        write_raster(file_name, inten, meta, nodata=-1)
+        CONFIG['global']['max_matrix_size'] = max_size
+        with rasterio.open(file_name) as src:
+            self.assertEqual(src.count, 3)
+            self.assertEqual(src.block_shapes[0], (256, 256))
+            self.assertEqual(src.profile['compress'], 'deflate')
+            self.assertEqual(src.profile['interleave'], 'band')
+            self.assertEqual(src.nodata, -1)
+            self.assertEqual(src.overviews(1), [2, 4])
+            self.assertEqual(src.transform, meta['transform'])
+        _, inten_read = read_raster_sparse(file_name, band=[1, 2, 3])
+        self.assertTrue(np.allclose(inten_read.toarray(), inten.toarray()))
+
+        write_raster(file_name, inten[1].toarray().reshape(meta['height'], meta['width']),
+                     meta, compress=None, tiled=False, overviews=False)
+        with rasterio.open(file_name) as src:
+            self.assertEqual(src.count, 1)
+            self.assertFalse(src.profile['tiled'])
+            self.assertNotIn('compress', src.profile)
+            self.assertEqual(src.overviews(1), [])
+        _, inten_read = read_raster_sparse(file_name)
+        self.assertTrue(np.allclose(inten_read.toarray(), inten[1].toarray()))
+        shutil.rmtree(tmp_dir)
+
     def test_compare_crs(self):
         """ Compare two crs """
         crs_one = {'init':'epsg:4326'}
@@ -394,6 +527,17 @@ class TestFunc(unittest.TestCase):
         self.assertTrue(np.allclose(df_val.geometry[:].x.values, np.ones(10)*0.5))
         self.assertTrue(np.allclose(df_val.geometry[:].y.values, np.ones(10)*40.))
 
+    def test_pts_to_boxes_pass(self):
+        """ Test pts_to_boxes """
+        lat = np.array([40.0, 41.0, 42.5])
+        lon = np.array([0.5, -1.0, 3.0])
+        boxes = pts_to_boxes(lat, lon, 0.5)
+        self.assertEqual(boxes.size, 3)
+        for i_box, pix in enumerate(boxes):
+            self.assertEqual(pix.bounds, (lon[i_box]-0.25, lat[i_box]-0.25,
+                                          lon[i_box]+0.25, lat[i_box]+0.25))
+            self.assertTrue(pix.equals(Point(lon[i_box], lat[i_box]).buffer(0.25).envelope))
+
     def test_points_to_raster_pass(self):
         """ Test points_to_raster """
         df_val = gpd.GeoDataFrame(crs={'init':'epsg:2202'})
@@ -411,6 +555,40 @@ class TestFunc(unittest.TestCase):
         self.assertAlmostEqual(meta['transform'][5], 50.25)
         self.assertEqual(meta['height'], 21)
         self.assertEqual(meta['width'], 5)
+        self.assertEqual(raster.shape, (1, 21, 5))
+        self.assertEqual(np.count_nonzero(raster), 50)
+        self.assertAlmostEqual(raster.sum(), 500)
+
+    def test_points_to_raster_res_pass(self):
+        """ Test points_to_raster values with several resolutions and columns """
+        df_val = gpd.GeoDataFrame(crs={'init':'epsg:4326'})
+        x, y = np.meshgrid(np.arange(4) * 0.5, 40 + np.arange(2) * 0.5)
+        df_val['latitude'] = y.flatten()
+        df_val['longitude'] = x.flatten()
+        df_val['value'] = np.arange(8, dtype=float)
+        df_val['value_2'] = np.ones(8)
+        raster, meta = points_to_raster(df_val, val_names=['value', 'value_2'])
+        self.assertEqual(raster.shape, (2, 2, 4))
+        self.assertTrue(np.allclose(raster[0], [[4, 5, 6, 7], [0, 1, 2, 3]]))
+        self.assertTrue(np.allclose(raster[1], np.ones((2, 4))))
+
+        # coarser raster accumulates the values
+        raster, meta = points_to_raster(df_val, val_names=['value', 'value_2'],
+                                        raster_res=1.0)
+        self.assertEqual(raster.shape, (2, 1, 2))
+        self.assertAlmostEqual(meta['transform'][2], -0.5)
+        self.assertAlmostEqual(meta['transform'][5], 41)
+        self.assertTrue(np.allclose(raster[0], [[0 + 4, 1 + 2 + 5 + 6 + 3 + 7]]))
+        self.assertTrue(np.allclose(raster[1], [[2, 6]]))
+
+        # finer raster repeats the values in every covered pixel
+        raster, meta = points_to_raster(df_val, val_names=['value', 'value_2'],
+                                        raster_res=0.25)
+        self.assertEqual(raster.shape, (2, 3, 7))
+        self.assertEqual(np.count_nonzero(raster[1]), 21)
+        self.assertTrue(np.allclose(raster[1], np.ones((3, 7))))
+        self.assertTrue(np.allclose(raster[0, 0, ::2], [4, 5, 6, 7]))
+        self.assertTrue(np.allclose(raster[0, 2, ::2], [0, 1, 2, 3]))
 
     def test_country_code_pass(self):
         """ Test set_region_id """
@@ -424,6 +602,11 @@ class TestFunc(unittest.TestCase):
         self.assertTrue(np.allclose(region_id[:6], np.ones(6)*52)) # 052 for barbados
         self.assertEqual(region_id_OSLO, np.array(578)) # 578 for Norway
 
+        self.assertTrue(np.array_equal(get_country_code(lat, lon, precomputed=True),
+                                       region_id))
+        self.assertEqual(get_country_code([59.91], [10.75], precomputed=True),
+                         np.array(578))
+
     def test_convert_wgs_to_utm_pass(self):
         """ Test convert_wgs_to_utm """
         lat, lon = 17.346597, -62.768669
@@ -434,8 +617,55 @@ class TestFunc(unittest.TestCase):
         epsg = convert_wgs_to_utm(lon, lat)
         self.assertEqual(epsg, 32631)
 
+class TestNatEarthLayer(unittest.TestCase):
+    """ Test NatEarthLayer on a shapefile with Natural Earth attributes """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.shp_file = os.path.join(self.tmp_dir, 'admin0.shp')
+        self.cache_file = os.path.join(self.tmp_dir, 'cache', 'admin0.pkl')
+        admin0 = gpd.GeoDataFrame({'ISO_A3': ['AAA', '-99', 'CCC'],
+                                   'WB_A3': ['AAA', 'BBW', 'CCC'],
+                                   'ADM0_A3': ['AAA', 'BBB', 'CCC'],
+                                   'ISO_N3': ['001', '-99', '-99'],
+                                   'NAME': ['A', 'B', 'Switzerland']},
+                                  geometry=[box(0, 0, 1, 1), box(2, 0, 3, 1),
+                                            box(0, 2, 1, 3)])
+        admin0.to_file(self.shp_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_read_cache_pass(self):
+        """ Test layer is parsed, cached and loaded from cache """
+        layer = NatEarthLayer(self.shp_file, self.cache_file)
+        self.assertTrue(os.path.isfile(self.cache_file))
+        self.assertEqual(layer.data.ISO_A3.tolist(), ['AAA', 'BBB', 'CCC'])
+        self.assertEqual(layer.data.ISO_N3.tolist(), ['001', '-99', '756'])
+        self.assertIsNotNone(layer.data.crs)
+
+        with self.assertLogs('climada.util.coordinates', level='INFO') as cm:
+            NatEarthLayer(self.shp_file)
+            layer_cache = NatEarthLayer(self.shp_file, self.cache_file)
+        self.assertEqual(len(cm.output), 1)
+        self.assertTrue(layer_cache.data.equals(layer.data))
+
+    def test_query_pass(self):
+        """ Test bounds and codes queries and prepared geometries """
+        layer = NatEarthLayer(self.shp_file)
+        self.assertTrue(np.array_equal(layer.query_bounds((0.5, 0.5, 2.5, 0.6)),
+                                       [0, 1]))
+        self.assertEqual(layer.query_bounds((10, 10, 11, 11)).size, 0)
+        self.assertTrue(np.array_equal(layer.query_iso('BBW'), [1]))
+        self.assertTrue(np.array_equal(layer.query_iso(['CCC', 'AAA']), [0, 2]))
+        self.assertEqual(layer.query_iso('BBW', fields=('ADM0_A3',)).size, 0)
+        self.assertTrue(layer.prepared(2).contains(Point(0.5, 2.5)))
+        self.assertFalse(layer.prepared(2).contains(Point(0.5, 0.5)))
+        self.assertIs(layer.prepared(2), layer.prepared(2))
+
 
 # Execute Tests
 if __name__ == "__main__":
     TESTS = unittest.TestLoader().loadTestsFromTestCase(TestFunc)
+    TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestNatEarthLayer))
     unittest.TextTestRunner(verbosity=2).run(TESTS)
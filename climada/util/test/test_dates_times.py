@@ -73,6 +73,14 @@ class TestDateNumpy(unittest.TestCase):
         self.assertEqual(u_dt.first_year(ordinal_date), 1918)
         self.assertEqual(u_dt.first_year(np.array(ordinal_date)), 1918)
 
+    def test_ordinal_to_year_pass(self):
+        """ Test ordinal_to_year """
+        ordinal_date = [dt.datetime.toordinal(dt.datetime(2018, 4, 6)),
+                        dt.datetime.toordinal(dt.datetime(1918, 12, 31)),
+                        dt.datetime.toordinal(dt.datetime(2019, 1, 1)), 1]
+        self.assertEqual(u_dt.ordinal_to_year(ordinal_date).tolist(),
+                         [2018, 1918, 2019, 1])
+
 # Execute Tests
 TESTS = unittest.TestLoader().loadTestsFromTestCase(TestDateString)
 TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestDateNumpy))
@@ -0,0 +1,66 @@
+"""
+This file is part of CLIMADA.
+
+Copyright (C) 2017 ETH Zurich, CLIMADA contributors listed in AUTHORS.
+
+CLIMADA is free software: you can redistribute it and/or modify it under the
+terms of the GNU Lesser General Public License as published by the Free
+Software Foundation, version 3.
+
+CLIMADA is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
+
+---
+
+Test EventIndex.
+"""
+
+import unittest
+import numpy as np
+
+from climada.util.event_index import EventIndex
+
+class TestEventIndex(unittest.TestCase):
+    """ Test lookups and invalidation of EventIndex """
+
+    def test_id_pos_pass(self):
+        """ Test get_id_pos """
+        ev_index = EventIndex()
+        event_id = np.array([10, 3, 7, 12])
+        self.assertEqual(ev_index.get_id_pos(event_id, 7), 2)
+        self.assertEqual(ev_index.get_id_pos(event_id, 5), -1)
+
+    def test_name_pos_pass(self):
+        """ Test get_name_pos with repeated names """
+        ev_index = EventIndex()
+        event_name = ['A', 'B', 'A', 'C']
+        self.assertTrue(np.array_equal(ev_index.get_name_pos(event_name, 'A'),
+                                       np.array([0, 2])))
+        self.assertEqual(ev_index.get_name_pos(event_name, 'D').size, 0)
+
+    def test_rebuild_pass(self):
+        """ Index follows replaced and in place modified containers """
+        ev_index = EventIndex()
+        event_id = np.array([1, 2, 3])
+        self.assertEqual(ev_index.get_id_pos(event_id, 3), 2)
+        event_id[2] = 8
+        self.assertEqual(ev_index.get_id_pos(event_id, 8), 2)
+        self.assertEqual(ev_index.get_id_pos(event_id, 3), -1)
+        self.assertEqual(ev_index.get_id_pos(np.array([3, 1]), 3), 0)
+
+        event_name = ['A', 'B']
+        self.assertEqual(ev_index.get_name_pos(event_name, 'B').tolist(), [1])
+        event_name.append('B')
+        self.assertEqual(ev_index.get_name_pos(event_name, 'B').tolist(), [1, 2])
+        event_name[0] = 'C'
+        self.assertEqual(ev_index.get_name_pos(event_name, 'C').tolist(), [0])
+        self.assertEqual(ev_index.get_name_pos(event_name, 'A').size, 0)
+
+# Execute Tests
+if __name__ == "__main__":
+    TESTS = unittest.TestLoader().loadTestsFromTestCase(TestEventIndex)
+    unittest.TextTestRunner(verbosity=2).run(TESTS)
@@ -18,6 +18,9 @@ with CLIMADA. If not, see <https://www.gnu.org/licenses/>.
 
 Test interpolation module.
 """
+import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 
@@ -241,8 +244,167 @@ class TestNN(unittest.TestCase):
         ''' Call repeat_coord_pass test for haversine distance'''
         self.repeat_coord_pass('haversine')
 
+    def test_approx_antimeridian_pass(self):
+        ''' Check nearest neighbors across the anti-meridian and threshold'''
+        centroids = np.array([[10, 179.9], [10, 170], [-20, -179.5]])
+        exposures = np.array([[10, -179.95], [10, 171], [-20, 179.5], [60, 0]])
+        neighbors = interp.interpol_index(centroids, exposures, 'NN', 'approx',
+                                          threshold=200)
+        self.assertEqual(neighbors.tolist(), [0, 1, 2, -1])
+        neighbors = interp.interpol_index(centroids, exposures, 'NN', 'approx',
+                                          threshold=20)
+        self.assertEqual(neighbors.tolist(), [0, -1, -1, -1])
+
+    def test_approx_haver_same_pass(self):
+        ''' Check approx and haversine nearest neighbors are the same'''
+        rnd = np.random.RandomState(3)
+        centroids = np.stack([rnd.uniform(-80, 80, 500),
+                              rnd.uniform(-180, 180, 500)], axis=1)
+        exposures = np.stack([rnd.uniform(-80, 80, 2000),
+                              rnd.uniform(-180, 180, 2000)], axis=1)
+        neighbors = interp.interpol_index(centroids, exposures, 'NN', 'approx',
+                                          threshold=500)
+        self.assertTrue(np.array_equal(neighbors, interp.interpol_index( \
+            centroids, exposures, 'NN', 'haversine', threshold=500)))
+
+    def test_grid_pass(self):
+        ''' Check nearest neighbors in regular grid against haversine'''
+        lat, lon = np.meshgrid(np.arange(-30, 30.1, 2), np.arange(-60, 60.1, 2))
+        centroids = np.stack([lat.flatten(), lon.flatten()], axis=1)
+        perm = np.random.RandomState(2).permutation(lat.size)
+        centroids = centroids[perm]
+        grid_centr = np.argsort(perm).reshape(lon.shape).transpose()[::-1].flatten()
+        grid_meta = {'width': lon.shape[0], 'height': lon.shape[1],
+                     'transform': (2, 0, -61, 0, -2, 31)}
+        rnd = np.random.RandomState(4)
+        exposures = np.stack([rnd.uniform(-32, 32, 1000),
+                              rnd.uniform(-65, 65, 1000)], axis=1)
+        exposures[0, :] = [35, 0]
+        neighbors = interp.index_nn_grid(centroids, exposures, grid_meta, grid_centr)
+        self.assertTrue(np.array_equal(neighbors, interp.interpol_index( \
+            centroids, exposures, 'NN', 'haversine')))
+        self.assertEqual(neighbors[0], -1)
+        neighbors = interp.index_nn_grid(centroids, exposures, grid_meta,
+                                         grid_centr, threshold=50)
+        self.assertTrue(np.array_equal(neighbors, interp.interpol_index( \
+            centroids, exposures, 'NN', 'haversine', threshold=50)))
+
+    def test_tree_pass(self):
+        ''' Check the result with a prebuilt tree is the same'''
+        exposures, centroids = def_input_values()
+        for dist in interp.DIST_DEF:
+            tree = interp.nn_tree(centroids, dist)
+            neighbors = interp.interpol_index(centroids, exposures, 'NN', dist,
+                                              tree=tree)
+            self.assertTrue(np.array_equal(neighbors, def_ref()))
+
+class TestWeights(unittest.TestCase):
+    ''' Test inverse distance weights of the k nearest centroids'''
+
+    def test_weights_pass(self):
+        ''' Check weights of points centered, on a centroid and far away'''
+        centroids = np.array([[-0.5, 0], [-0.5, 1], [0.5, 0], [0.5, 1], [5, 5]])
+        coordinates = np.array([[0, 0.5], [0.5, 1], [20, 20], [0, 0.5]])
+        for dist in interp.DIST_DEF:
+            weights = interp.interpol_weights(centroids, coordinates, k=4,
+                                              distance=dist)
+            self.assertEqual(weights.shape, (4, 5))
+            self.assertTrue(np.allclose(weights[0].toarray(),
+                                        [[0.25, 0.25, 0.25, 0.25, 0]]))
+            self.assertTrue(np.allclose(weights[3].toarray(), weights[0].toarray()))
+            self.assertTrue(np.array_equal(weights[1].toarray(), [[0, 0, 0, 1, 0]]))
+            self.assertEqual(weights[2].nnz, 0)
+
+    def test_power_threshold_pass(self):
+        ''' Check nearer centroids weight more and threshold is applied'''
+        centroids = np.array([[0, 0], [0, 1], [0, 3]])
+        coordinates = np.array([[0, 0.25]])
+        weights = interp.interpol_weights(centroids, coordinates, k=3,
+                                          threshold=1000).toarray()
+        self.assertAlmostEqual(weights.sum(), 1)
+        self.assertAlmostEqual(weights[0, 0] / weights[0, 1], 9, places=3)
+        weights_lin = interp.interpol_weights(centroids, coordinates, k=3,
+                                              threshold=1000, power=1).toarray()
+        self.assertAlmostEqual(weights_lin[0, 0] / weights_lin[0, 1], 3, places=3)
+        weights = interp.interpol_weights(centroids, coordinates, k=3,
+                                          threshold=100).toarray()
+        self.assertTrue(np.allclose(weights, [[0.9, 0.1, 0]]))
+
+    def test_wrong_distance_fail(self):
+        ''' Check ValueError for unknown distance'''
+        exposures, centroids = def_input_values()
+        with self.assertLogs('climada.util.interpolation', level='ERROR') as cm:
+            with self.assertRaises(ValueError):
+                interp.interpol_weights(centroids, exposures, distance='euclidean')
+        self.assertIn('distance euclidean is not supported', cm.output[0])
+
+class TestAssignCache(unittest.TestCase):
+    '''Test cache of assignments'''
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_def = (interp.ASSIGN_CACHE_DIR, interp.ASSIGN_CACHE_MEM,
+                          interp.ASSIGN_CACHE_DISK)
+        interp.ASSIGN_CACHE_DIR = self.cache_dir
+        interp.clear_assign_cache()
+
+    def tearDown(self):
+        interp.clear_assign_cache()
+        interp.ASSIGN_CACHE_DIR, interp.ASSIGN_CACHE_MEM, \
+        interp.ASSIGN_CACHE_DISK = self.cache_def
+        shutil.rmtree(self.cache_dir)
+
+    def test_key_pass(self):
+        ''' Check keys change with coordinates, centroids and parameters'''
+        exposures, centroids = def_input_values()
+        key = interp.assign_cache_key(exposures, centroids, 'NN', 'haversine', 100)
+        self.assertEqual(key, interp.assign_cache_key(exposures.copy(), centroids.copy(),
+                                                      'NN', 'haversine', 100))
+        self.assertNotEqual(key, interp.assign_cache_key(exposures, centroids,
+                                                         'NN', 'haversine', 50))
+        centroids[0, 1] += 1.0e-6
+        self.assertNotEqual(key, interp.assign_cache_key(exposures, centroids,
+                                                         'NN', 'haversine', 100))
+        centroids[0, 1] -= 1.0e-6
+        exposures[0, 0] += 1.0e-6
+        self.assertNotEqual(key, interp.assign_cache_key(exposures, centroids,
+                                                         'NN', 'haversine', 100))
+
+    def test_memory_disk_pass(self):
+        ''' Check assignments are read from memory and, if asked, from disk'''
+        self.assertIsNone(interp.get_assign_cache('a', disk=True))
+        interp.set_assign_cache('a', np.array([1, 2, -1]))
+        self.assertFalse(os.listdir(self.cache_dir))
+        interp.set_assign_cache('a', np.array([1, 2, -1]), disk=True)
+        assigned = interp.get_assign_cache('a')
+        self.assertEqual(assigned.tolist(), [1, 2, -1])
+        assigned[0] = 5
+        self.assertEqual(interp.get_assign_cache('a').tolist(), [1, 2, -1])
+        interp.clear_assign_cache()
+        self.assertIsNone(interp.get_assign_cache('a'))
+        self.assertEqual(interp.get_assign_cache('a', disk=True).tolist(), [1, 2, -1])
+        interp.clear_assign_cache(disk=True)
+        self.assertIsNone(interp.get_assign_cache('a', disk=True))
+
+    def test_eviction_pass(self):
+        ''' Check least recently used assignments are evicted'''
+        interp.ASSIGN_CACHE_MEM = 2.5 * np.arange(100).nbytes
+        interp.ASSIGN_CACHE_DISK = 2.5 * np.arange(100).nbytes
+        for i_key, key in enumerate(['a', 'b', 'c']):
+            interp.set_assign_cache(key, np.arange(100) + i_key, disk=True)
+            file_time = 1.0e9 + i_key
+            os.utime(os.path.join(self.cache_dir, key + '.npy'), (file_time, file_time))
+        self.assertEqual(list(interp._ASSIGN_CACHE.keys()), ['b', 'c'])
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['b.npy', 'c.npy'])
+        interp.clear_assign_cache()
+        self.assertEqual(interp.get_assign_cache('b', disk=True)[0], 1)
+        interp.set_assign_cache('d', np.arange(100), disk=True)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['b.npy', 'd.npy'])
+
 # Execute Tests
 TESTS = unittest.TestLoader().loadTestsFromTestCase(TestNN)
 TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestInterpIndex))
 TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestDistance))
+TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestAssignCache))
+TESTS.addTests(unittest.TestLoader().loadTestsFromTestCase(TestWeights))
 unittest.TextTestRunner(verbosity=2).run(TESTS)